@@ -1,47 +1,203 @@
 from django.contrib import admin
-from backend.models import User, Shop, Category, Product, ProductInfo, ProductParameter, Contact, Order, OrderItem
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from backend.models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Contact, Order, \
+    OrderItem, ArchivedOrder, ArchivedOrderItem, ParameterValue
+from backend.etags import bump_catalog_version
+from backend.routers import read_from_replica
+
+# ниже этого значения оценка размера таблицы уточняется обычным COUNT(*)
+EXACT_COUNT_LIMIT = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц: для списка без фильтров на PostgreSQL берет оценку
+    количества строк из статистики планировщика вместо полного COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if connection.vendor == 'postgresql' and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                               [self.object_list.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > EXACT_COUNT_LIMIT:
+                return row[0]
+        return super().count
+
+
+class ReplicaAdmin(admin.ModelAdmin):
+    """
+    Базовый ModelAdmin, который строит списки объектов по данным реплики.
+    """
+    paginator = EstimatedCountPaginator
+    # не считаем полный размер таблицы при поиске и фильтрации
+    show_full_result_count = False
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with read_from_replica(request.user):
+            response = super().changelist_view(request, extra_context)
+            # список объектов выбирается при рендеринге шаблона, поэтому рендерим внутри контекста
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+
+
+class CatalogAdmin(ReplicaAdmin):
+    """
+    ModelAdmin для моделей каталога: изменения через админку сбрасывают ETag каталога.
+    """
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_catalog_version()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_catalog_version()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_catalog_version()
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
-    pass
+class UserAdmin(ReplicaAdmin):
+    list_display = ('id', 'email', 'username', 'first_name', 'last_name', 'type', 'is_staff')
+    list_filter = ('type', 'is_staff')
+    search_fields = ('=email', '^username', '^last_name')
 
 
 @admin.register(Shop)
-class ShopAdmin(admin.ModelAdmin):
-    pass
+class ShopAdmin(CatalogAdmin):
+    list_display = ('id', 'name', 'url', 'state', 'placement', 'user')
+    list_select_related = ('user',)
+    list_filter = ('state', 'placement')
+    search_fields = ('^name',)
+    autocomplete_fields = ('user',)
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
-    pass
+class CategoryAdmin(CatalogAdmin):
+    list_display = ('id', 'name')
+    search_fields = ('^name',)
+    autocomplete_fields = ('shops', 'user')
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    pass
+class ProductAdmin(CatalogAdmin):
+    list_display = ('id', 'name', 'category')
+    list_select_related = ('category',)
+    search_fields = ('^name',)
+    autocomplete_fields = ('category',)
 
 
 @admin.register(ProductInfo)
-class ProdInfoAdmin(admin.ModelAdmin):
-    pass
+class ProdInfoAdmin(CatalogAdmin):
+    list_display = ('id', 'product_name', 'model', 'shop', 'external_id', 'price', 'price_rrc', 'quantity')
+    list_select_related = ('product', 'shop')
+    list_filter = ('shop__placement',)
+    search_fields = ('^product__name', '^model', '=external_id')
+    autocomplete_fields = ('product', 'shop')
+
+    def get_queryset(self, request):
+        # __str__ обращается к товару, в том числе в ответах автодополнения;
+        # changelist не применяет list_select_related к уже связанному queryset, поэтому передаем его сами
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+    @admin.display(description='Товар', ordering='product__name')
+    def product_name(self, obj):
+        return obj.product.name
+
+
+@admin.register(Parameter)
+class ParameterAdmin(CatalogAdmin):
+    list_display = ('id', 'name')
+    search_fields = ('^name',)
+
+
+@admin.register(ParameterValue)
+class ParameterValueAdmin(CatalogAdmin):
+    list_display = ('id', 'value')
+    search_fields = ('^value',)
 
 
 @admin.register(ProductParameter)
-class ProdParamAdmin(admin.ModelAdmin):
-    pass
+class ProdParamAdmin(CatalogAdmin):
+    list_display = ('id', 'product_name', 'parameter_name', 'parameter_value')
+    list_select_related = ('product_info__product', 'parameter', 'value_ref')
+    search_fields = ('^product_info__product__name', '^parameter__name', '^value', '^value_ref__value')
+    autocomplete_fields = ('product_info', 'parameter', 'value_ref')
+
+    @admin.display(description='Товар', ordering='product_info__product__name')
+    def product_name(self, obj):
+        return obj.product_info.product.name
+
+    @admin.display(description='Параметр', ordering='parameter__name')
+    def parameter_name(self, obj):
+        return obj.parameter.name
+
+    @admin.display(description='Значение')
+    def parameter_value(self, obj):
+        return obj.get_value()
 
 
 @admin.register(Contact)
-class ContactAdmin(admin.ModelAdmin):
-    pass
+class ContactAdmin(ReplicaAdmin):
+    list_display = ('id', 'user', 'city', 'address', 'phone')
+    list_select_related = ('user',)
+    search_fields = ('=user__email', '^phone', '^city')
+    autocomplete_fields = ('user',)
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    pass
+class OrderAdmin(ReplicaAdmin):
+    list_display = ('id', 'user', 'state', 'dt', 'contact')
+    list_select_related = ('user', 'contact__user')
+    list_filter = ('state',)
+    search_fields = ('=id', '=user__email')
+    autocomplete_fields = ('user', 'contact')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.list_select_related)
 
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
-    pass
+class OrderItemAdmin(ReplicaAdmin):
+    list_display = ('id', 'order_number', 'order_id', 'order_state', 'product_name', 'quantity', 'total')
+    list_select_related = ('order', 'product_info__product')
+    list_filter = ('order__state',)
+    search_fields = ('=order_number', '=order__id')
+    autocomplete_fields = ('order', 'product_info')
+
+    @admin.display(description='Статус', ordering='order__state')
+    def order_state(self, obj):
+        return obj.order.get_state_display()
+
+    @admin.display(description='Товар', ordering='product_info__product__name')
+    def product_name(self, obj):
+        return obj.product_info.product.name
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ReplicaAdmin):
+    list_display = ('id', 'user', 'state', 'dt', 'city', 'archived_at')
+    list_select_related = ('user',)
+    list_filter = ('state',)
+    search_fields = ('=id', '=user__email')
+    autocomplete_fields = ('user',)
+
+
+@admin.register(ArchivedOrderItem)
+class ArchivedOrderItemAdmin(ReplicaAdmin):
+    list_display = ('id', 'order_number', 'order_id', 'product_name', 'shop_name', 'quantity', 'total')
+    search_fields = ('=order_number', '=order__id')
+    autocomplete_fields = ('order',)
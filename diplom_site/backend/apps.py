@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BackendConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend'
+
+    def ready(self):
+        # обработчики сигналов журнала медленных запросов и проверки настроек
+        import backend.slowqueries  # noqa: F401
+        import backend.checks  # noqa: F401
@@ -0,0 +1,91 @@
+"""
+Перенос завершенных и отмененных заказов в архивные таблицы и чтение из архива.
+
+В горячих таблицах Order, OrderItem и Contact остаются только текущие заказы, поэтому их индексы
+не растут вместе с историей. Архивные строки сохраняют ID, и ссылки /orders/<id>/ продолжают работать.
+"""
+from backend.models import Order, OrderItem, Contact, ArchivedOrder, ArchivedOrderItem
+
+FINISHED_STATES = ('completed', 'cancelled')
+
+ORDER_FIELDS = ('id', 'user_id', 'dt', 'state', 'contact_id', 'contact__city', 'contact__address', 'contact__phone')
+ORDER_ITEM_FIELDS = ('id', 'order_id', 'order_number', 'product_info__shop_id', 'product_info__external_id',
+                     'product_info__product__name', 'product_info__shop__name', 'product_info__price', 'quantity',
+                     'total')
+
+
+def archive_orders(order_ids):
+    """
+    Функция для переноса заказов в архив. Должна вызываться в транзакции: копии создаются
+    через bulk_create, после чего заказы удаляются из горячих таблиц вместе с позициями и событиями.
+    :param order_ids: ID заказов
+    :return: dict() с количеством перенесенных заказов, позиций и удаленных контактов
+    """
+    orders = list(Order.objects.filter(id__in=order_ids).values_list(*ORDER_FIELDS))
+    ArchivedOrder.objects.bulk_create([
+        ArchivedOrder(id=pk, user_id=user_id, dt=dt, state=state, city=city or '', address=address or '',
+                      phone=phone or '')
+        for pk, user_id, dt, state, _, city, address, phone in orders
+    ])
+    items = list(OrderItem.objects.filter(order_id__in=order_ids).values_list(*ORDER_ITEM_FIELDS))
+    ArchivedOrderItem.objects.bulk_create([
+        ArchivedOrderItem(id=pk, order_id=order_id, order_number=order_number, shop_id=shop_id,
+                          external_id=external_id, product_name=product_name, shop_name=shop_name, price=price,
+                          quantity=quantity, total=total)
+        for pk, order_id, order_number, shop_id, external_id, product_name, shop_name, price, quantity, total
+        in items
+    ])
+    Order.objects.filter(id__in=order_ids).delete()
+    # контакт удаляем, только если на него больше не ссылается ни один заказ
+    contact_ids = {order[4] for order in orders if order[4]}
+    contacts, _ = Contact.objects.filter(id__in=contact_ids, order__isnull=True).delete()
+    return {'orders': len(orders), 'order_items': len(items), 'contacts': contacts}
+
+
+def project_archived_order_items(user_id, start=0):
+    """
+    Функция для построения списка архивных заказов пользователя в формате OrderView.list.
+    :param user_id: ID пользователя
+    :param start: первая позиция, чтобы продолжить нумерацию горячих заказов
+    :return: dict() с позицией в качестве ключа
+    """
+    rows = ArchivedOrderItem.objects.filter(order__user_id=user_id) \
+        .values_list('id', 'order_number', 'order__dt', 'total', 'order__state')
+    return {
+        pos: {
+            'id': pk,
+            'order_number': order_number,
+            'date_created': dt.strftime("%Y.%m.%d"),
+            'total': total,
+            'state': state,
+        }
+        for pos, (pk, order_number, dt, total, state) in enumerate(rows, start)
+    }
+
+
+def archived_order_detail(order_item):
+    """
+    Функция для построения деталей архивного заказа в формате OrderView.retrieve.
+    :param order_item: объект ArchivedOrderItem с загруженными order и order.user
+    :return: dict()
+    """
+    order = order_item.order
+    return {
+        'order_number': order_item.order_number,
+        'date_created': order.dt.strftime("%Y.%m.%d"),
+        'state': order.state,
+        'order_details': {
+            'product_name': order_item.product_name,
+            'shop': order_item.shop_name,
+            'price': order_item.price,
+            'quantity': order_item.quantity,
+            'total': order_item.total
+        },
+        'contact_details': {
+            'city': order.city,
+            'address': order.address,
+            'phone': order.phone,
+            'email': order.user.email,
+            'person': f'{order.user.first_name} {order.user.last_name}'
+        }
+    }
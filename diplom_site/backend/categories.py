@@ -0,0 +1,82 @@
+"""
+Сводка по категориям для меню витрины: количество предложений в наличии, магазинов и диапазон цен.
+
+Сводка считается одним группирующим запросом после импорта прайса и хранится в кэше вместе с версией
+сводки (CATEGORY_STATS), которую увеличивает только импорт. Заказы, изменения остатков и админка сводку
+не сбрасывают, поэтому запросы к /categories/ не читают ProductInfo. Если версия сменилась, а сводка
+в кэше еще старая (другой процесс с локальным кэшем, вытеснение), ее пересчитывает один запрос под
+блокировкой в кэше, остальные в это время получают прежнюю сводку.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+
+from backend.models import Category
+from backend.etags import get_catalog_version, CATEGORY_STATS
+
+CACHE_KEY = 'catalog:categories'
+LOCK_KEY = 'catalog:categories:lock'
+
+
+def compute_category_stats():
+    """
+    Функция для расчета сводки по категориям. Магазины считаются по предложениям в наличии,
+    поэтому цифры в меню совпадают с тем, что покупатель может заказать.
+    :return: list() словарей {id, name, offers, shops, min_price, max_price}
+    """
+    in_stock = Q(products__product_info__quantity__gt=0)
+    rows = Category.objects.annotate(
+        offer_count=Count('products__product_info', filter=in_stock),
+        shop_count=Count('products__product_info__shop', filter=in_stock, distinct=True),
+        min_price=Min('products__product_info__price', filter=in_stock),
+        max_price=Max('products__product_info__price', filter=in_stock),
+    ).order_by('name', 'id').values_list('id', 'name', 'offer_count', 'shop_count', 'min_price', 'max_price')
+    return [
+        {'id': pk, 'name': name, 'offers': offers, 'shops': shops, 'min_price': min_price, 'max_price': max_price}
+        for pk, name, offers, shops, min_price, max_price in rows
+    ]
+
+
+def refresh_category_stats(version=None):
+    """
+    Функция для пересчета сводки и записи ее в кэш. Вызывается после импорта прайсов, чтобы первый
+    запрос к /categories/ не считал сводку сам.
+    :param version: версия сводки, по умолчанию текущая
+    :return: list() из compute_category_stats()
+    """
+    # версия читается до расчета: если импорт завершится во время расчета, сводка будет пересчитана
+    if version is None:
+        version = get_catalog_version(CATEGORY_STATS)
+    stats = compute_category_stats()
+    cache.set(CACHE_KEY, {'version': version, 'stats': stats}, timeout=settings.CATEGORY_STATS_TIMEOUT)
+    return stats
+
+
+def get_category_stats():
+    """
+    Функция для получения сводки из кэша. Если сводка посчитана для другой версии, ее пересчитывает
+    только запрос, получивший блокировку, остальные отдают прежнюю сводку или ждут пересчета, если
+    сводки в кэше нет совсем.
+    :return: list() из compute_category_stats()
+    """
+    version = get_catalog_version(CATEGORY_STATS)
+    cached = cache.get(CACHE_KEY)
+    if cached is not None and cached['version'] == version:
+        return cached['stats']
+    if cache.add(LOCK_KEY, True, timeout=settings.CATEGORY_STATS_LOCK_TIMEOUT):
+        try:
+            return refresh_category_stats(version)
+        finally:
+            cache.delete(LOCK_KEY)
+    if cached is not None:
+        return cached['stats']
+    # сводки нет: ждем, пока ее посчитает запрос с блокировкой
+    deadline = time.monotonic() + settings.CATEGORY_STATS_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        cached = cache.get(CACHE_KEY)
+        if cached is not None:
+            return cached['stats']
+    return compute_category_stats()
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Функция для проверки, что кэш общий для процессов: в кэше хранятся метрики задач, закрепление
+    за основной БД и сводка по категориям, с локальным кэшем у каждого процесса они свои.
+    """
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        'The default cache is local to each process.',
+        hint='Set CACHE_URL to a shared cache, e.g. rediscache://127.0.0.1:6379/1',
+        id='backend.W001',
+    )]
@@ -0,0 +1,15 @@
+from backend.models import Contact, contact_fingerprint
+
+
+def get_or_create_contact(user, city, address, phone):
+    """
+    Функция для поиска существующего контакта пользователя по нормализованному хэшу.
+    Одинаковые контакты переиспользуются, новый создается только при отсутствии совпадения.
+    :param user: пользователь
+    :return: объект Contact
+    """
+    fingerprint = contact_fingerprint(city, address, phone)
+    contact = Contact.objects.filter(user=user, fingerprint=fingerprint).order_by('id').first()
+    if contact is None:
+        contact = Contact.objects.create(user=user, city=city, address=address, phone=phone)
+    return contact
@@ -0,0 +1,45 @@
+import hashlib
+
+from django.db.models import F
+
+from backend.models import CatalogVersion
+
+CATALOG = 'catalog'
+# версия сводки по категориям: увеличивается только импортом прайсов
+CATEGORY_STATS = 'category_stats'
+
+
+def get_catalog_version(name=CATALOG):
+    """
+    Функция для получения текущей версии каталога. Один запрос по уникальному индексу,
+    таблицы товаров не затрагиваются.
+    :param name: раздел каталога, по умолчанию весь каталог
+    :return: int() номер версии, 0 - если каталог еще ни разу не менялся.
+    """
+    version = CatalogVersion.objects.filter(name=name).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_catalog_version(name=CATALOG):
+    """
+    Функция для увеличения версии каталога. Вызывается после любого изменения товаров,
+    цен или остатков, чтобы сбросить ETag у клиентов.
+    :param name: раздел каталога, по умолчанию весь каталог
+    :return:
+    """
+    updated = CatalogVersion.objects.filter(name=name).update(version=F('version') + 1)
+    if not updated:
+        CatalogVersion.objects.get_or_create(name=name)
+
+
+def catalog_etag(request, pk=None):
+    """
+    Функция для вычисления сильного ETag эндпоинтов каталога. Учитывает путь, параметры запроса, версию каталога
+    и заголовки Accept и Accept-Encoding, т.к. разные поля, форматы и сжатие - разные представления ресурса.
+    :param request: запрос
+    :param pk: ID объекта, если запрашивается детальная информация
+    :return: str() значение ETag без кавычек
+    """
+    key = (f'{request.path}:{request.META.get("QUERY_STRING", "")}:{pk}:{get_catalog_version()}:'
+           f'{request.META.get("HTTP_ACCEPT", "")}:{request.META.get("HTTP_ACCEPT_ENCODING", "")}')
+    return hashlib.md5(key.encode()).hexdigest()
@@ -0,0 +1,81 @@
+"""
+Выборочные поля (?fields=) и раскрытие связей (?expand=) для эндпоинтов товаров.
+
+fields - поля верхнего уровня через запятую, expand - связи, которые отдаются вложенными объектами,
+нераскрытая связь отдается идентификатором. Без параметров ответ совпадает с полным.
+Невыбранные поля не только не сериализуются, но и не читаются из БД: без params нет запроса параметров,
+для нераскрытых связей нет JOIN.
+"""
+
+# список товаров: поля и раскрываемые связи ProductView.list
+PRODUCT_FIELDS = ('id', 'name', 'category')
+PRODUCT_EXPAND = ('category',)
+
+# детальная информация: поля и раскрываемые связи ProductInfoSerializer, category - категория внутри product
+PRODUCT_INFO_FIELDS = ('id', 'model', 'product', 'params', 'shop', 'quantity', 'price')
+PRODUCT_INFO_EXPAND = ('product', 'category', 'shop')
+
+# колонки вложенных объектов в форме ShopSerializer и ProductSerializer
+SHOP_COLUMNS = ('shop__name', 'shop__url', 'shop__state', 'shop__placement')
+PRODUCT_COLUMNS = ('product__id', 'product__name')
+
+
+def _split(value, allowed, name):
+    names = {item.strip() for item in value.split(',') if item.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise ValueError(f'Unknown {name}: {", ".join(sorted(unknown))}. Allowed: {", ".join(allowed)}')
+    return names
+
+
+def parse_fieldset(query_params, fields, expandable):
+    """
+    Функция для разбора параметров fields и expand.
+    :param query_params: параметры запроса
+    :param fields: все поля ответа в порядке вывода
+    :param expandable: связи, которые можно раскрыть
+    :return: tuple() полей в порядке вывода и frozenset() раскрытых связей
+    """
+    selected = fields
+    if 'fields' in query_params:
+        names = _split(query_params['fields'], fields, 'fields')
+        selected = tuple(field for field in fields if field in names)
+        if not selected:
+            raise ValueError('At least one field is required')
+    expand = frozenset(expandable)
+    if 'expand' in query_params:
+        expand = frozenset(_split(query_params['expand'], expandable, 'expand'))
+    return selected, expand
+
+
+def product_info_queryset(queryset, fields, expand):
+    """
+    Функция для ограничения выборки ProductInfo выбранными полями и раскрытыми связями.
+    :param queryset: QuerySet модели ProductInfo
+    :param fields: поля из parse_fieldset()
+    :param expand: раскрытые связи из parse_fieldset()
+    :return: QuerySet
+    """
+    columns = ['id']
+    related = []
+    for field in fields:
+        if field in ('model', 'quantity', 'price'):
+            columns.append(field)
+        elif field == 'product' and 'product' in expand:
+            related.append('product')
+            columns += ['product', *PRODUCT_COLUMNS]
+            if 'category' in expand:
+                related.append('product__category')
+                columns += ['product__category', 'product__category__name']
+            else:
+                columns.append('product__category')
+        elif field == 'shop' and 'shop' in expand:
+            related.append('shop')
+            columns += ['shop', *SHOP_COLUMNS]
+        elif field in ('product', 'shop', 'params'):
+            # нераскрытая связь отдается по значению внешнего ключа, params ищутся по product_id
+            columns.append('product' if field == 'params' else field)
+    if related:
+        # select_related() без аргументов присоединил бы все связи
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns)
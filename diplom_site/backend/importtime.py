@@ -0,0 +1,100 @@
+"""
+Замер времени импорта модулей при старте процессов.
+
+Каждая точка входа запускается в отдельном процессе с python -X importtime, вывод разбирается
+в список модулей с собственным и накопленным временем импорта. Модули, загруженные через
+importlib.import_module (настройки, models приложений), в выводе не показываются сами,
+видны только их импорты, поэтому бюджет проверяется по полному времени запуска процесса.
+"""
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+# точка входа: (переменные окружения, аргументы интерпретатора)
+ENTRY_POINTS = {
+    # веб-воркер загружает маршруты до первого запроса, поэтому учитываем и их
+    'wsgi': ({'DJANGO_ROLE': 'web'},
+             ['-c', 'import diplom_site.wsgi; from django.urls import get_resolver; get_resolver().url_patterns']),
+    'asgi': ({'DJANGO_ROLE': 'web'},
+             ['-c', 'import diplom_site.asgi; from django.urls import get_resolver; get_resolver().url_patterns']),
+    # то же, что делает celery worker перед приемом задач, включая проверки Django
+    'celery': ({'DJANGO_ROLE': 'worker'},
+               ['-c', 'from diplom_site.celery import app; app.loader.import_default_modules()']),
+    'manage': ({'DJANGO_ROLE': 'web'}, ['manage.py', 'check']),
+}
+
+
+def parse_importtime(output):
+    """
+    Функция для разбора вывода python -X importtime.
+    :param output: текст stderr процесса
+    :return: list() словарей {module, self, cumulative, depth}, время в микросекундах
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        if not self_time.strip().isdigit():
+            # строка заголовка
+            continue
+        module = name.strip()
+        records.append({
+            'module': module,
+            'self': int(self_time),
+            'cumulative': int(cumulative),
+            'depth': (len(name.rstrip()) - len(module) - 1) // 2,
+        })
+    return records
+
+
+def measure(entry, repeat=1):
+    """
+    Функция для замера импорта точки входа. Из нескольких запусков берется самый быстрый,
+    чтобы не учитывать случайные задержки диска и планировщика.
+    :param entry: имя точки входа из ENTRY_POINTS
+    :param repeat: количество запусков
+    :return: время запуска процесса в миллисекундах и list() из parse_importtime()
+    """
+    env_overrides, args = ENTRY_POINTS[entry]
+    env = {**os.environ, **env_overrides}
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise RuntimeError(f'{entry} failed to start:\n{result.stderr[-2000:]}')
+        if best is None or elapsed < best[0]:
+            best = (elapsed, parse_importtime(result.stderr))
+    return best
+
+
+def total_time(records):
+    return sum(record['self'] for record in records)
+
+
+def by_package(records):
+    """
+    Функция для подсчета времени импорта по пакетам верхнего уровня.
+    :return: list() пар (пакет, микросекунды) по убыванию времени
+    """
+    packages = defaultdict(int)
+    for record in records:
+        packages[record['module'].partition('.')[0]] += record['self']
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def top_imports(records, limit):
+    """
+    Функция для выбора самых дорогих импортов, выполненных самой точкой входа (верхний уровень дерева).
+    :return: list() пар (модуль, микросекунды)
+    """
+    roots = sorted((record for record in records if record['depth'] == 0),
+                   key=lambda record: record['cumulative'], reverse=True)
+    return [(record['module'], record['cumulative']) for record in roots[:limit]]
@@ -0,0 +1,221 @@
+"""
+Генератор нагрузки: сценарии покупателя и магазина против запущенного сервера.
+
+Каждый запрос замеряется и относится к методу и шаблону эндпоинта (например, PATCH /orders/{id}/),
+по итогам считается пропускная способность и перцентили задержки по каждому эндпоинту.
+"""
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from backend.models import CITIES
+
+PERCENTILES = (50, 95, 99)
+
+
+class Recorder:
+    """
+    Потокобезопасный сборщик замеров по эндпоинтам. Ключ - метод и шаблон эндпоинта ("POST /orders/"),
+    чтобы, например, создание и список заказов не смешивались в одних перцентилях.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, elapsed, ok):
+        with self.lock:
+            self.samples[endpoint].append(elapsed)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def add_error(self, endpoint):
+        with self.lock:
+            self.errors[endpoint] += 1
+
+
+class Session:
+    """
+    HTTP-сессия одного виртуального пользователя, замеряющая каждый запрос.
+    """
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.http = requests.Session()
+
+    def request(self, method, endpoint, path=None, **kwargs):
+        label = f'{method} {endpoint}'
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + (path or endpoint), timeout=30, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(label, time.perf_counter() - start, False)
+            return None
+        self.recorder.add(label, time.perf_counter() - start, response.status_code < 400)
+        return response
+
+    def json(self, method, endpoint, response):
+        """
+        Функция для разбора JSON-ответа. Ответ с ошибкой, пустым телом или не JSON (например,
+        HTML-страница 500) засчитывается как ошибка эндпоинта, сценарий при этом не прерывается.
+        :param method: метод запроса
+        :param endpoint: шаблон эндпоинта, к которому относится ответ
+        :param response: ответ или None, если запрос не удался
+        :return: dict() или None
+        """
+        if response is None or response.status_code >= 400:
+            # ошибка уже учтена в request()
+            return None
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            self.recorder.add_error(f'{method} {endpoint}')
+            return None
+        return data
+
+    def authorize(self, token):
+        self.http.headers['Authorization'] = f'Token {token}'
+
+
+def buyer_session(base_url, recorder):
+    """
+    Функция сценария покупателя: регистрация, получение токена, просмотр каталога,
+    создание и подтверждение заказа.
+    """
+    session = Session(base_url, recorder)
+    suffix = uuid.uuid4().hex[:12]
+    user = {
+        'username': f'load_{suffix}',
+        'email': f'load_{suffix}@example.com',
+        'password': f'Pass_{suffix}',
+        'first_name': 'Нагрузка',
+        'last_name': 'Тестовая',
+    }
+    session.request('POST', '/register/', json=user)
+    response = session.request('POST', '/get_token/', data={'username': user['email'], 'password': user['password']})
+    data = session.json('POST', '/get_token/', response)
+    if not data or 'token' not in data:
+        return
+    session.authorize(data['token'])
+    data = session.json('GET', '/products/', session.request('GET', '/products/'))
+    products = (data or {}).get('products') or []
+    if not products:
+        return
+    product = random.choice(products)
+    contact = {'city': random.choice(CITIES)[1], 'address': 'Не указан', 'phone': 'Не указан'}
+    response = session.request('POST', '/orders/', json={'contact': contact, 'quantity': 1,
+                                                         'product_info': product['id']})
+    data = session.json('POST', '/orders/', response)
+    if not data or 'id' not in data:
+        return
+    session.request('PATCH', '/orders/{id}/', f"/orders/{data['id']}/",
+                    json={'address': 'ул. Нагрузочная, 1', 'phone': '+79990000000'})
+    session.request('GET', '/orders/')
+
+
+def shop_session(base_url, recorder, token, price_list_url):
+    """
+    Функция сценария магазина: запуск импорта прайса через PartnerUpdate.
+    """
+    session = Session(base_url, recorder)
+    session.authorize(token)
+    session.request('POST', '/partner_update/', json={'url': price_list_url})
+
+
+def percentile(sorted_samples, value):
+    """
+    Функция для расчета перцентиля методом ближайшего ранга.
+    :param sorted_samples: отсортированный список замеров
+    :param value: перцентиль от 0 до 100
+    :return: float
+    """
+    if not sorted_samples:
+        return 0.0
+    rank = max(math.ceil(value / 100 * len(sorted_samples)), 1)
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(recorder, elapsed):
+    """
+    Функция для построения отчета по эндпоинтам.
+    :param recorder: объект Recorder
+    :param elapsed: длительность прогона в секундах
+    :return: dict() {'METHOD endpoint': {requests, errors, rps, p50, p95, p99}}, задержки в миллисекундах
+    """
+    report = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        samples = sorted(samples)
+        stats = {
+            'requests': len(samples),
+            'errors': recorder.errors[endpoint],
+            'rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        }
+        for value in PERCENTILES:
+            stats[f'p{value}'] = round(percentile(samples, value) * 1000, 2)
+        report[endpoint] = stats
+    return report
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """
+    Функция для сравнения отчета с сохраненным эталоном.
+    :param report: текущий отчет из summarize()
+    :param baseline: эталонный отчет
+    :param tolerance: допустимое ухудшение, например 0.2 - на 20%
+    :return: list() строк с описанием регрессий
+    """
+    regressions = []
+    for endpoint, expected in baseline.items():
+        actual = report.get(endpoint)
+        if actual is None:
+            regressions.append(f'{endpoint}: no requests recorded')
+            continue
+        for value in PERCENTILES:
+            key = f'p{value}'
+            if actual[key] > expected[key] * (1 + tolerance):
+                regressions.append(f'{endpoint}: {key} {actual[key]}ms > baseline {expected[key]}ms')
+        if actual['rps'] < expected['rps'] * (1 - tolerance):
+            regressions.append(f'{endpoint}: rps {actual["rps"]} < baseline {expected["rps"]}')
+        if actual['errors'] > expected['errors']:
+            regressions.append(f'{endpoint}: errors {actual["errors"]} > baseline {expected["errors"]}')
+    return regressions
+
+
+def run_load(base_url, sessions, concurrency, shop_token=None, price_list_url=None, imports=0):
+    """
+    Функция для запуска нагрузки: сессии покупателей параллельно с импортами магазина.
+    :return: отчет из summarize()
+    """
+    recorder = Recorder()
+    jobs = [(buyer_session, base_url, recorder) for _ in range(sessions)]
+    if shop_token and price_list_url and imports:
+        # импорты равномерно распределяем между сессиями покупателей, чтобы они шли параллельно
+        step = max(len(jobs) // imports, 1)
+        for index in range(imports):
+            jobs.insert(index * (step + 1), (shop_session, base_url, recorder, shop_token, price_list_url))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(*job) for job in jobs]:
+            future.result()
+    return summarize(recorder, time.perf_counter() - start)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(path, report):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
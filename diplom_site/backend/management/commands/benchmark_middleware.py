@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import path
+
+# стандартные middleware Django, которые в MIDDLEWARE заменены версиями с учетом маршрута
+DJANGO_MIDDLEWARE = {
+    'backend.middleware.SessionMiddleware': 'django.contrib.sessions.middleware.SessionMiddleware',
+    'backend.middleware.CsrfViewMiddleware': 'django.middleware.csrf.CsrfViewMiddleware',
+    'backend.middleware.AuthenticationMiddleware': 'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.middleware.MessageMiddleware': 'django.contrib.messages.middleware.MessageMiddleware',
+}
+
+
+def ping(request):
+    return HttpResponse('pong')
+
+
+# команда сама служит urlconf: представление одинаково дешевое для обоих стеков,
+# поэтому разница во времени - это стоимость middleware
+urlpatterns = [
+    path('products/ping/', ping),
+    path('admin/ping/', ping),
+]
+
+
+class Command(BaseCommand):
+    help = 'Сравнение накладных расходов стека middleware на запрос: стандартный Django и с учетом маршрута.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        stacks = {
+            'django': [DJANGO_MIDDLEWARE.get(name, name) for name in settings.MIDDLEWARE],
+            'route-aware': list(settings.MIDDLEWARE),
+        }
+        factory = RequestFactory()
+        self.stdout.write(f'{"stack":<14}{"path":<18}{"us/request":>12}')
+        for name, middleware in stacks.items():
+            with override_settings(MIDDLEWARE=middleware, ROOT_URLCONF=__name__):
+                handler = BaseHandler()
+                handler.load_middleware()
+                for request_path in ('/products/ping/', '/admin/ping/'):
+                    elapsed = min(self.timed(handler, factory, request_path, options['requests']) for _ in range(3))
+                    self.stdout.write(f'{name:<14}{request_path:<18}'
+                                      f'{elapsed / options["requests"] * 1000000:>12.1f}')
+
+    @staticmethod
+    def timed(handler, factory, request_path, count):
+        # запросы готовим заранее, чтобы не учитывать их создание
+        requests = [factory.get(request_path, HTTP_AUTHORIZATION='Token x') for _ in range(count)]
+        start = time.perf_counter()
+        for request in requests:
+            handler.get_response(request)
+        return time.perf_counter() - start
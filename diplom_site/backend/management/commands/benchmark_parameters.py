@@ -0,0 +1,125 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from backend.models import User, Shop, Category, Parameter, ParameterValue, ProductParameter
+from backend.parameters import PARAMETER_NAMES, PARAMETER_VALUES, parameter_ids
+from backend.pricelists import load_price_list
+
+# категории каталога для замера, ID выбраны вне диапазона обычных прайсов
+FIRST_CATEGORY_ID = 900001
+COLORS = ('черный', 'белый', 'серый', 'серебристый', 'золотой', 'синий', 'красный', 'зеленый')
+
+
+def build_catalog(items, names, per_item, categories=20, seed=1):
+    """
+    Функция для построения каталога с реалистичными параметрами: несколько сотен названий,
+    у каждого небольшой набор повторяющихся значений.
+    :return: dict() в формате shop/categories/goods
+    """
+    rng = random.Random(seed)
+    pool = [f'Характеристика {number}' for number in range(names)]
+    choices = {name: [f'{rng.choice(COLORS)} {value}' if number % 3 else str(value * 8)
+                      for value in range(rng.randint(2, 20))]
+               for number, name in enumerate(pool)}
+    return {
+        'shop': 'Замер параметров',
+        'categories': [{'id': FIRST_CATEGORY_ID + index, 'name': f'Замер {index}'} for index in range(categories)],
+        'goods': [
+            {'id': index, 'category': FIRST_CATEGORY_ID + index % categories, 'model': f'model-{index % 97}',
+             'name': f'Замер товар {index}', 'price': 1000 + index % 5000, 'price_rrc': 1200 + index % 5000,
+             'quantity': index % 50,
+             'parameters': {name: rng.choice(choices[name]) for name in rng.sample(pool, per_item)}}
+            for index in range(1, items + 1)
+        ],
+    }
+
+
+def stored_bytes(shop):
+    """
+    Функция для подсчета байт, занятых значениями параметров магазина: строки в value,
+    ссылки на словарь (8 байт) и использованные строки словаря.
+    """
+    parameters = ProductParameter.objects.filter(product_info__shop=shop)
+    inline = sum(len(value.encode()) for value in parameters.values_list('value', flat=True))
+    refs = parameters.exclude(value_ref=None).count() * 8
+    dictionary = sum(len(value.encode()) + 8 for value in ParameterValue.objects.filter(
+        product_parameters__product_info__shop=shop).distinct().values_list('value', flat=True))
+    return inline + refs + dictionary
+
+
+class Command(BaseCommand):
+    help = ('Замер импорта и объема значений параметров: без кэша названий, с кэшем процесса '
+            'и со словарем значений. Пишет в настроенную БД и удаляет свои данные, запускать на dev-базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=5000, help='предложений в каталоге')
+        parser.add_argument('--names', type=int, default=300, help='разных названий параметров')
+        parser.add_argument('--per-item', type=int, default=8, help='параметров у предложения')
+
+    def handle(self, *args, **options):
+        catalog = build_catalog(options['items'], options['names'], options['per_item'])
+        user, _ = User.objects.get_or_create(email='parameters-benchmark@shops.local', defaults={
+            'username': 'parameters-benchmark', 'type': 'shop'})
+        last_ids = {model: model.objects.aggregate(last=Max('id'))['last'] or 0
+                    for model in (Parameter, ParameterValue)}
+        cache_size, dictionary = PARAMETER_NAMES.maxsize, settings.PARAMETER_VALUE_DICTIONARY
+        cases = (
+            ('no cache', 0, False),
+            ('cache, cold', cache_size, False),
+            ('cache, warm', cache_size, False),
+            ('dictionary, cold', cache_size, True),
+            ('dictionary, warm', cache_size, True),
+        )
+        self.compare_lookups(catalog)
+        self.stdout.write(f'{"case":<20}{"load, s":>10}{"items/s":>10}{"values, KB":>12}{"cache hits":>12}')
+        try:
+            for name, size, use_dictionary in cases:
+                PARAMETER_NAMES.maxsize = PARAMETER_VALUES.maxsize = size
+                if size == 0 or name.endswith('cold'):
+                    PARAMETER_NAMES.clear()
+                    PARAMETER_VALUES.clear()
+                settings.PARAMETER_VALUE_DICTIONARY = use_dictionary
+                hits = PARAMETER_NAMES.hits + PARAMETER_VALUES.hits
+                start = time.perf_counter()
+                with transaction.atomic():
+                    load_price_list(catalog, user)
+                elapsed = time.perf_counter() - start
+                shop = Shop.objects.get(name=catalog['shop'], user=user)
+                self.stdout.write(f'{name:<20}{elapsed:>10.2f}{options["items"] / elapsed:>10.0f}'
+                                  f'{stored_bytes(shop) / 1024:>12.0f}'
+                                  f'{PARAMETER_NAMES.hits + PARAMETER_VALUES.hits - hits:>12}')
+        finally:
+            PARAMETER_NAMES.maxsize, PARAMETER_VALUES.maxsize = cache_size, settings.PARAMETER_VALUE_CACHE_SIZE
+            settings.PARAMETER_VALUE_DICTIONARY = dictionary
+            Shop.objects.filter(user=user).delete()
+            Category.objects.filter(id__gte=FIRST_CATEGORY_ID,
+                                    id__lt=FIRST_CATEGORY_ID + len(catalog['categories'])).delete()
+            user.delete()
+            # удаляем созданные замером названия и значения, на которые больше никто не ссылается
+            for model, last_id in last_ids.items():
+                model.objects.filter(id__gt=last_id, product_parameters=None).delete()
+
+    def compare_lookups(self, catalog):
+        """
+        Функция для сравнения разрешения названий параметров: прежний get_or_create на каждый параметр
+        каждой позиции против пачки через кэш процесса. Выполняется в откатываемой транзакции.
+        """
+        names = [name for item in catalog['goods'] for name in item['parameters']]
+        with transaction.atomic():
+            start = time.perf_counter()
+            for name in names:
+                Parameter.objects.get_or_create(name=name)
+            per_parameter = time.perf_counter() - start
+            PARAMETER_NAMES.clear()
+            start = time.perf_counter()
+            parameter_ids(names)
+            batched = time.perf_counter() - start
+            transaction.set_rollback(True)
+        PARAMETER_NAMES.clear()
+        self.stdout.write(f'name lookups: {len(names)} get_or_create {per_parameter:.2f}s, '
+                          f'batched {batched * 1000:.1f}ms')
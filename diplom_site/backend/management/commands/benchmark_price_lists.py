@@ -0,0 +1,68 @@
+import gc
+import time
+import tracemalloc
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from backend.pricelists import PARSERS, dump_price_list, parse_price_list, validate_price_list
+
+
+def build_catalog(items, categories=20, parameters=5):
+    """
+    Функция для построения синтетического прайса заданного размера.
+    :return: dict() в формате shop/categories/goods
+    """
+    return {
+        'shop': 'Тестовый магазин',
+        'categories': [{'id': index, 'name': f'Категория {index}'} for index in range(1, categories + 1)],
+        'goods': [
+            {'id': index, 'category': index % categories + 1, 'model': f'model-{index % 97}',
+             'name': f'Товар {index}', 'price': 1000 + index % 5000, 'price_rrc': 1200 + index % 5000,
+             'quantity': index % 50, 'parameters': {f'Параметр {number}': f'значение {index % (number + 3)}'
+                                                    for number in range(parameters)}}
+            for index in range(1, items + 1)
+        ],
+    }
+
+
+def pure_python_yaml(content):
+    # прежний способ разбора в load_yaml_task, для сравнения
+    import yaml
+
+    return yaml.full_load(content)
+
+
+class Command(BaseCommand):
+    help = 'Сравнение времени и памяти разбора одного каталога в форматах YAML, JSON и CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000, help='предложений в каталоге')
+        parser.add_argument('--repeat', type=int, default=3, help='запусков на формат, берется лучший')
+
+    def handle(self, *args, **options):
+        catalog = build_catalog(options['items'])
+        cases = [(price_format, partial(parse_price_list, price_format=price_format),
+                  dump_price_list(catalog, price_format)) for price_format in PARSERS]
+        cases.append(('yaml full_load', pure_python_yaml, dump_price_list(catalog, 'yaml')))
+        self.stdout.write(f'{"format":<16}{"size, KB":>10}{"parse, ms":>12}{"peak, MB":>10}{"items/s":>12}')
+        for name, parse, content in cases:
+            data = parse(content)
+            if validate_price_list(data):
+                self.stderr.write(f'{name}: parsed catalog is invalid')
+                continue
+            elapsed = min(self.timed(parse, content) for _ in range(options['repeat']))
+            # память замеряется отдельным запуском: tracemalloc заметно замедляет разбор
+            tracemalloc.start()
+            parse(content)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stdout.write(f'{name:<16}{len(content.encode()) / 1024:>10.0f}{elapsed * 1000:>12.1f}'
+                              f'{peak / 1024 / 1024:>10.1f}{options["items"] / elapsed:>12.0f}')
+
+    @staticmethod
+    def timed(parse, content):
+        gc.collect()
+        start = time.perf_counter()
+        parse(content)
+        return time.perf_counter() - start
@@ -0,0 +1,42 @@
+import gc
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.models import Category, Product
+from backend.projections import project_products
+from backend.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = ('Сравнение скорости построения списка товаров сериализатором DRF и проекцией через values_list(). '
+            'Товары создаются в откатываемой транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='товаров в списке')
+        parser.add_argument('--repeat', type=int, default=3, help='запусков на способ, берется лучший')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            category = Category.objects.create(name='Тестовая категория')
+            Product.objects.bulk_create(Product(name=f'Товар {index}', category=category) for index in range(rows))
+            products = Product.objects.filter(category=category)
+            cases = [
+                # сериализатор без N+1: сравниваем именно стоимость построения полей
+                ('serializer', lambda: ProductSerializer(products.select_related('category'), many=True).data),
+                ('projection', lambda: project_products(products.all())),
+            ]
+            self.stdout.write(f'{"method":<12}{"ms":>10}{"rows/s":>12}')
+            for name, build in cases:
+                elapsed = min(self.timed(build) for _ in range(options['repeat']))
+                self.stdout.write(f'{name:<12}{elapsed * 1000:>10.1f}{rows / elapsed:>12.0f}')
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def timed(build):
+        gc.collect()
+        start = time.perf_counter()
+        build()
+        return time.perf_counter() - start
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from backend.models import Shop, User
+from backend.categories import refresh_category_stats
+from backend.snapshots import write_snapshot
+from backend.pricelists import read_price_list_file, load_price_list, PRICE_LIST_EXTENSIONS
+
+# сколько ошибок одного файла выводить
+MAX_ERRORS_SHOWN = 5
+
+
+class Command(BaseCommand):
+    help = ('Загрузка каталога прайс-листов без Celery: файлы разбираются и проверяются в пуле процессов, '
+            'каждый магазин загружается тем же кодом, что и load_yaml_task.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='каталог с файлами прайс-листов')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='процессов для разбора')
+        parser.add_argument('--dry-run', action='store_true', help='только разобрать и проверить файлы')
+        parser.add_argument('--email-domain', default='shops.local',
+                            help='домен почты для создаваемых владельцев новых магазинов')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f'{directory} is not a directory')
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                       if name.lower().endswith(PRICE_LIST_EXTENSIONS))
+        if not paths:
+            raise CommandError(f'No price lists in {directory}')
+
+        # дочерние процессы не работают с БД, но наследуют соединения при fork
+        connections.close_all()
+        # каждый файл разбирается один раз: разобранные данные возвращаются из пула вместе с отчетом
+        # и загружаются после проверки всех файлов, при --dry-run данные не передаются
+        read = partial(read_price_list_file, keep_data=not options['dry_run'])
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            start = time.perf_counter()
+            reports = list(executor.map(read, paths))
+        self.report_validation(reports, time.perf_counter() - start)
+        if options['dry_run']:
+            return
+        start = time.perf_counter()
+        items = 0
+        for report in reports:
+            load_start = time.perf_counter()
+            # один магазин - одна транзакция: меньше фиксаций и нет наполовину загруженных магазинов
+            with transaction.atomic():
+                user = self.get_shop_owner(report['shop'], options['email_domain'])
+                load_price_list(report.pop('data'), user)
+            # воркеры Celery при загрузке не нужны, поэтому файл каталога пишем сразу
+            write_snapshot(Shop.objects.get(name=report['shop'], user=user).id)
+            load_time = time.perf_counter() - load_start
+            items += report['items']
+            self.stdout.write(f'{os.path.basename(report["path"])}: {report["items"]} items, '
+                              f'parse {report["seconds"]:.2f}s, load {load_time:.2f}s, '
+                              f'{report["items"] / load_time if load_time else 0:.0f} items/s')
+        refresh_category_stats()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(paths)} files, {items} items in {elapsed:.2f}s, '
+                                             f'{items / elapsed if elapsed else 0:.0f} items/s'))
+
+    def report_validation(self, reports, elapsed):
+        """
+        Функция для вывода результатов проверки файлов. Если хотя бы один файл некорректен,
+        ничего не загружается.
+        """
+        items = sum(report['items'] for report in reports)
+        invalid = [report for report in reports if report['errors']]
+        for report in invalid:
+            self.stderr.write(f'{os.path.basename(report["path"])}: {len(report["errors"])} errors')
+            for error in report['errors'][:MAX_ERRORS_SHOWN]:
+                self.stderr.write(f'  {error}')
+        self.stdout.write(f'Validated {len(reports)} files, {items} items in {elapsed:.2f}s, '
+                          f'{items / elapsed if elapsed else 0:.0f} items/s')
+        if invalid:
+            raise CommandError(f'{len(invalid)} invalid price lists, nothing loaded')
+
+    def get_shop_owner(self, shop_name, email_domain):
+        """
+        Функция для получения владельца магазина: у существующего магазина берется его пользователь,
+        для нового создается пользователь-магазин без пароля.
+        :return: объект User
+        """
+        shop = Shop.objects.filter(name=shop_name).exclude(user=None).select_related('user').first()
+        if shop is not None:
+            return shop.user
+        # названия магазинов бывают на кириллице, поэтому адрес строится по хэшу названия
+        login = 'shop-' + hashlib.sha1(shop_name.encode()).hexdigest()[:12]
+        user, created = User.objects.get_or_create(email=f'{login}@{email_domain}', defaults={
+            'username': login,
+            'first_name': shop_name[:40],
+            'last_name': 'Магазин',
+            'type': 'shop',
+        })
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        return user
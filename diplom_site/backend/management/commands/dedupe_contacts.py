@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from backend.models import Contact, Order, contact_fingerprint
+
+
+class Command(BaseCommand):
+    help = 'Заполняет хэши контактов и объединяет дубликаты, перенаправляя на оставшийся контакт заказы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        filled = self.fill_fingerprints(batch_size)
+        merged, repointed = self.merge_duplicates(batch_size)
+        self.stdout.write(f'Fingerprints filled: {filled}, duplicates removed: {merged}, '
+                          f'orders repointed: {repointed}')
+
+    def fill_fingerprints(self, batch_size):
+        """
+        Функция для заполнения хэшей у контактов, созданных до их появления.
+        :return: количество обновленных контактов
+        """
+        filled = 0
+        last_id = 0
+        while True:
+            contacts = list(Contact.objects.filter(id__gt=last_id).order_by('id')
+                            .only('id', 'city', 'address', 'phone', 'fingerprint')[:batch_size])
+            if not contacts:
+                return filled
+            last_id = contacts[-1].id
+            changed = []
+            for contact in contacts:
+                fingerprint = contact_fingerprint(contact.city, contact.address, contact.phone)
+                if contact.fingerprint != fingerprint:
+                    contact.fingerprint = fingerprint
+                    changed.append(contact)
+            Contact.objects.bulk_update(changed, ['fingerprint'])
+            filled += len(changed)
+
+    def merge_duplicates(self, batch_size):
+        """
+        Функция для объединения дубликатов: в каждой группе остается контакт с минимальным id.
+        Каждая пачка групп обрабатывается в отдельной транзакции.
+        :return: количество удаленных контактов и перенаправленных заказов
+        """
+        merged, repointed = 0, 0
+        while True:
+            groups = list(Contact.objects.values('user_id', 'fingerprint')
+                          .annotate(keep_id=Min('id'), total=Count('id'))
+                          .filter(total__gt=1)
+                          .order_by('keep_id')[:batch_size])
+            if not groups:
+                return merged, repointed
+            with transaction.atomic():
+                for group in groups:
+                    duplicates = list(Contact.objects.filter(user_id=group['user_id'],
+                                                             fingerprint=group['fingerprint'])
+                                      .exclude(id=group['keep_id']).values_list('id', flat=True))
+                    # сначала перенаправляем заказы: удаление контакта каскадно удалило бы их
+                    repointed += Order.objects.filter(contact_id__in=duplicates).update(contact_id=group['keep_id'])
+                    merged += Contact.objects.filter(id__in=duplicates).delete()[0]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.importtime import ENTRY_POINTS, measure, total_time, by_package, top_imports
+
+
+class Command(BaseCommand):
+    help = 'Замер времени запуска и импорта модулей для wsgi, asgi, celery и manage.py и проверка бюджета.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', action='append', choices=list(ENTRY_POINTS),
+                            help='точка входа, по умолчанию все')
+        parser.add_argument('--top', type=int, default=10, help='сколько модулей и пакетов выводить')
+        parser.add_argument('--repeat', type=int, default=3, help='запусков на точку входа, берется лучший')
+
+    def handle(self, *args, **options):
+        over_budget = []
+        for entry in options['entry'] or ENTRY_POINTS:
+            try:
+                elapsed, records = measure(entry, options['repeat'])
+            except RuntimeError as error:
+                raise CommandError(str(error))
+            budget = settings.IMPORT_TIME_BUDGETS.get(entry)
+            self.stdout.write(f'{entry}: startup {elapsed:.1f}ms, imports {total_time(records) / 1000:.1f}ms '
+                              f'in {len(records)} modules, budget {budget}ms')
+            self.stdout.write('  packages:')
+            for package, cost in by_package(records)[:options['top']]:
+                self.stdout.write(f'    {package:<40}{cost / 1000:>10.1f}ms')
+            self.stdout.write('  imports:')
+            for module, cost in top_imports(records, options['top']):
+                self.stdout.write(f'    {module:<40}{cost / 1000:>10.1f}ms')
+            if budget is not None and elapsed > budget:
+                over_budget.append(f'{entry}: {elapsed:.1f}ms > budget {budget}ms')
+        if over_budget:
+            raise CommandError('Startup time over budget:\n' + '\n'.join(over_budget))
+        self.stdout.write(self.style.SUCCESS('Startup time within budget'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.loadtest import run_load, compare_with_baseline, load_baseline, save_baseline, PERCENTILES
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера: сценарии покупателей параллельно с импортами магазина. '
+            'Для прогона стоит поднять лимиты THROTTLE_ANON и THROTTLE_USER.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--sessions', type=int, default=50, help='количество сессий покупателей')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--shop-token', help='токен пользователя-магазина для PartnerUpdate')
+        parser.add_argument('--price-list-url', help='адрес .yaml прайса для импорта')
+        parser.add_argument('--imports', type=int, default=0, help='количество импортов за прогон')
+        parser.add_argument('--baseline', help='файл эталона для сравнения')
+        parser.add_argument('--save-baseline', help='сохранить отчет как эталон в файл')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение, доля')
+
+    def handle(self, *args, **options):
+        report = run_load(options['base_url'], options['sessions'], options['concurrency'],
+                          options['shop_token'], options['price_list_url'], options['imports'])
+        columns = ['requests', 'errors', 'rps'] + [f'p{value}' for value in PERCENTILES]
+        self.stdout.write(f'{"endpoint":<24}' + ''.join(f'{column:>10}' for column in columns))
+        for endpoint, stats in report.items():
+            self.stdout.write(f'{endpoint:<24}' + ''.join(f'{stats[column]:>10}' for column in columns))
+
+        if options['save_baseline']:
+            save_baseline(options['save_baseline'], report)
+            self.stdout.write(f'Baseline saved to {options["save_baseline"]}')
+        if options['baseline']:
+            regressions = compare_with_baseline(report, load_baseline(options['baseline']), options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
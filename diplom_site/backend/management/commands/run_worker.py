@@ -0,0 +1,35 @@
+import os
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def worker_argv(queue, options):
+    """
+    Функция для построения командной строки воркера Celery одной очереди.
+    :param queue: имя очереди из CELERY_WORKER_QUEUES
+    :param options: настройки очереди: concurrency и prefetch_multiplier
+    :return: list() аргументов
+    """
+    return [sys.executable, '-m', 'celery', '-A', 'diplom_site', 'worker', '-E', '-l', 'info',
+            '-Q', queue, '-n', f'{queue}@%h',
+            '--concurrency', str(options['concurrency']),
+            '--prefetch-multiplier', str(options['prefetch_multiplier'])]
+
+
+class Command(BaseCommand):
+    help = 'Запуск воркера Celery для одной очереди с ее количеством процессов и prefetch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queue', choices=list(settings.CELERY_WORKER_QUEUES), help='очередь')
+        parser.add_argument('--concurrency', type=int, help='количество процессов вместо заданного в настройках')
+
+    def handle(self, *args, **options):
+        queue_options = dict(settings.CELERY_WORKER_QUEUES[options['queue']])
+        if options['concurrency']:
+            queue_options['concurrency'] = options['concurrency']
+        argv = worker_argv(options['queue'], queue_options)
+        self.stdout.write(' '.join(argv))
+        # воркер заменяет текущий процесс, роль worker отключает в нем веб-приложения
+        os.execve(sys.executable, argv, {**os.environ, 'DJANGO_ROLE': 'worker'})
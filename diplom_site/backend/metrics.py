@@ -0,0 +1,92 @@
+"""
+Метрики в текстовом формате Prometheus.
+
+Значения хранятся в кэше Django, поэтому метрики, записанные воркерами Celery, видны веб-процессу,
+который отдает их на /metrics/. Для общих метрик в production кэш должен быть общим (Redis, CACHE_URL).
+"""
+from django.core.cache import cache
+
+KEY_PREFIX = 'metrics'
+# суммы хранятся в микросекундах, т.к. incr работает только с целыми числами
+SCALE = 1000000
+
+
+def _labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _key(name, labels, suffix=''):
+    return f'{KEY_PREFIX}:{name}{suffix}:{_labels(labels)}'
+
+
+def _incr(key, amount):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # ключ мог быть вытеснен между add и incr
+        cache.set(key, amount, timeout=None)
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+
+    def inc(self, labels, amount=1):
+        _incr(_key(self.name, labels), amount)
+
+    def render(self, label_sets):
+        keys = {_key(self.name, labels): labels for labels in label_sets}
+        values = cache.get_many(keys)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{{{_labels(labels)}}} {values.get(key, 0)}' for key, labels in keys.items()]
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+
+    def set(self, labels, value):
+        cache.set(_key(self.name, labels), value, timeout=None)
+
+    def render(self, label_sets):
+        keys = {_key(self.name, labels): labels for labels in label_sets}
+        values = cache.get_many(keys)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        lines += [f'{self.name}{{{_labels(labels)}}} {values[key]}' for key, labels in keys.items() if key in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        # каждое наблюдение попадает в один бакет, накопительные значения считаются при выводе
+        bucket = next((str(bound) for bound in self.buckets if value <= bound), '+Inf')
+        _incr(_key(self.name, {**labels, 'le': bucket}, '_bucket'), 1)
+        _incr(_key(self.name, labels, '_sum'), int(value * SCALE))
+        _incr(_key(self.name, labels, '_count'), 1)
+
+    def render(self, label_sets):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        keys = []
+        for labels in label_sets:
+            keys += [_key(self.name, {**labels, 'le': bound}, '_bucket') for bound in bounds]
+            keys += [_key(self.name, labels, '_sum'), _key(self.name, labels, '_count')]
+        values = cache.get_many(keys)
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels in label_sets:
+            total = 0
+            for bound in bounds:
+                total += values.get(_key(self.name, {**labels, 'le': bound}, '_bucket'), 0)
+                lines.append(f'{self.name}_bucket{{{_labels({**labels, "le": bound})}}} {total}')
+            value_sum = values.get(_key(self.name, labels, '_sum'), 0) / SCALE
+            lines.append(f'{self.name}_sum{{{_labels(labels)}}} {value_sum}')
+            lines.append(f'{self.name}_count{{{_labels(labels)}}} {values.get(_key(self.name, labels, "_count"), 0)}')
+        return lines
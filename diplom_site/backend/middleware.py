@@ -0,0 +1,239 @@
+import io
+import zlib
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as DjangoAuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware as DjangoMessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+from django.core.exceptions import SuspiciousOperation
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware as DjangoCsrfViewMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+from backend.routers import pin_to_primary
+from backend.profiling import profiling_requested, is_staff_request, run_profiled
+from backend.slowqueries import set_source, reset_source
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+# размер порции при распаковке тела запроса
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DECOMPRESS_ERRORS = (zlib.error, brotli.error) if brotli is not None else (zlib.error,)
+# потоковая распаковка с ограничением вывода есть только в brotli>=1.2, со старой версией
+# тела запросов в br не принимаются (415), сжатие ответов работает с любой
+BROTLI_STREAMING = brotli is not None and hasattr(brotli.Decompressor, 'can_accept_more_data')
+REQUEST_ENCODINGS = ('gzip', 'br') if BROTLI_STREAMING else ('gzip',)
+
+
+def parse_accept_encoding(header):
+    """
+    Функция для разбора заголовка Accept-Encoding.
+    :param header: значение заголовка
+    :return: set() кодировок, которые клиент принимает (q > 0)
+    """
+    encodings = set()
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name and quality > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def decompress_body(body, encoding, max_size):
+    """
+    Функция для распаковки сжатого тела запроса с ограничением размера результата.
+    :param body: сжатое тело запроса
+    :param encoding: значение Content-Encoding
+    :param max_size: максимальный размер распакованных данных, None - без ограничения
+    :return: bytes
+    """
+    if encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = decompressor.decompress(body, max_size + 1 if max_size is not None else 0)
+        finished = decompressor.eof
+    elif encoding == 'br' and BROTLI_STREAMING:
+        data, finished = _brotli_decompress(body, max_size)
+    else:
+        raise SuspiciousOperation(f'Unsupported Content-Encoding: {encoding}')
+    if max_size is not None and len(data) > max_size:
+        raise SuspiciousOperation('Decompressed request body exceeded DATA_UPLOAD_MAX_MEMORY_SIZE')
+    if not finished:
+        raise SuspiciousOperation('Truncated compressed request body')
+    return data
+
+
+def _brotli_decompress(body, max_size):
+    """
+    Функция для потоковой распаковки brotli: вывод читается порциями и распаковка
+    прекращается, как только результат превысил max_size.
+    :param body: сжатое тело запроса
+    :param max_size: максимальный размер распакованных данных, None - без ограничения
+    :return: tuple() из распакованных данных и признака конца потока
+    """
+    decompressor = brotli.Decompressor()
+    chunks = []
+    size = 0
+    for offset in range(0, max(len(body), 1), DECOMPRESS_CHUNK_SIZE):
+        data = decompressor.process(body[offset:offset + DECOMPRESS_CHUNK_SIZE],
+                                    output_buffer_limit=DECOMPRESS_CHUNK_SIZE)
+        while True:
+            chunks.append(data)
+            size += len(data)
+            if max_size is not None and size > max_size:
+                return b''.join(chunks), False
+            if decompressor.can_accept_more_data():
+                break
+            # выходной буфер заполнен, дочитываем его без новых входных данных
+            data = decompressor.process(b'', output_buffer_limit=DECOMPRESS_CHUNK_SIZE)
+    return b''.join(chunks), decompressor.is_finished()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Middleware для согласования сжатия. Ответы больше порога сжимаются в brotli или gzip
+    в зависимости от Accept-Encoding, тела запросов с Content-Encoding распаковываются
+    до того, как их прочитают парсеры DRF.
+    """
+
+    def process_request(self, request):
+        encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not encoding or encoding == 'identity':
+            return
+        if encoding not in REQUEST_ENCODINGS:
+            # RFC 7694: сообщаем клиенту, какие кодировки тела запроса поддерживаются
+            return HttpResponse(status=415, headers={'Accept-Encoding': ', '.join(REQUEST_ENCODINGS)})
+        try:
+            body = decompress_body(request.body, encoding, settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+        except DECOMPRESS_ERRORS:
+            raise SuspiciousOperation('Malformed compressed request body')
+        # подменяем тело запроса распакованными данными
+        request._body = body
+        request._stream = io.BytesIO(body)
+        request.META['CONTENT_LENGTH'] = str(len(body))
+        del request.META['HTTP_CONTENT_ENCODING']
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_LENGTH:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+            compressed_content = brotli.compress(response.content, quality=settings.RESPONSE_BROTLI_QUALITY)
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+            compressed_content = compress_string(response.content)
+        else:
+            return response
+        if len(compressed_content) >= len(response.content):
+            return response
+        # ETag каталога уже учитывает Accept-Encoding, поэтому остается сильным
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(compressed_content))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class PrimaryPinMiddleware(MiddlewareMixin):
+    """
+    Middleware, закрепляющее пользователя за основной БД после успешного изменяющего запроса.
+    DRF сохраняет аутентифицированного по токену пользователя в request.user, поэтому
+    закрепление работает и для API, и для админки.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and hasattr(request, 'user'):
+            pin_to_primary(request.user)
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Middleware для профилирования отдельного запроса по требованию сотрудника.
+    Запросы без X-Profile или ?profile=1 проходят без дополнительной работы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling_requested(request) or not is_staff_request(request):
+            return self.get_response(request)
+        response, profile_id = run_profiled(self.get_response, request)
+        response.headers['X-Profile-Id'] = profile_id
+        response.headers['X-Profile-Url'] = f'/profiles/{profile_id}/collapsed/'
+        return response
+
+
+class SlowQueryMiddleware(MiddlewareMixin):
+    """
+    Middleware, которое указывает журналу медленных запросов источник: view и действие viewset.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            source = f'{view_func.__module__}.{view_func.__name__}'
+        else:
+            actions = getattr(view_func, 'actions', None) or {}
+            source = f'{view_class.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+        request._slow_query_token = set_source(source)
+
+    def process_response(self, request, response):
+        token = getattr(request, '_slow_query_token', None)
+        if token is not None:
+            reset_source(token)
+        return response
+
+
+class SessionRoutesMixin:
+    """
+    Примесь для middleware сессий, CSRF, аутентификации и сообщений Django: они нужны только страницам
+    из SESSION_PATH_PREFIXES (админка, allauth). Остальные пути - API DRF с аутентификацией по токену,
+    для них middleware пропускается целиком. Классы остаются наследниками стандартных,
+    поэтому проверки админки находят их в MIDDLEWARE.
+    """
+    # __call__ переопределен синхронным, при ASGI Django сам адаптирует такое middleware
+    async_capable = False
+
+    def __call__(self, request):
+        if not request.path_info.startswith(settings.SESSION_PATH_PREFIXES):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(SessionRoutesMixin, DjangoSessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(SessionRoutesMixin, DjangoCsrfViewMiddleware):
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # process_view вызывается обработчиком Django в обход __call__
+        if not request.path_info.startswith(settings.SESSION_PATH_PREFIXES):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(SessionRoutesMixin, DjangoAuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(SessionRoutesMixin, DjangoMessageMiddleware):
+    pass
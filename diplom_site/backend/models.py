@@ -1,4 +1,9 @@
+import hashlib
+
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Coalesce, Upper
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 USER_TYPE_CHOICES = (
     ('shop', 'Магазин'),
@@ -16,6 +21,28 @@ CITIES = (
 )
 
 
+class PrefixSearchIndex(models.Index):
+    """
+    Функциональный индекс UPPER(поле) для поиска по началу строки без учета регистра
+    (istartswith и '^' в search_fields админки). На PostgreSQL строится с классом операторов
+    text_pattern_ops: обычный btree не обслуживает LIKE при локали БД, отличной от C.
+    """
+
+    def __init__(self, field, name):
+        self.field = field
+        super().__init__(Upper(field), name=name)
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            index = models.Index(OpClass(Upper(self.field), name='text_pattern_ops'), name=self.name)
+            return index.create_sql(model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def deconstruct(self):
+        path, _, _ = super().deconstruct()
+        return path, (), {'field': self.field, 'name': self.name}
+
+
 class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
@@ -29,6 +56,10 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = "Пользователи"
+        indexes = [
+            PrefixSearchIndex('username', name='user_username_upper'),
+            PrefixSearchIndex('last_name', name='user_last_name_upper'),
+        ]
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
@@ -42,10 +73,14 @@ class Shop(models.Model):
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
     placement = models.CharField(verbose_name='Местонахождение', choices=CITIES, default=CITIES[0][0], max_length=10)
+    webhook_url = models.URLField(verbose_name='Адрес для уведомлений о заказах', blank=True, default='')
 
     class Meta:
         verbose_name = 'Магазин'
         verbose_name_plural = "Магазины"
+        indexes = [
+            PrefixSearchIndex('name', name='shop_name_upper'),
+        ]
 
     def __str__(self):
         return self.name
@@ -61,6 +96,9 @@ class Category(models.Model):
     class Meta:
         verbose_name = 'Категория'
         verbose_name_plural = "Список категорий"
+        indexes = [
+            PrefixSearchIndex('name', name='category_name_upper'),
+        ]
 
     def __str__(self):
         return self.name
@@ -75,6 +113,9 @@ class Product(models.Model):
         verbose_name = 'Товар'
         verbose_name_plural = "Список товаров"
         ordering = ('-name',)
+        indexes = [
+            PrefixSearchIndex('name', name='product_name_upper'),
+        ]
 
     def __str__(self):
         return self.name
@@ -86,7 +127,7 @@ class ProductInfo(models.Model):
                                 blank=True, on_delete=models.CASCADE)
     shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='product_info',
                              blank=True, on_delete=models.CASCADE)
-    external_id = models.PositiveIntegerField(verbose_name='Внешний идентификатор', default=0)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний идентификатор', default=0, db_index=True)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
@@ -94,6 +135,9 @@ class ProductInfo(models.Model):
     class Meta:
         verbose_name = 'Информация о продукте'
         verbose_name_plural = "Информация о продуктах"
+        indexes = [
+            PrefixSearchIndex('model', name='product_info_model_upper'),
+        ]
     constraints = [
         models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
     ]
@@ -102,8 +146,29 @@ class ProductInfo(models.Model):
         return self.product.name
 
 
+# история цен предложения: ProductInfo пересоздается при каждом импорте, поэтому
+# предложение идентифицируется магазином и внешним идентификатором, а не id
+class PriceHistory(models.Model):
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='price_history', on_delete=models.CASCADE)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний идентификатор')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    recorded_at = models.DateTimeField(verbose_name='Дата изменения', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Изменение цены'
+        verbose_name_plural = 'История цен'
+        indexes = [
+            models.Index(fields=['shop', 'external_id', 'recorded_at'], name='price_history_offer_dt'),
+        ]
+
+    def __str__(self):
+        return f'{self.external_id}: {self.price} ({self.recorded_at:%Y-%m-%d})'
+
+
 class Parameter(models.Model):
-    name = models.CharField(max_length=100, verbose_name='Название')
+    # уникальность нужна словарю названий: параллельные импорты создают названия через ignore_conflicts
+    name = models.CharField(max_length=100, verbose_name='Название', unique=True)
 
     class Meta:
         verbose_name = 'Название параметра'
@@ -113,13 +178,39 @@ class Parameter(models.Model):
         return self.name
 
 
+class ParameterValue(models.Model):
+    value = models.CharField(max_length=100, verbose_name='Значение', unique=True)
+
+    class Meta:
+        verbose_name = 'Значение параметра'
+        verbose_name_plural = "Словарь значений параметров"
+
+    def __str__(self):
+        return self.value
+
+
+class ProductParameterQuerySet(models.QuerySet):
+
+    def with_value(self):
+        """
+        Функция для добавления к выборке значения параметра value_text: из словаря значений,
+        если параметр ссылается на него, иначе из собственного поля value.
+        """
+        return self.annotate(value_text=Coalesce('value_ref__value', 'value'))
+
+
 class ProductParameter(models.Model):
     product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте',
                                      related_name='product_parameters', blank=True,
                                      on_delete=models.CASCADE)
     parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='product_parameters', blank=True,
                                   on_delete=models.CASCADE)
-    value = models.CharField(verbose_name='Значение', max_length=100)
+    value = models.CharField(verbose_name='Значение', max_length=100, blank=True)
+    # при PARAMETER_VALUE_DICTIONARY значение хранится один раз в ParameterValue, а value остается пустым
+    value_ref = models.ForeignKey(ParameterValue, verbose_name='Значение из словаря', related_name='product_parameters',
+                                  null=True, blank=True, on_delete=models.PROTECT)
+
+    objects = ProductParameterQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Параметр'
@@ -131,6 +222,22 @@ class ProductParameter(models.Model):
     def __str__(self):
         return f'{self.product_info.product.name} - {self.parameter.name}'
 
+    def get_value(self):
+        return self.value_ref.value if self.value_ref_id else self.value
+
+
+def contact_fingerprint(city, address, phone):
+    """
+    Функция для вычисления хэша контакта: регистр и лишние пробелы в городе и адресе,
+    а также форматирование телефона не влияют на результат.
+    :return: str() sha256 в hex
+    """
+    city = ' '.join(city.split()).casefold()
+    address = ' '.join(address.split()).casefold()
+    digits = ''.join(char for char in phone if char.isdigit())
+    phone = digits if digits else ' '.join(phone.split()).casefold()
+    return hashlib.sha256(f'{city}\n{address}\n{phone}'.encode()).hexdigest()
+
 
 class Contact(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь', related_name='contacts',
@@ -138,14 +245,23 @@ class Contact(models.Model):
     city = models.CharField(max_length=100, verbose_name='Город', blank=True)
     address = models.CharField(max_length=100, verbose_name='Адрес', blank=True)
     phone = models.CharField(max_length=20, verbose_name='Телефон', blank=True)
+    fingerprint = models.CharField(max_length=64, verbose_name='Хэш нормализованного контакта', blank=True,
+                                   editable=False)
 
     class Meta:
         verbose_name = 'Контакт'
         verbose_name_plural = 'Список контактов'
+        indexes = [
+            models.Index(fields=['user', 'fingerprint'], name='contact_user_fingerprint'),
+        ]
 
     def __str__(self):
         return f'Контакт {self.user} ({self.city}, {self.address})'
 
+    def save(self, *args, **kwargs):
+        self.fingerprint = contact_fingerprint(self.city, self.address, self.phone)
+        super().save(*args, **kwargs)
+
 
 class Order(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь',
@@ -171,6 +287,9 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Список заказов'
+        indexes = [
+            models.Index(fields=['state', 'dt'], name='order_state_dt'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -183,7 +302,7 @@ class OrderItem(models.Model):
                                      on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     total = models.PositiveIntegerField(verbose_name='Сумма', default=0)
-    order_number = models.CharField(verbose_name='Номер заказа', blank=True, max_length=50)
+    order_number = models.CharField(verbose_name='Номер заказа', blank=True, max_length=50, db_index=True)
 
     class Meta:
         verbose_name = 'Детали заказа'
@@ -196,3 +315,81 @@ class OrderItem(models.Model):
         return f'Заказ {self.order}'
 
 
+# архив завершенных и отмененных заказов: строки переносятся из Order/OrderItem задачей archive_orders
+# с сохранением ID, товар, магазин и контакт копируются, т.к. предложения пересоздаются при импорте
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='archived_orders',
+                             on_delete=models.CASCADE)
+    dt = models.DateTimeField(verbose_name='Дата создания')
+    state = models.CharField(verbose_name='Статус', choices=Order.status_choices, max_length=15)
+    city = models.CharField(max_length=100, verbose_name='Город', blank=True)
+    address = models.CharField(max_length=100, verbose_name='Адрес', blank=True)
+    phone = models.CharField(max_length=20, verbose_name='Телефон', blank=True)
+    archived_at = models.DateTimeField(verbose_name='Дата архивации', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Архивный заказ'
+        verbose_name_plural = 'Архив заказов'
+        indexes = [
+            models.Index(fields=['user', 'dt'], name='archived_order_user_dt'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}, {self.dt.strftime("%Y-%m-%d, %H:%M:%S")}'
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, verbose_name='Заказ', related_name='ordered_items',
+                              on_delete=models.CASCADE)
+    order_number = models.CharField(verbose_name='Номер заказа', blank=True, max_length=50, db_index=True)
+    shop_id = models.BigIntegerField(verbose_name='ID магазина', null=True)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний идентификатор', default=0)
+    product_name = models.CharField(max_length=80, verbose_name='Товар')
+    shop_name = models.CharField(max_length=50, verbose_name='Магазин')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    total = models.PositiveIntegerField(verbose_name='Сумма', default=0)
+
+    class Meta:
+        verbose_name = 'Архивные детали заказа'
+        verbose_name_plural = 'Архив деталей заказов'
+
+    def __str__(self):
+        return f'Заказ {self.order}'
+
+
+class CatalogVersion(models.Model):
+    name = models.CharField(max_length=20, unique=True, verbose_name='Раздел каталога')
+    version = models.PositiveBigIntegerField(default=1, verbose_name='Версия')
+
+    class Meta:
+        verbose_name = 'Версия каталога'
+        verbose_name_plural = 'Версии каталога'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+# исходящее событие по заказу для магазина (outbox): пишется в одной транзакции с изменением заказа
+# и доставляется на webhook_url магазина задачей dispatch_order_events
+class OrderEvent(models.Model):
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='events', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='order_events', on_delete=models.CASCADE)
+    event = models.CharField(verbose_name='Событие', max_length=30)
+    payload = models.JSONField(verbose_name='Данные события', default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попытки доставки', default=0)
+    next_attempt_at = models.DateTimeField(verbose_name='Следующая попытка', default=timezone.now)
+    delivered_at = models.DateTimeField(verbose_name='Доставлено', blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Событие заказа'
+        verbose_name_plural = 'События заказов'
+        indexes = [
+            models.Index(fields=['delivered_at', 'next_attempt_at'], name='order_event_pending'),
+        ]
+
+    def __str__(self):
+        return f'{self.event} ({self.order_id})'
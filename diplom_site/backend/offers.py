@@ -0,0 +1,76 @@
+"""
+Частичное обновление цен и остатков магазина без полного импорта прайса.
+"""
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+
+from backend.models import ProductInfo
+from backend.etags import bump_catalog_version
+from backend.prices import record_price_changes
+
+DELTA_FIELDS = ('price', 'price_rrc', 'quantity')
+
+
+def validate_offer_changes(changes):
+    """
+    Функция для проверки списка изменений предложений.
+    :param changes: list() словарей {external_id, price, price_rrc, quantity}, поля кроме external_id необязательны
+    :return: list() строк с описанием ошибок
+    """
+    if not isinstance(changes, list) or not changes:
+        return ['changes must be a non-empty list']
+    errors = []
+    for index, change in enumerate(changes):
+        if not isinstance(change, dict):
+            errors.append(f'changes[{index}]: must be an object')
+            continue
+        fields = [field for field in DELTA_FIELDS if field in change]
+        if not fields:
+            errors.append(f'changes[{index}]: at least one of {", ".join(DELTA_FIELDS)} is required')
+        for field in ('external_id', *fields):
+            value = change.get(field)
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                errors.append(f'changes[{index}]: {field} must be a non-negative integer')
+    return errors
+
+
+def apply_offer_changes(shop_id, changes, batch_size):
+    """
+    Функция для применения изменений к предложениям магазина. Предложения ищутся по (shop, external_id),
+    каждая пачка обновляется одним UPDATE с CASE по external_id, изменения цен пишутся в историю.
+    :param shop_id: ID магазина
+    :param changes: проверенный validate_offer_changes() список изменений
+    :param batch_size: размер пачки
+    :return: количество обновленных предложений и list() неизвестных external_id
+    """
+    # при повторе external_id в запросе действует последнее изменение
+    changes = list({change['external_id']: change for change in changes}.values())
+    updated, unknown = 0, []
+    with transaction.atomic():
+        for start in range(0, len(changes), batch_size):
+            batch = changes[start:start + batch_size]
+            offers = ProductInfo.objects.filter(shop_id=shop_id, external_id__in=[change['external_id']
+                                                                                   for change in batch])
+            old_prices = {external_id: (price, price_rrc) for external_id, price, price_rrc
+                          in offers.select_for_update().values_list('external_id', 'price', 'price_rrc')}
+            known = [change for change in batch if change['external_id'] in old_prices]
+            unknown += [change['external_id'] for change in batch if change['external_id'] not in old_prices]
+            values = {}
+            for field in DELTA_FIELDS:
+                cases = [When(external_id=change['external_id'], then=Value(change[field]))
+                         for change in known if field in change]
+                if cases:
+                    values[field] = Case(*cases, default=F(field), output_field=ProductInfo._meta.get_field(field))
+            if not values:
+                continue
+            updated += offers.filter(external_id__in=[change['external_id'] for change in known]).update(**values)
+            record_price_changes(shop_id, old_prices, [
+                {'id': change['external_id'],
+                 'price': change.get('price', old_prices[change['external_id']][0]),
+                 'price_rrc': change.get('price_rrc', old_prices[change['external_id']][1])}
+                for change in known if 'price' in change or 'price_rrc' in change
+            ])
+        if updated:
+            # цены и остатки изменились - сбрасываем ETag каталога
+            bump_catalog_version()
+    return updated, unknown
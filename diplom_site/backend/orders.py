@@ -0,0 +1,97 @@
+"""
+Обработка заказов магазином: список открытых заказов и массовая смена статуса.
+"""
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+
+from backend.models import Order, OrderItem, ProductInfo, Shop
+from backend.etags import bump_catalog_version
+
+# допустимые переходы для магазина: целевой статус -> статусы, из которых в него можно перейти.
+# Остаток списывается при подтверждении, поэтому отменить можно только подтвержденный или отправленный заказ
+SHOP_TRANSITIONS = {
+    'sent': ('confirmed',),
+    'completed': ('sent',),
+    'cancelled': ('confirmed', 'sent'),
+}
+OPEN_STATES = ('new', 'confirmed', 'sent')
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def shop_orders(shop):
+    """
+    Функция для получения заказов, которые целиком состоят из товаров магазина.
+    :param shop: объект Shop
+    :return: QuerySet заказов
+    """
+    return Order.objects.filter(ordered_items__product_info__shop=shop) \
+        .exclude(ordered_items__product_info__shop__in=Shop.objects.exclude(id=shop.id)).distinct()
+
+
+def orders_page(shop, states, after=None, limit=PAGE_SIZE):
+    """
+    Функция для постраничного получения заказов магазина по дате создания. Страницы строятся
+    по ключу (dt, id) после последнего заказа предыдущей страницы, что использует индекс (state, dt).
+    :param shop: объект Shop
+    :param states: статусы заказов
+    :param after: ID последнего заказа предыдущей страницы
+    :param limit: размер страницы
+    :return: list() заказов и ID для следующей страницы или None
+    """
+    orders = shop_orders(shop).filter(state__in=states)
+    if after is not None:
+        last = Order.objects.filter(id=after).values_list('dt', flat=True).first()
+        if last is not None:
+            orders = orders.filter(Q(dt__gt=last) | Q(dt=last, id__gt=after))
+    page = list(orders.order_by('dt', 'id').values('id', 'dt', 'state')[:limit])
+    items = OrderItem.objects.filter(order_id__in=[order['id'] for order in page]).order_by('id') \
+        .values_list('order_id', 'id', 'order_number', 'product_info__product__name', 'product_info__external_id',
+                     'quantity', 'total')
+    by_order = {order['id']: {**order, 'items': []} for order in page}
+    for order_id, pk, order_number, name, external_id, quantity, total in items:
+        by_order[order_id]['items'].append({'id': pk, 'order_number': order_number, 'product': name,
+                                            'external_id': external_id, 'quantity': quantity, 'total': total})
+    return list(by_order.values()), page[-1]['id'] if len(page) == limit else None
+
+
+def change_orders_state(shop, order_ids, state):
+    """
+    Функция для массовой смены статуса заказов магазина. Заказы блокируются, статус меняется
+    одним UPDATE, при отмене остатки возвращаются в ProductInfo.quantity в той же транзакции.
+    :param shop: объект Shop
+    :param order_ids: ID заказов
+    :param state: целевой статус из SHOP_TRANSITIONS
+    :return: list() измененных ID и dict() {ID: причина} для отклоненных
+    """
+    sources = SHOP_TRANSITIONS[state]
+    with transaction.atomic():
+        found = dict(Order.objects.select_for_update()
+                     .filter(id__in=shop_orders(shop).filter(id__in=order_ids).values('id'))
+                     .values_list('id', 'state'))
+        updated = sorted(order_id for order_id, current in found.items() if current in sources)
+        rejected = {order_id: 'Order not found' for order_id in order_ids if order_id not in found}
+        rejected.update({order_id: f'Cannot change state from {current} to {state}'
+                         for order_id, current in found.items() if current not in sources})
+        if not updated:
+            return updated, rejected
+        Order.objects.filter(id__in=updated).update(state=state)
+        if state == 'cancelled':
+            restore_stock(updated)
+    return updated, rejected
+
+
+def restore_stock(order_ids):
+    """
+    Функция для возврата остатков по отмененным заказам одним UPDATE.
+    :param order_ids: ID отмененных заказов
+    """
+    returned = OrderItem.objects.filter(order_id__in=order_ids).values('product_info_id') \
+        .annotate(total=Sum('quantity')).order_by()
+    cases = [When(id=row['product_info_id'], then=Value(row['total'])) for row in returned]
+    if not cases:
+        return
+    ProductInfo.objects.filter(id__in=[row['product_info_id'] for row in returned]) \
+        .update(quantity=F('quantity') + Case(*cases, default=Value(0)))
+    # остаток изменился - сбрасываем ETag каталога
+    bump_catalog_version()
@@ -0,0 +1,148 @@
+"""
+Словари названий и значений параметров для импорта прайсов.
+
+Названия параметров ("Цвет", "Диагональ") повторяются в каждой позиции каждого прайса, поэтому их ID хранятся
+в LRU-кэше процесса на PARAMETER_CACHE_SIZE названий: кэш общий для всех импортов воркера, а промахи
+разрешаются одним запросом на пачку названий вместо get_or_create на каждый параметр каждой позиции.
+При PARAMETER_VALUE_DICTIONARY так же кэшируются ID значений из ParameterValue.
+
+Кэш пополняется только после фиксации транзакции: ID строк, созданных откатившимся импортом, в нем не остаются.
+ID из кэша проверяются одним запросом на импорт, поэтому удаление названий и значений в другом процессе
+или в обход ORM не ломает следующие импорты; при удалении через ORM кэш процесса очищается сразу.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from backend.models import Parameter, ParameterValue
+
+# ограничение количества значений в одном IN, SQLite допускает не больше 999 параметров запроса
+LOOKUP_BATCH_SIZE = 500
+
+
+class LRUCache:
+    """
+    Потокобезопасный кэш с ограничением размера: при переполнении вытесняются давно не использованные ключи.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.data:
+                    self.data.move_to_end(key)
+                    found[key] = self.data[key]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, mapping):
+        with self.lock:
+            for key, value in mapping.items():
+                self.data[key] = value
+                self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = 0
+
+
+PARAMETER_NAMES = LRUCache(settings.PARAMETER_CACHE_SIZE)
+PARAMETER_VALUES = LRUCache(settings.PARAMETER_VALUE_CACHE_SIZE)
+
+
+def _batches(keys):
+    keys = list(keys)
+    for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        yield keys[start:start + LOOKUP_BATCH_SIZE]
+
+
+def _lookup(model, field, keys):
+    ids = {}
+    for batch in _batches(keys):
+        ids.update(model.objects.filter(**{f'{field}__in': batch}).values_list(field, 'id'))
+    return ids
+
+
+def _existing(model, ids):
+    existing = set()
+    for batch in _batches(set(ids)):
+        existing.update(model.objects.filter(id__in=batch).values_list('id', flat=True))
+    return existing
+
+
+def _resolve(cache, model, field, keys):
+    """
+    Функция для получения ID строк словаря по ключам с созданием недостающих.
+    :param cache: LRUCache словаря
+    :param model: модель словаря
+    :param field: поле ключа
+    :param keys: ключи
+    :return: dict() {ключ: ID}
+    """
+    keys = set(keys)
+    ids = cache.get_many(keys)
+    if ids:
+        # строку могли удалить в другом процессе или в обход ORM, сигнал post_delete этот кэш не очистит:
+        # проверяем ID из кэша одним запросом, иначе каждый импорт падал бы на внешнем ключе
+        existing = _existing(model, ids.values())
+        stale = [key for key, pk in ids.items() if pk not in existing]
+        if stale:
+            cache.clear()
+            for key in stale:
+                del ids[key]
+    missing = keys - ids.keys()
+    if not missing:
+        return ids
+    resolved = _lookup(model, field, missing)
+    new = missing - resolved.keys()
+    if new:
+        # ключи уникальны, ignore_conflicts: тот же ключ мог создать параллельный импорт, ID перечитываются запросом
+        model.objects.bulk_create([model(**{field: key}) for key in new], batch_size=LOOKUP_BATCH_SIZE,
+                                  ignore_conflicts=True)
+        resolved.update(_lookup(model, field, new))
+    transaction.on_commit(lambda: cache.set_many(resolved))
+    ids.update(resolved)
+    return ids
+
+
+def parameter_ids(names):
+    """
+    Функция для получения ID названий параметров с созданием новых.
+    :param names: названия параметров
+    :return: dict() {название: ID}
+    """
+    return _resolve(PARAMETER_NAMES, Parameter, 'name', names)
+
+
+def value_ids(values):
+    """
+    Функция для получения ID значений из словаря значений с созданием новых.
+    :param values: значения параметров
+    :return: dict() {значение: ID}
+    """
+    return _resolve(PARAMETER_VALUES, ParameterValue, 'value', values)
+
+
+@receiver(post_delete, sender=Parameter)
+def clear_parameter_names(**kwargs):
+    PARAMETER_NAMES.clear()
+
+
+@receiver(post_delete, sender=ParameterValue)
+def clear_parameter_values(**kwargs):
+    PARAMETER_VALUES.clear()
@@ -0,0 +1,297 @@
+"""
+Разбор, проверка и загрузка прайс-листов магазинов.
+
+Используется задачей load_yaml_task и командой bulk_import, поэтому оба пути загружают магазин одинаково.
+Прайс принимается в YAML, JSON или CSV, все форматы разбираются в одну структуру shop/categories/goods.
+orjson - необязательная зависимость, без него JSON разбирается стандартным json.
+"""
+import csv
+import io
+import json
+import os
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from django.conf import settings
+
+from backend.models import Shop, Category, ProductInfo, Product, ProductParameter, Parameter
+from backend.parameters import parameter_ids, value_ids
+from backend.etags import bump_catalog_version, CATEGORY_STATS
+from backend.prices import snapshot_prices, record_price_changes
+
+PRICE_LIST_KEYS = ('shop', 'categories', 'goods')
+GOODS_FIELDS = ('id', 'category', 'name', 'model', 'price', 'price_rrc', 'quantity', 'parameters')
+NUMBER_FIELDS = ('id', 'price', 'price_rrc', 'quantity')
+# колонки CSV: одна строка на предложение, остальные колонки - параметры товара
+CSV_COLUMNS = ('shop', 'category', 'category_name', 'id', 'name', 'model', 'price', 'price_rrc', 'quantity')
+
+CONTENT_TYPES = {
+    'application/json': 'json',
+    'text/csv': 'csv',
+    'application/x-yaml': 'yaml',
+    'application/yaml': 'yaml',
+    'text/yaml': 'yaml',
+    'text/x-yaml': 'yaml',
+}
+EXTENSIONS = {'.json': 'json', '.csv': 'csv', '.yaml': 'yaml', '.yml': 'yaml'}
+PRICE_LIST_EXTENSIONS = tuple(EXTENSIONS)
+
+
+def parse_yaml(content):
+    # yaml загружается только при импорте, C-загрузчик libyaml в разы быстрее чистого Python
+    import yaml
+
+    return yaml.load(content, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def parse_json(content):
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _number(value):
+    # некорректные числа оставляем строками, их найдет validate_price_list()
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def parse_csv(content):
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    rows = csv.DictReader(io.StringIO(content))
+    parameter_columns = [column for column in rows.fieldnames or () if column not in CSV_COLUMNS]
+    data = {'shop': None, 'categories': [], 'goods': []}
+    categories = {}
+    for row in rows:
+        if data['shop'] is None:
+            data['shop'] = row['shop']
+        elif row['shop'] != data['shop']:
+            # прайс загружается в один магазин, строки другого магазина - ошибка файла, а не его часть
+            raise ValueError(f'line {rows.line_num}: shop {row["shop"]!r} differs from {data["shop"]!r}')
+        category = _number(row['category'])
+        categories.setdefault(category, {'id': category, 'name': row['category_name']})
+        item = {field: _number(row[field]) for field in NUMBER_FIELDS}
+        item.update(category=category, name=row['name'], model=row['model'],
+                    parameters={name: row[name] for name in parameter_columns if row[name]})
+        data['goods'].append(item)
+    data['categories'] = list(categories.values())
+    return data
+
+
+PARSERS = {
+    'yaml': parse_yaml,
+    'json': parse_json,
+    'csv': parse_csv,
+}
+
+
+def detect_format(name='', content_type=''):
+    """
+    Функция для определения формата прайса: сначала по Content-Type, затем по расширению.
+    :param name: имя файла или URL
+    :param content_type: заголовок Content-Type
+    :return: ключ PARSERS, по умолчанию yaml
+    """
+    price_format = CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+    if price_format is None:
+        price_format = EXTENSIONS.get(os.path.splitext(name.split('?')[0])[1].lower(), 'yaml')
+    return price_format
+
+
+def parse_price_list(content, price_format='yaml'):
+    """
+    Функция для разбора содержимого прайс-листа.
+    :param content: содержимое файла
+    :param price_format: формат из PARSERS
+    :return: dict() с ключами shop, categories, goods
+    """
+    return PARSERS[price_format](content)
+
+
+def dump_price_list(data, price_format):
+    """
+    Функция для записи прайса в указанном формате, нужна для подготовки тестовых каталогов.
+    :return: str
+    """
+    if price_format == 'yaml':
+        import yaml
+
+        return yaml.dump(data, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper), allow_unicode=True)
+    if price_format == 'json':
+        return json.dumps(data, ensure_ascii=False)
+    categories = {category['id']: category['name'] for category in data['categories']}
+    parameters = list(dict.fromkeys(name for item in data['goods'] for name in item['parameters']))
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_COLUMNS + tuple(parameters))
+    for item in data['goods']:
+        writer.writerow([data['shop'], item['category'], categories.get(item['category'], ''), item['id'],
+                         item['name'], item['model'], item['price'], item['price_rrc'], item['quantity']] +
+                        [item['parameters'].get(name, '') for name in parameters])
+    return output.getvalue()
+
+
+def _is_id(value):
+    # bool - подкласс int, но true в прайсе не количество и не цена
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _text_error(value, max_length, blank=False):
+    """
+    Функция для проверки строкового поля прайса по ограничениям поля модели.
+    :return: str() с описанием ошибки или None
+    """
+    if not isinstance(value, str):
+        return 'must be a string'
+    if not blank and not value.strip():
+        return 'must not be empty'
+    if len(value) > max_length:
+        return f'must be at most {max_length} characters'
+    return None
+
+
+def validate_price_list(data):
+    """
+    Функция для проверки структуры прайс-листа до загрузки в БД. Проверяются типы и длины всех полей,
+    которые пишет load_price_list(), чтобы некорректный файл не падал посреди загрузки.
+    :param data: результат parse_price_list()
+    :return: list() строк с описанием ошибок, пустой для корректного прайса
+    """
+    if not isinstance(data, dict):
+        return ['price list must be a mapping']
+    errors = [f'missing key: {key}' for key in PRICE_LIST_KEYS if key not in data]
+    if errors:
+        return errors
+    error = _text_error(data['shop'], Shop._meta.get_field('name').max_length)
+    if error:
+        errors.append(f'shop: {error}')
+    for key in ('categories', 'goods'):
+        if not isinstance(data[key], list):
+            errors.append(f'{key} must be a list')
+    if errors:
+        return errors
+
+    category_ids = set()
+    for index, category in enumerate(data['categories']):
+        if not isinstance(category, dict):
+            errors.append(f'categories[{index}]: must be a mapping')
+            continue
+        if not _is_id(category.get('id')):
+            errors.append(f'categories[{index}]: id must be a non-negative integer')
+        else:
+            category_ids.add(category['id'])
+        error = _text_error(category.get('name'), Category._meta.get_field('name').max_length)
+        if error:
+            errors.append(f'categories[{index}]: name {error}')
+
+    text_fields = (('name', Product._meta.get_field('name').max_length, False),
+                   ('model', ProductInfo._meta.get_field('model').max_length, True))
+    parameter_length = Parameter._meta.get_field('name').max_length
+    value_length = ProductParameter._meta.get_field('value').max_length
+    for index, item in enumerate(data['goods']):
+        missing = [field for field in GOODS_FIELDS if field not in item] if isinstance(item, dict) else GOODS_FIELDS
+        if missing:
+            errors.append(f'goods[{index}]: missing {", ".join(missing)}')
+            continue
+        if not _is_id(item['category']):
+            errors.append(f'goods[{index}]: category must be a non-negative integer')
+        elif item['category'] not in category_ids:
+            errors.append(f'goods[{index}]: unknown category {item["category"]}')
+        for field, max_length, blank in text_fields:
+            error = _text_error(item[field], max_length, blank)
+            if error:
+                errors.append(f'goods[{index}]: {field} {error}')
+        for field in NUMBER_FIELDS:
+            if not _is_id(item[field]):
+                errors.append(f'goods[{index}]: {field} must be a non-negative integer')
+        if not isinstance(item['parameters'], dict):
+            errors.append(f'goods[{index}]: parameters must be a mapping')
+            continue
+        for name, value in item['parameters'].items():
+            error = _text_error(name, parameter_length)
+            if error:
+                errors.append(f'goods[{index}]: parameter name {name!r} {error}')
+            elif not isinstance(value, (str, int, float)) or len(str(value)) > value_length:
+                errors.append(f'goods[{index}]: parameter {name} must be a scalar '
+                              f'of at most {value_length} characters')
+    return errors
+
+
+def read_price_list_file(path, keep_data=False):
+    """
+    Функция для чтения, разбора и проверки файла прайс-листа. Не обращается к БД,
+    поэтому может выполняться в дочерних процессах.
+    :param path: путь к файлу
+    :param keep_data: вернуть разобранные данные для загрузки
+    :return: dict() {path, shop, items, errors, seconds, data}
+    """
+    start = time.perf_counter()
+    # любая ошибка разбора или проверки - ошибка этого файла, а не падение пула процессов
+    try:
+        with open(path, 'rb') as file:
+            data = parse_price_list(file.read(), detect_format(path))
+        errors = validate_price_list(data)
+    except Exception as error:
+        return {'path': path, 'shop': None, 'items': 0, 'errors': [f'parse error: {error}'],
+                'seconds': time.perf_counter() - start, 'data': None}
+    return {
+        'path': path,
+        'shop': None if errors else data['shop'],
+        'items': 0 if errors else len(data['goods']),
+        'errors': errors,
+        'seconds': time.perf_counter() - start,
+        'data': data if keep_data and not errors else None,
+    }
+
+
+def load_price_list(data, user):
+    """
+    Функция для загрузки прайс-листа магазина: предложения магазина заменяются на предложения из прайса,
+    изменения цен записываются в историю.
+    :param data: результат parse_price_list()
+    :param user: владелец магазина
+    :return: количество загруженных предложений
+    """
+    shop, _ = Shop.objects.get_or_create(name=data['shop'], user=user)
+    for category in data['categories']:
+        category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
+        category_object.shops.add(shop.id)
+        category_object.save()
+    # запоминаем цены до удаления, чтобы записать в историю только изменения
+    old_prices = snapshot_prices(shop.id)
+    ProductInfo.objects.filter(shop_id=shop.id).delete()
+    # названия (и значения) параметров разрешаются в ID одним проходом по прайсу через кэш процесса
+    names = parameter_ids({name for item in data['goods'] for name in item['parameters']})
+    values = None
+    if settings.PARAMETER_VALUE_DICTIONARY:
+        values = value_ids({str(value) for item in data['goods'] for value in item['parameters'].values()})
+    parameters = []
+    for item in data['goods']:
+        product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
+
+        product_info = ProductInfo.objects.create(product_id=product.id,
+                                                  external_id=item['id'],
+                                                  model=item['model'],
+                                                  price=item['price'],
+                                                  price_rrc=item['price_rrc'],
+                                                  quantity=item['quantity'],
+                                                  shop_id=shop.id)
+        for name, value in item['parameters'].items():
+            if values is None:
+                parameters.append(ProductParameter(product_info_id=product_info.id, parameter_id=names[name],
+                                                   value=value))
+            else:
+                parameters.append(ProductParameter(product_info_id=product_info.id, parameter_id=names[name],
+                                                   value_ref_id=values[str(value)]))
+    ProductParameter.objects.bulk_create(parameters, batch_size=settings.PARAMETER_BATCH_SIZE)
+    record_price_changes(shop.id, old_prices, data['goods'])
+    bump_catalog_version()
+    bump_catalog_version(CATEGORY_STATS)
+    return len(data['goods'])
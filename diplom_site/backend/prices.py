@@ -0,0 +1,81 @@
+from django.utils import timezone
+
+from backend.models import PriceHistory, ProductInfo
+
+
+def snapshot_prices(shop_id):
+    """
+    Функция для получения текущих цен магазина перед импортом.
+    :param shop_id: ID магазина
+    :return: dict() {external_id: (price, price_rrc)}
+    """
+    return {external_id: (price, price_rrc) for external_id, price, price_rrc
+            in ProductInfo.objects.filter(shop_id=shop_id).values_list('external_id', 'price', 'price_rrc')}
+
+
+def record_price_changes(shop_id, old_prices, goods):
+    """
+    Функция для записи истории цен после импорта. Строка добавляется только для новых предложений
+    и предложений, у которых изменилась цена или рекомендуемая цена, все строки пишутся одним bulk_create.
+    :param shop_id: ID магазина
+    :param old_prices: цены до импорта из snapshot_prices()
+    :param goods: список товаров из прайса
+    :return: количество записанных изменений
+    """
+    now = timezone.now()
+    changes = [
+        PriceHistory(shop_id=shop_id, external_id=item['id'], price=item['price'], price_rrc=item['price_rrc'],
+                     recorded_at=now)
+        for item in goods
+        if old_prices.get(item['id']) != (item['price'], item['price_rrc'])
+    ]
+    PriceHistory.objects.bulk_create(changes, batch_size=1000)
+    return len(changes)
+
+
+def time_weighted_average(points, start, end):
+    """
+    Функция для расчета средней цены, взвешенной по времени действия: каждая цена действует
+    от своего изменения (но не раньше начала периода) до следующего изменения или конца периода.
+    :param points: ряд изменений, упорядоченный по recorded_at
+    :param start: начало периода
+    :param end: конец периода, не позже текущего момента
+    :return: float или None, если ряд пуст
+    """
+    if not points:
+        return None
+    total = weighted = 0.0
+    for point, following in zip(points, points[1:] + [None]):
+        since = max(point['recorded_at'], start)
+        until = following['recorded_at'] if following is not None else end
+        seconds = max((until - since).total_seconds(), 0.0)
+        total += seconds
+        weighted += point['price'] * seconds
+    if not total:
+        # все изменения пришлись на конец периода - действует последняя цена
+        return float(points[-1]['price'])
+    return round(weighted / total, 2)
+
+
+def price_series(shop_id, external_id, start, end):
+    """
+    Функция для получения истории цен предложения за период и статистики по ней.
+    Цена, действовавшая на начало периода, включается в ряд первой точкой.
+    :param shop_id: ID магазина
+    :param external_id: внешний идентификатор предложения
+    :param start: начало периода
+    :param end: конец периода
+    :return: dict() с рядом изменений и минимальной, максимальной и средней по времени действия ценой
+    """
+    fields = ('recorded_at', 'price', 'price_rrc')
+    history = PriceHistory.objects.filter(shop_id=shop_id, external_id=external_id)
+    points = list(history.filter(recorded_at__lt=start).order_by('-recorded_at').values(*fields)[:1])
+    points += history.filter(recorded_at__gte=start, recorded_at__lte=end).order_by('recorded_at').values(*fields)
+    prices = [point['price'] for point in points]
+    return {
+        'series': points,
+        'min': min(prices, default=None),
+        'max': max(prices, default=None),
+        # будущая часть периода не учитывается: последняя цена действует только до текущего момента
+        'avg': time_weighted_average(points, start, min(end, timezone.now())),
+    }
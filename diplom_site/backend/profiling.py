@@ -0,0 +1,97 @@
+"""
+Профилирование отдельных запросов по требованию.
+
+Запрос с заголовком X-Profile (или параметром ?profile=1) от сотрудника выполняется под cProfile,
+параллельно поток-сэмплер снимает стеки обрабатывающего потока. Результат сохраняется в PROFILE_DIR
+в виде <id>.pstats и <id>.collapsed (формат collapsed stacks для flamegraph.pl / speedscope).
+"""
+import os
+import re
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+from rest_framework.authtoken.models import Token
+
+PROFILE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+PROFILE_KINDS = ('pstats', 'collapsed')
+
+
+class StackSampler(threading.Thread):
+    """
+    Поток, который периодически снимает стек указанного потока и считает одинаковые стеки.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def profiling_requested(request):
+    # сначала дешевые проверки строк, чтобы обычные запросы не разбирали query string
+    if request.META.get('HTTP_X_PROFILE'):
+        return True
+    return 'profile=' in request.META.get('QUERY_STRING', '') and request.GET.get('profile') == '1'
+
+
+def is_staff_request(request):
+    """
+    Функция для проверки, что запрос сделан сотрудником: по сессии или по токену DRF.
+    Вызывается только для запросов, запросивших профилирование.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    keyword, _, key = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if keyword != 'Token' or not key:
+        return False
+    return Token.objects.filter(key=key.strip(), user__is_staff=True, user__is_active=True).exists()
+
+
+def profile_path(profile_id, kind):
+    return os.path.join(settings.PROFILE_DIR, f'{profile_id}.{kind}')
+
+
+def run_profiled(func, *args):
+    """
+    Функция для выполнения вызова под профилировщиками с сохранением результатов.
+    :param func: профилируемая функция
+    :return: результат вызова и ID профиля
+    """
+    # профилировщик нужен только запросам с X-Profile
+    import cProfile
+    import uuid
+
+    profile_id = uuid.uuid4().hex
+    sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+    profiler = cProfile.Profile()
+    sampler.start()
+    try:
+        result = profiler.runcall(func, *args)
+    finally:
+        sampler.stop()
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(profile_path(profile_id, 'pstats'))
+        with open(profile_path(profile_id, 'collapsed'), 'w', encoding='utf-8') as file:
+            for stack, count in sampler.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+    return result, profile_id
@@ -0,0 +1,57 @@
+"""
+Быстрые read-only проекции для списочных эндпоинтов.
+
+Вместо построения полей сериализаторов для каждой строки выбираем кортежи через values_list
+и собираем словари заранее подготовленными функциями под конкретную форму ответа.
+Результат совпадает с выводом соответствующих сериализаторов байт в байт.
+"""
+
+from backend.fieldsets import PRODUCT_FIELDS, PRODUCT_EXPAND
+
+# колонки полей ProductSerializer, категория - по имени или, если не раскрыта, по ID
+PRODUCT_COLUMNS = {'id': 'id', 'name': 'name', 'category': 'category_id'}
+
+# форма строки списка заказов в OrderView.list
+ORDER_ITEM_FIELDS = ('id', 'order_number', 'order__dt', 'total', 'order__state')
+
+
+def project_products(queryset, fields=PRODUCT_FIELDS, expand=PRODUCT_EXPAND):
+    """
+    Функция для сериализации списка продуктов, аналог ProductSerializer(many=True).
+    :param queryset: QuerySet модели Product
+    :param fields: выводимые поля в порядке PRODUCT_FIELDS
+    :param expand: раскрываемые связи, без category категория отдается ID и выбирается без JOIN
+    :return: list() словарей
+    """
+    if fields == PRODUCT_FIELDS and 'category' in expand:
+        # полный ответ - самый частый, собираем его без zip
+        return [
+            {'id': pk, 'name': name, 'category': {'name': category_name}}
+            for pk, name, category_name in queryset.values_list('id', 'name', 'category__name')
+        ]
+    nested = 'category' in fields and 'category' in expand
+    columns = ['category__name' if nested and field == 'category' else PRODUCT_COLUMNS[field] for field in fields]
+    products = [dict(zip(fields, row)) for row in queryset.values_list(*columns)]
+    if nested:
+        for product in products:
+            product['category'] = {'name': product['category']}
+    return products
+
+
+def project_order_items(queryset):
+    """
+    Функция для построения списка заказов пользователя в формате OrderView.list.
+    :param queryset: QuerySet модели OrderItem
+    :return: dict() с позицией в качестве ключа
+    """
+    return {
+        pos: {
+            'id': pk,
+            'order_number': order_number,
+            'date_created': dt.strftime("%Y.%m.%d"),
+            'total': total,
+            'state': state,
+        }
+        for pos, (pk, order_number, dt, total, state) in enumerate(queryset.values_list(*ORDER_ITEM_FIELDS))
+    }
+
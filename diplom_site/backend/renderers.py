@@ -0,0 +1,77 @@
+"""
+Рендереры и парсеры для компактного кодирования ответов и запросов.
+
+orjson и msgpack - необязательные зависимости: без orjson используется стандартный json из DRF,
+без msgpack формат application/msgpack просто не подключается в настройках.
+"""
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер на orjson. Выдает те же байты, что и JSONRenderer DRF в компактном режиме,
+    для отформатированного вывода (indent) и без orjson отдает работу стандартному рендереру.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # даты, Decimal, lazy-строки и т.п. кодируем так же, как это делает DRF
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=self.options)
+        for char, escaped in LINE_SEPARATORS:
+            if char in ret:
+                ret = ret.replace(char, escaped)
+        return ret
+
+
+def _msgpack_default(obj):
+    # все, что не умеет msgpack, приводим к тому же виду, что и в JSON-ответах
+    return JSONEncoder().default(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Рендерер бинарного формата MessagePack, выбирается заголовком Accept: application/msgpack.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_msgpack_default)
+
+
+class MessagePackParser(BaseParser):
+    """
+    Парсер тел запросов в формате MessagePack, например для пакетной отправки заказов.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), strict_map_key=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
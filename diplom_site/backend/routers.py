@@ -0,0 +1,80 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# признак того, что текущий запрос читает с реплики
+_use_replica = ContextVar('use_replica', default=False)
+
+PIN_KEY = 'db-primary-pin:{}'
+
+
+def pin_to_primary(user):
+    """
+    Функция для закрепления пользователя за основной БД на REPLICA_PIN_SECONDS после записи,
+    чтобы он сразу видел свои изменения, даже если реплика отстает.
+    :param user: пользователь
+    :return:
+    """
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        cache.set(PIN_KEY.format(user.id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user is not None and user.is_authenticated and cache.get(PIN_KEY.format(user.id), False)
+
+
+@contextmanager
+def read_from_replica(user=None):
+    """
+    Контекстный менеджер, внутри которого чтение идет с реплики. Если реплики не настроены
+    или пользователь недавно что-то записал, чтение остается на основной БД.
+    :param user: пользователь запроса
+    """
+    if not settings.DATABASE_REPLICAS or is_pinned(user):
+        yield
+        return
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_read(func):
+    """
+    Декоратор для read-only action'ов ViewSet: выполняет обработчик с чтением с реплики.
+    """
+    @wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        with read_from_replica(request.user):
+            return func(self, request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: запись всегда в default, чтение - с одной из реплик DATABASE_REPLICAS
+    внутри read_from_replica(), если нет открытой транзакции на основной БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
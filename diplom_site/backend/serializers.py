@@ -76,6 +76,30 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         return instance
 
 
+class FieldsetMixin:
+    """
+    Примесь для сериализаторов с выборочными полями: fields - оставляемые поля, expand - раскрываемые связи,
+    нераскрытые связи из expandable отдаются идентификатором без обращения к связанной модели.
+    """
+    expandable = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if expand is None:
+            return
+        for name in self.expandable:
+            if name not in self.fields:
+                continue
+            if name not in expand:
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True)
+            elif isinstance(self.fields[name], FieldsetMixin):
+                # вложенный сериализатор раскрывает свои связи по тому же списку
+                self.fields[name] = type(self.fields[name])(expand=expand)
+
+
 class ShopSerializer(serializers.ModelSerializer):
     placement = serializers.CharField(source='get_placement_display')
 
@@ -91,8 +115,9 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['name', ]
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(FieldsetMixin, serializers.ModelSerializer):
     category = CategorySerializer()
+    expandable = ('category',)
 
     class Meta:
         model = Product
@@ -107,16 +132,18 @@ class ParameterSerializer(serializers.ModelSerializer):
 
 class ProdParamSerializer(serializers.ModelSerializer):
     parameter = ParameterSerializer()
+    value = serializers.CharField(source='get_value')
 
     class Meta:
         model = ProductParameter
         fields = ['parameter', 'value']
 
 
-class ProductInfoSerializer(serializers.ModelSerializer):
+class ProductInfoSerializer(FieldsetMixin, serializers.ModelSerializer):
     product = ProductSerializer()
     shop = ShopSerializer()
     params = serializers.SerializerMethodField(read_only=True)
+    expandable = ('product', 'shop')
 
     class Meta:
         model = ProductInfo
@@ -124,7 +151,8 @@ class ProductInfoSerializer(serializers.ModelSerializer):
 
     def get_params(self, obj):
         # улучшенное отображение параметров
-        filtered_data = ProductParameter.objects.all().filter(product_info_id=obj.product_id)
+        filtered_data = ProductParameter.objects.filter(product_info_id=obj.product_id) \
+            .select_related('parameter', 'value_ref')
         serializer = ProdParamSerializer(filtered_data, many=True)
         serialized_data = {}
         for param in serializer.data:
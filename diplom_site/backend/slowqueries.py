@@ -0,0 +1,153 @@
+"""
+Журнал медленных запросов к БД.
+
+Обертка выполнения запросов ставится на каждое соединение при его создании и замеряет все запросы.
+Запросы дольше SLOW_QUERY_THRESHOLD_MS пишутся в лог backend.slowqueries вместе с параметрами
+(у запросов к токенам, паролям и сессиям - маска вместо параметров), источником (view или задача Celery) и планом EXPLAIN, последние SLOW_QUERY_BUFFER_SIZE хранятся
+в памяти процесса и доступны сотрудникам на /slow_queries/.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# ограничения размера записи в журнале
+MAX_SQL_LENGTH = 10000
+MAX_PARAMS_LENGTH = 1000
+MASK = '<masked>'
+
+# источник запросов текущего запроса или задачи
+_source = ContextVar('slow_query_source', default=None)
+# признак выполнения EXPLAIN, чтобы обертка не замеряла свои же запросы
+_explaining = ContextVar('slow_query_explaining', default=False)
+
+_buffer = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+
+
+def set_source(source):
+    """
+    Функция для указания источника последующих запросов.
+    :param source: например 'OrderView.list' или имя задачи Celery
+    :return: токен для reset_source()
+    """
+    return _source.set(source)
+
+
+def reset_source(token):
+    _source.reset(token)
+
+
+def recent_slow_queries():
+    """
+    Функция для получения журнала медленных запросов процесса, новые - первыми.
+    :return: list() записей
+    """
+    with _buffer_lock:
+        return list(reversed(_buffer))
+
+
+def clear_slow_queries():
+    with _buffer_lock:
+        _buffer.clear()
+
+
+def is_sensitive(sql):
+    """
+    Функция для проверки, обращается ли запрос к чувствительным таблицам или колонкам из SLOW_QUERY_SENSITIVE.
+    :param sql: текст запроса с плейсхолдерами
+    :return: bool
+    """
+    sql = sql.lower()
+    return any(marker in sql for marker in settings.SLOW_QUERY_SENSITIVE)
+
+
+def explain(connection, sql, params):
+    """
+    Функция для получения плана запроса. Выполняется в точке сохранения, чтобы ошибка EXPLAIN
+    не прервала транзакцию вызывающего кода.
+    :return: str() план или описание ошибки
+    """
+    token = _explaining.set(True)
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+    except DatabaseError as error:
+        return f'EXPLAIN failed: {error}'
+    finally:
+        _explaining.reset(token)
+
+
+class SlowQueryLogger:
+    """
+    Обертка выполнения запросов соединения (connection.execute_wrapper).
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is None or _explaining.get():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= threshold:
+            self.record(sql, params, many, duration)
+        return result
+
+    def record(self, sql, params, many, duration):
+        # у чувствительных запросов параметры не пишутся, а план не строится: в нем бывают подставленные значения
+        masked = not settings.SLOW_QUERY_LOG_PARAMS or is_sensitive(sql)
+        # план строим только для одиночных SELECT: изменяющие запросы не повторяем даже под EXPLAIN
+        plan = None
+        if settings.SLOW_QUERY_EXPLAIN and not many and sql.lstrip()[:6].upper() == 'SELECT':
+            plan = MASK if masked else explain(self.connection, sql, params)
+        entry = {
+            'time': timezone.now().isoformat(),
+            'duration_ms': round(duration, 2),
+            'database': self.connection.alias,
+            'source': _source.get(),
+            'sql': sql[:MAX_SQL_LENGTH],
+            'params': MASK if masked else repr(params)[:MAX_PARAMS_LENGTH],
+            'plan': plan,
+        }
+        with _buffer_lock:
+            _buffer.append(entry)
+        logger.warning('Slow query %.2fms in %s on %s: %s; params=%s\n%s', duration, entry['source'],
+                       entry['database'], entry['sql'], entry['params'], plan or '')
+
+
+@receiver(connection_created)
+def install_logger(sender, connection=None, **kwargs):
+    if not any(isinstance(wrapper, SlowQueryLogger) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryLogger(connection))
+
+
+# задачи Celery: источником запросов становится имя задачи
+_task_tokens = {}
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    _task_tokens[task_id] = set_source(task.name)
+
+
+@task_postrun.connect
+def task_finished(task_id=None, **kwargs):
+    token = _task_tokens.pop(task_id, None)
+    if token is not None:
+        reset_source(token)
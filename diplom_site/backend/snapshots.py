@@ -0,0 +1,149 @@
+"""
+Готовые файлы каталога магазинов для агрегаторов.
+
+После каждого импорта каталог магазина выгружается в SNAPSHOT_DIR файлом shop-<id>.ndjson.gz: по строке JSON
+на предложение в формате позиции прайс-листа (goods). Файл пишется во временный и подменяется через os.replace,
+поэтому читатели всегда видят целый файл. Отдается с диска без обращения к каталогу в БД: полный файл -
+через wsgi.file_wrapper (sendfile), части - по заголовку Range, а при SNAPSHOT_ACCEL_REDIRECT отдачу целиком
+берет на себя nginx.
+
+orjson - необязательная зависимость, без него строки строятся стандартным json.
+"""
+import gzip
+import json
+import os
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from django.conf import settings
+
+from backend.models import ProductInfo, ProductParameter
+
+# поля предложения в порядке вывода, совпадают с позицией прайс-листа
+OFFER_COLUMNS = ('id', 'external_id', 'product__category_id', 'model', 'product__name', 'price', 'price_rrc',
+                 'quantity')
+CHUNK_SIZE = 2000
+
+
+def snapshot_name(shop_id):
+    return f'shop-{shop_id}.ndjson.gz'
+
+
+def snapshot_path(shop_id):
+    return os.path.join(settings.SNAPSHOT_DIR, snapshot_name(shop_id))
+
+
+def _dumps(row):
+    if orjson is not None:
+        return orjson.dumps(row) + b'\n'
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+
+def iter_offers(shop_id):
+    """
+    Функция для выборки предложений магазина с параметрами двумя потоковыми запросами,
+    параметры присоединяются к предложениям слиянием по ID.
+    :param shop_id: ID магазина
+    :return: генератор словарей в формате позиции прайс-листа
+    """
+    offers = ProductInfo.objects.filter(shop_id=shop_id).order_by('id').values_list(*OFFER_COLUMNS)
+    parameters = ProductParameter.objects.filter(product_info__shop_id=shop_id).with_value() \
+        .order_by('product_info_id').values_list('product_info_id', 'parameter__name', 'value_text')
+    groups = groupby(parameters.iterator(chunk_size=CHUNK_SIZE), key=itemgetter(0))
+    group_id, group = next(groups, (None, None))
+    for pk, external_id, category, model, name, price, price_rrc, quantity in offers.iterator(chunk_size=CHUNK_SIZE):
+        while group_id is not None and group_id < pk:
+            group_id, group = next(groups, (None, None))
+        values = {}
+        if group_id == pk:
+            values = {parameter: value for _, parameter, value in group}
+            group_id, group = next(groups, (None, None))
+        yield {'id': external_id, 'category': category, 'model': model, 'name': name, 'price': price,
+               'price_rrc': price_rrc, 'quantity': quantity, 'parameters': values}
+
+
+def write_snapshot(shop_id):
+    """
+    Функция для атомарной перезаписи файла каталога магазина.
+    :param shop_id: ID магазина
+    :return: количество предложений в файле
+    """
+    os.makedirs(settings.SNAPSHOT_DIR, exist_ok=True)
+    # временный файл в том же каталоге, чтобы os.replace не копировал данные между файловыми системами
+    descriptor, temp_path = tempfile.mkstemp(dir=settings.SNAPSHOT_DIR, prefix=f'.{snapshot_name(shop_id)}.')
+    count = 0
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            # mtime=0: одинаковый каталог дает одинаковые байты
+            with gzip.GzipFile(fileobj=file, mode='wb', compresslevel=settings.SNAPSHOT_COMPRESS_LEVEL,
+                               mtime=0) as archive:
+                for offer in iter_offers(shop_id):
+                    archive.write(_dumps(offer))
+                    count += 1
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, snapshot_path(shop_id))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return count
+
+
+def snapshot_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    Функция для разбора заголовка Range с одним диапазоном байт.
+    :param header: значение заголовка, например bytes=0-1023, bytes=1024- или bytes=-500
+    :param size: размер файла
+    :return: tuple() первого и последнего байта, None - если заголовок не поддерживается
+    и файл нужно отдать целиком, False - если диапазон вне файла
+    """
+    unit, _, value = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in value:
+        return None
+    first, _, last = value.strip().partition('-')
+    try:
+        if not first:
+            # последние N байт
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        first = int(first)
+        last = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if first >= size:
+        return False
+    if first > last:
+        return None
+    return first, min(last, size - 1)
+
+
+def iter_range(file, first, last, block_size=64 * 1024):
+    """
+    Функция для чтения диапазона байт уже открытого файла блоками. Файл закрывается после чтения.
+    :param file: файл, открытый в режиме rb
+    :param first: первый байт диапазона
+    :param last: последний байт диапазона
+    :return: генератор блоков bytes
+    """
+    with file:
+        file.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            block = file.read(min(block_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
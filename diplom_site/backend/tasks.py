@@ -1,9 +1,17 @@
-import yaml
-from django.core.mail import send_mail
+from datetime import timedelta
+
+from django.conf import settings
 from celery import shared_task
-from requests import get
+from django.db import transaction
+from django.utils import timezone
 
-from backend.models import Shop, Category, ProductInfo, Product, Parameter, ProductParameter, User
+from backend.models import User, Order, Contact, Shop
+from backend.webhooks import deliver_events
+from backend.pricelists import parse_price_list, load_price_list, detect_format
+from backend.telemetry import record_items
+from backend.categories import refresh_category_stats
+from backend.archive import FINISHED_STATES, archive_orders
+from backend.snapshots import write_snapshot
 
 
 @shared_task()
@@ -14,6 +22,8 @@ def send_token_email(email, token):
     :param token: Ключ объекта Token.
     :return:
     """
+    from django.core.mail import send_mail
+
     send_mail(
         subject="Your New Token",
         message=f"\tNew token: {token}\n\nThank you!",
@@ -24,30 +34,99 @@ def send_token_email(email, token):
     return 'email sent'
 
 
-@shared_task()
+# импорт подтверждается после выполнения: при падении воркера прайс загрузится повторно, а не потеряется
+@shared_task(acks_late=True, soft_time_limit=settings.IMPORT_SOFT_TIME_LIMIT, time_limit=settings.IMPORT_TIME_LIMIT)
 def load_yaml_task(url, user_id):
+    # requests нужен только импорту, поэтому не загружаем его при старте воркера
+    import requests
+
     user = User.objects.get(id=user_id)
-    stream = get(url).content
-    data = yaml.full_load(stream)
-    shop, _ = Shop.objects.get_or_create(name=data['shop'], user=user)
-    for category in data['categories']:
-        category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-        category_object.shops.add(shop.id)
-        category_object.save()
-    ProductInfo.objects.filter(shop_id=shop.id).delete()
-    for item in data['goods']:
-        product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-
-        product_info = ProductInfo.objects.create(product_id=product.id,
-                                                  external_id=item['id'],
-                                                  model=item['model'],
-                                                  price=item['price'],
-                                                  price_rrc=item['price_rrc'],
-                                                  quantity=item['quantity'],
-                                                  shop_id=shop.id)
-        for name, value in item['parameters'].items():
-            parameter_object, _ = Parameter.objects.get_or_create(name=name)
-            ProductParameter.objects.create(product_info_id=product_info.id,
-                                            parameter_id=parameter_object.id,
-                                            value=value)
+    response = requests.get(url)
+    data = parse_price_list(response.content, detect_format(url, response.headers.get('Content-Type', '')))
+    # при SoftTimeLimitExceeded загрузка откатывается целиком, магазин не остается с половиной прайса
+    with transaction.atomic():
+        record_items(load_price_list(data, user))
+        shop_id = Shop.objects.filter(name=data['shop'], user=user).values_list('id', flat=True).get()
+        # файл каталога пересобирается отдельной задачей только после фиксации импорта
+        transaction.on_commit(lambda: build_shop_snapshot.delay(shop_id))
+    refresh_category_stats()
     return 'yaml loaded'
+
+
+@shared_task()
+def build_shop_snapshot(shop_id):
+    """
+    Функция асинхронной выгрузки каталога магазина в файл для агрегаторов.
+    :param shop_id: ID магазина
+    :return: количество предложений в файле
+    """
+    return write_snapshot(shop_id)
+
+
+@shared_task()
+def dispatch_order_events(batch_size=None):
+    """
+    Функция асинхронной доставки событий заказов магазинам. Если в очереди остались события,
+    задача ставит себя в очередь повторно.
+    :param batch_size: размер пачки, по умолчанию WEBHOOK_BATCH_SIZE.
+    :return: количество доставленных и отложенных событий
+    """
+    result = deliver_events(batch_size or settings.WEBHOOK_BATCH_SIZE)
+    if result['has_more']:
+        dispatch_order_events.delay(batch_size)
+    return result
+
+
+@shared_task()
+def purge_abandoned_baskets(max_age_hours=None, batch_size=None):
+    """
+    Функция для удаления брошенных корзин вместе с их позициями и контактами.
+    Удаление идет пачками, каждая в своей короткой транзакции, чтобы не держать блокировки.
+    :param max_age_hours: возраст корзины в часах, по умолчанию BASKET_EXPIRY_HOURS.
+    :param batch_size: размер пачки, по умолчанию BASKET_PURGE_BATCH_SIZE.
+    :return: количество удаленных строк по таблицам
+    """
+    cutoff = timezone.now() - timedelta(hours=max_age_hours or settings.BASKET_EXPIRY_HOURS)
+    batch_size = batch_size or settings.BASKET_PURGE_BATCH_SIZE
+    reclaimed = {'orders': 0, 'order_items': 0, 'contacts': 0}
+    while True:
+        with transaction.atomic():
+            # пачка блокируется до удаления, корзины, которые сейчас подтверждаются, пропускаются
+            expired = Order.objects.filter(state='basket', dt__lt=cutoff)
+            batch = list(expired.select_for_update(skip_locked=True).values_list('id', 'contact_id')[:batch_size])
+            if not batch:
+                break
+            order_ids = [order_id for order_id, _ in batch]
+            # условие повторяется при удалении: корзину, подтвержденную после чтения пачки, не удаляем
+            _, deleted = expired.filter(id__in=order_ids).delete()
+            reclaimed['orders'] += deleted.get('backend.Order', 0)
+            reclaimed['order_items'] += deleted.get('backend.OrderItem', 0)
+            # контакт удаляем, только если на него больше не ссылается ни один заказ
+            contact_ids = {contact_id for _, contact_id in batch if contact_id}
+            contacts, _ = Contact.objects.filter(id__in=contact_ids, order__isnull=True).delete()
+            reclaimed['contacts'] += contacts
+    return reclaimed
+
+
+@shared_task()
+def archive_finished_orders(max_age_days=None, batch_size=None):
+    """
+    Функция для переноса старых завершенных и отмененных заказов в архивные таблицы.
+    Перенос идет пачками, каждая в своей короткой транзакции.
+    :param max_age_days: возраст заказа в днях, по умолчанию ORDER_ARCHIVE_DAYS.
+    :param batch_size: размер пачки, по умолчанию ORDER_ARCHIVE_BATCH_SIZE.
+    :return: количество перенесенных строк по таблицам
+    """
+    cutoff = timezone.now() - timedelta(days=max_age_days or settings.ORDER_ARCHIVE_DAYS)
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    archived = {'orders': 0, 'order_items': 0, 'contacts': 0}
+    while True:
+        with transaction.atomic():
+            order_ids = list(Order.objects.select_for_update(skip_locked=True)
+                             .filter(state__in=FINISHED_STATES, dt__lt=cutoff)
+                             .values_list('id', flat=True)[:batch_size])
+            if not order_ids:
+                break
+            for key, count in archive_orders(order_ids).items():
+                archived[key] += count
+    return archived
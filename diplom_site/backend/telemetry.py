@@ -0,0 +1,88 @@
+"""
+Телеметрия задач Celery на сигналах: задержка в очереди, время выполнения, повторы, ошибки,
+а для импортов - скорость обработки позиций и пиковая память процесса воркера.
+"""
+import resource
+import time
+
+from celery import current_task
+from celery.signals import before_task_publish, task_prerun, task_postrun, task_retry, task_failure
+
+from backend.metrics import Counter, Gauge, Histogram
+
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+TASK_STATES = ('success', 'failure', 'retry')
+
+QUEUE_LATENCY = Histogram('celery_task_queue_latency_seconds', 'Time from enqueue to task start', TASK_BUCKETS)
+RUNTIME = Histogram('celery_task_runtime_seconds', 'Task execution time', TASK_BUCKETS)
+TASKS = Counter('celery_task_total', 'Finished tasks by state')
+ITEMS = Counter('celery_task_items_total', 'Items processed by import tasks')
+ITEMS_RATE = Gauge('celery_task_items_per_second', 'Items per second in the last import run')
+PEAK_RSS = Gauge('celery_task_peak_rss_bytes', 'Peak RSS of the worker process after the last run')
+
+# время старта и количество обработанных позиций выполняющихся задач этого процесса
+_running = {}
+
+
+def record_items(count):
+    """
+    Функция для передачи из задачи количества обработанных позиций.
+    :param count: количество позиций
+    """
+    task_id = current_task.request.id if current_task else None
+    if task_id in _running:
+        _running[task_id]['items'] = count
+
+
+@before_task_publish.connect
+def mark_enqueued(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    enqueued_at = task.request.get('enqueued_at') or (task.request.headers or {}).get('enqueued_at')
+    if enqueued_at:
+        QUEUE_LATENCY.observe({'task': task.name}, max(time.time() - enqueued_at, 0))
+    _running[task_id] = {'start': time.perf_counter(), 'items': None}
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _running.pop(task_id, None)
+    if started is None:
+        return
+    runtime = time.perf_counter() - started['start']
+    labels = {'task': task.name}
+    RUNTIME.observe(labels, runtime)
+    if state == 'SUCCESS':
+        TASKS.inc({**labels, 'state': 'success'})
+    if started['items'] is not None:
+        ITEMS.inc(labels, started['items'])
+        ITEMS_RATE.set(labels, round(started['items'] / runtime, 2) if runtime else 0)
+        # ru_maxrss в Linux указывается в килобайтах
+        PEAK_RSS.set(labels, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+@task_retry.connect
+def task_retried(sender=None, **kwargs):
+    TASKS.inc({'task': sender.name, 'state': 'retry'})
+
+
+@task_failure.connect
+def task_failed(sender=None, **kwargs):
+    TASKS.inc({'task': sender.name, 'state': 'failure'})
+
+
+def render_task_metrics(task_names):
+    """
+    Функция для вывода метрик задач в текстовом формате Prometheus.
+    :param task_names: имена задач
+    :return: str
+    """
+    tasks = [{'task': name} for name in sorted(task_names)]
+    states = [{**labels, 'state': state} for labels in tasks for state in TASK_STATES]
+    lines = QUEUE_LATENCY.render(tasks) + RUNTIME.render(tasks) + TASKS.render(states) + \
+        ITEMS.render(tasks) + ITEMS_RATE.render(tasks) + PEAK_RSS.render(tasks)
+    return '\n'.join(lines) + '\n'
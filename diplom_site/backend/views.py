@@ -1,9 +1,11 @@
-from django.core.mail import send_mail
+import os
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from requests import get
-import yaml
 from django.core.validators import URLValidator
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
 from rest_framework import permissions
 from django.core.exceptions import ValidationError
 from rest_framework.authtoken.models import Token
@@ -11,12 +13,35 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import viewsets
+from rest_framework.decorators import action
 
 from backend.serializers import UserSerializer, UserUpdateSerializer, ProductInfoSerializer, \
-    ProductSerializer, ContactSerializer, OrderSerializer, OrderItemSerializer
-from backend.models import Category, ProductInfo, Product, ProductParameter, Parameter, Shop, CITIES, OrderItem, User
-from backend.tasks import send_token_email, load_yaml_task
+    ContactSerializer, OrderSerializer, OrderItemSerializer
+from backend.models import ProductInfo, Product, CITIES, OrderItem, User, Contact, Order, Shop, ArchivedOrderItem
+from backend.tasks import send_token_email, load_yaml_task, dispatch_order_events
+from backend.etags import catalog_etag, bump_catalog_version
+from backend.projections import project_products, project_order_items
+from backend.fieldsets import PRODUCT_FIELDS, PRODUCT_EXPAND, PRODUCT_INFO_FIELDS, PRODUCT_INFO_EXPAND, \
+    parse_fieldset, product_info_queryset
+from backend.webhooks import create_order_event
+from backend.routers import replica_read
+from backend.contacts import get_or_create_contact
+from backend.prices import price_series
+from backend.categories import get_category_stats
+from backend.offers import validate_offer_changes, apply_offer_changes
+from backend.archive import project_archived_order_items, archived_order_detail
+from backend.orders import SHOP_TRANSITIONS, OPEN_STATES, PAGE_SIZE, MAX_PAGE_SIZE, orders_page, change_orders_state
+from backend.profiling import PROFILE_ID_RE, PROFILE_KINDS, profile_path
+from backend.snapshots import snapshot_name, snapshot_path, snapshot_etag, parse_range, iter_range
+from backend.telemetry import render_task_metrics
+from backend.slowqueries import recent_slow_queries
+from diplom_site.celery import app as celery_app
 
 
 def calculate_delivery_cost(shop_city, buyer_city):
@@ -63,6 +88,29 @@ def search_arg_request(request, keyword):
     return True, result
 
 
+def parse_date_param(value, end_of_day=False):
+    """
+    Функция для разбора даты из параметров запроса.
+    :param value: строка с датой или датой и временем
+    :param end_of_day: для даты без времени вернуть конец дня, а не начало
+    :return: datetime, None - если параметра нет, False - если формат неверный
+    """
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return False
+            moment = datetime.combine(day, time.max if end_of_day else time.min)
+    except ValueError:
+        return False
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
 class RegisterView(viewsets.ViewSet):
     """
     View-класс для создания пользователей.
@@ -167,12 +215,13 @@ class RefreshToken(APIView):
 class PartnerUpdate(APIView):
     permission_classes = [permissions.IsAuthenticated, ]
     """
-    Класс для обновления прайса от поставщика. Принимает ссылку на .yaml-файл с информацией.
+    Класс для обновления прайса от поставщика. Принимает ссылку на файл прайса в YAML, JSON или CSV,
+    формат определяется по Content-Type ответа или расширению.
     """
     def post(self, request):
         """
-        Функция для обработки .yaml файла
-        :param request: ссылка на .yaml файл
+        Функция для обработки файла прайса
+        :param request: ссылка на файл прайса
         :return: JSON
         """
 
@@ -193,6 +242,106 @@ class PartnerUpdate(APIView):
         return JsonResponse({'Status': False, 'Errors': 'All required arguments were not provided'})
 
 
+class PartnerOrders(APIView):
+    """
+    Класс для обработки заказов магазином: список заказов и массовая смена статуса.
+    """
+    permission_classes = [permissions.IsAuthenticated, ]
+
+    def get_shop(self, request):
+        if request.user.type != 'shop':
+            return None
+        return Shop.objects.filter(user=request.user).first()
+
+    def get(self, request):
+        """
+        Функция для получения заказов магазина постранично.
+        :param request: необязательные параметры state (по умолчанию открытые заказы), after (ID последнего
+        заказа предыдущей страницы) и limit
+        :return: JSON
+        """
+        shop = self.get_shop(request)
+        if shop is None:
+            return JsonResponse({'Status': False, 'Error': 'Shops only'}, status=403)
+        state = request.query_params.get('state')
+        if state and state not in dict(Order.status_choices):
+            return Response({'state': 'Unknown state'}, status=400)
+        try:
+            after = int(request.query_params['after']) if request.query_params.get('after') else None
+            limit = min(int(request.query_params.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'after and limit must be integers'}, status=400)
+        orders, next_after = orders_page(shop, [state] if state else OPEN_STATES, after, max(limit, 1))
+        return Response({'orders': orders, 'next': next_after})
+
+    def post(self, request):
+        """
+        Функция для массовой смены статуса заказов магазина.
+        :param request: JSON-объект со списком ID заказов orders и целевым статусом state
+        :return: JSON с измененными и отклоненными заказами
+        """
+        shop = self.get_shop(request)
+        if shop is None:
+            return JsonResponse({'Status': False, 'Error': 'Shops only'}, status=403)
+        order_ids = request.data.get('orders')
+        state = request.data.get('state')
+        if state not in SHOP_TRANSITIONS:
+            return Response({'state': f'Allowed values: {", ".join(SHOP_TRANSITIONS)}'}, status=400)
+        if not isinstance(order_ids, list) or not order_ids or \
+                not all(isinstance(order_id, int) for order_id in order_ids):
+            return Response({'orders': 'A non-empty list of order IDs is required'}, status=400)
+        if len(order_ids) > MAX_PAGE_SIZE:
+            return Response({'orders': f'No more than {MAX_PAGE_SIZE} orders per request'}, status=400)
+        updated, rejected = change_orders_state(shop, order_ids, state)
+        return Response({'updated': updated, 'rejected': rejected})
+
+
+class PartnerStock(APIView):
+    """
+    Класс для частичного обновления цен и остатков магазина без загрузки всего прайса.
+    """
+    permission_classes = [permissions.IsAuthenticated, ]
+
+    def post(self, request):
+        """
+        Функция для применения пачки изменений предложений
+        :param request: JSON-объект со списком changes из {external_id, price, price_rrc, quantity},
+        кроме external_id поля необязательны
+        :return: JSON с количеством обновленных предложений и неизвестными external_id
+        """
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Shops only'}, status=403)
+        shop = Shop.objects.filter(user=request.user).only('id').first()
+        if shop is None:
+            return Response({'error': 'Shop not found, load a price list first'}, status=404)
+        changes = request.data.get('changes')
+        errors = validate_offer_changes(changes)
+        if not errors and len(changes) > settings.PARTNER_DELTA_MAX_CHANGES:
+            errors = [f'No more than {settings.PARTNER_DELTA_MAX_CHANGES} changes per request']
+        if errors:
+            return Response({'errors': errors}, status=400)
+        updated, unknown = apply_offer_changes(shop.id, changes, settings.PARTNER_DELTA_BATCH_SIZE)
+        return Response({'updated': updated, 'unknown': unknown})
+
+
+class CategoryView(viewsets.ViewSet):
+    """
+    View для меню категорий. Доступ только для аутентифицированных пользователей.
+    """
+    permission_classes = [permissions.IsAuthenticated, ]
+
+    @replica_read
+    @method_decorator(condition(etag_func=catalog_etag))
+    def list(self, request):
+        """
+        Функция для получения категорий с количеством предложений в наличии, магазинов и диапазоном цен
+        :param request:
+        :return: JSON
+        """
+        # сводка берется из кэша, который обновляется после импорта прайсов
+        return Response({'categories': get_category_stats()})
+
+
 class ProductView(viewsets.ViewSet):
     """
     View для просмотра и изменения параметров продуктов. Доступ только для аутентифицированных пользователей.
@@ -201,28 +350,61 @@ class ProductView(viewsets.ViewSet):
     serializer_class = ProductInfoSerializer
     queryset = ProductInfo.objects.all()
 
+    # ETag проверяется до выборки из БД: при совпадении If-None-Match сразу отдаем 304
+    @replica_read
+    @method_decorator(condition(etag_func=catalog_etag))
     def list(self, request):
         """
         Функция для просмотра всех продуктов в магазинах
-        :param request:
+        :param request: необязательные параметры fields (id, name, category) и expand (category)
         :return: JSON
         """
-        products = Product.objects.all()
-        serializer = ProductSerializer(products, many=True)
-        return Response({"products": serializer.data})
-
+        try:
+            fields, expand = parse_fieldset(request.query_params, PRODUCT_FIELDS, PRODUCT_EXPAND)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=400)
+        # read-only проекция вместо ProductSerializer: тот же JSON без построения полей на каждую строку
+        products = project_products(Product.objects.all(), fields, expand)
+        return Response({"products": products})
+
+    @replica_read
+    @method_decorator(condition(etag_func=catalog_etag))
     def retrieve(self, request, pk=None):
         """
         Функция для отображения детальной информации продукта
-        :param request:
+        :param request: необязательные параметры fields (id, model, product, params, shop, quantity, price)
+        и expand (product, category, shop)
         :param pk: ID продукта
         :return: JSON
         """
-        queryset = ProductInfo.objects.all()
+        try:
+            fields, expand = parse_fieldset(request.query_params, PRODUCT_INFO_FIELDS, PRODUCT_INFO_EXPAND)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=400)
+        queryset = product_info_queryset(ProductInfo.objects.all(), fields, expand)
         product_info = get_object_or_404(queryset, pk=pk)
-        serializer = ProductInfoSerializer(product_info)
+        serializer = ProductInfoSerializer(product_info, fields=fields, expand=expand)
         return Response(serializer.data)
 
+    @replica_read
+    @action(detail=True, methods=['get'])
+    def price_history(self, request, pk=None):
+        """
+        Функция для получения истории цен предложения за период.
+        :param request: необязательные параметры from и to (дата или дата и время в ISO 8601),
+        по умолчанию - последние PRICE_HISTORY_DEFAULT_DAYS дней
+        :param pk: ID информации о продукте
+        :return: JSON
+        """
+        product_info = get_object_or_404(ProductInfo.objects.only('shop_id', 'external_id'), pk=pk)
+        start = parse_date_param(request.query_params.get('from'))
+        end = parse_date_param(request.query_params.get('to'), end_of_day=True)
+        if start is False or end is False:
+            return Response({"error": "Invalid date format, use YYYY-MM-DD or ISO 8601"})
+        end = end or timezone.now()
+        start = start or end - timedelta(days=settings.PRICE_HISTORY_DEFAULT_DAYS)
+        return Response(price_series(product_info.shop_id, product_info.external_id, start, end))
+
 
 class OrderView(viewsets.ViewSet):
     """
@@ -232,30 +414,26 @@ class OrderView(viewsets.ViewSet):
     serializer_class = OrderItemSerializer
     queryset = OrderItem.objects.all()
 
+    @replica_read
     def list(self, request):
         """
         Функция для отображения всех заказов пользователя
-        :param request:
+        :param request: необязательный параметр archived=1 добавляет заказы из архива
         :return: JSON
         """
         user_id = request.user.id
         orders = OrderItem.objects.filter(order__user__id=user_id).all()
-        response = {}
-        if orders.exists():
-            orders_serialized = OrderItemSerializer(orders, many=True)
-            # перебираем все заказы для более читаемой информации в Response
-            for pos, item in enumerate(orders_serialized.data):
-                response.setdefault(pos, {
-                    'id': orders[pos].id,
-                    'order_number': item['order_number'],
-                    'date_created': orders[pos].order.dt.strftime("%Y.%m.%d"),
-                    'total': item['total'],
-                    'state': orders[pos].order.state
-                })
+        # собираем читаемую информацию о заказах одним запросом
+        response = project_order_items(orders)
+        # архивные заказы читаются, только если их запросили явно
+        if request.query_params.get('archived') == '1':
+            response.update(project_archived_order_items(user_id, len(response)))
+        if response:
             return Response({'orders': response})
         else:
             return Response({'orders': 'No orders found'})
 
+    @replica_read
     def retrieve(self, request, pk=None):
         """
         Функция для получения деталей заказа
@@ -265,7 +443,13 @@ class OrderView(viewsets.ViewSet):
         """
         user_id = request.user.id
         queryset = OrderItem.objects.all()
-        order_item = get_object_or_404(queryset, pk=pk)
+        order_item = queryset.filter(pk=pk).first()
+        if order_item is None:
+            # заказ мог быть перенесен в архив, ID при переносе сохраняются
+            archived = get_object_or_404(ArchivedOrderItem.objects.select_related('order__user'), pk=pk)
+            if user_id != archived.order.user_id:
+                return Response({'error': 'Permission denied'})
+            return Response(archived_order_detail(archived))
         order_owner = order_item.order.user.id
         if user_id != order_owner:
             return Response({'error': 'Permission denied'})
@@ -313,7 +497,8 @@ class OrderView(viewsets.ViewSet):
             }
             contact = ContactSerializer(data=contact_data)
             if contact.is_valid():
-                contact.save()
+                # одинаковые контакты пользователя переиспользуем вместо создания новой записи
+                contact.instance = get_or_create_contact(**contact.validated_data)
             else:
                 return Response(contact.errors)
         else:
@@ -393,25 +578,38 @@ class OrderView(viewsets.ViewSet):
             err_response.setdefault('phone', 'Fill this field to confirm')
         if err_response.get('phone') or err_response.get('address'):
             return Response(err_response)
-        address = request.data.get('address')
-        phone = request.data.get('phone')
-        contact.address = address
-        contact.phone = phone
-        contact.save()
-        order = order_item.order
-        # меняем статус заказа
-        order.state = 'confirmed'
-        order.save()
-        quantity = order_item.quantity
-        product = order_item.product_info
-        product.quantity = product.quantity - quantity
-        if product.quantity < 0:
-            return Response({"error": "Sorry, there is less items that you want"})
-        product.save()
-        # номер заказа имеет формат 'город_0(айди_заказа)_дата'
-        order_number = f'{contact.city}_0{pk}_{order.dt.strftime("%yx%mx%d")}'
-        order_item.order_number = order_number
-        order_item.save()
+        address = request.data.get('address') or contact.address
+        phone = request.data.get('phone') or contact.phone
+        with transaction.atomic():
+            # остаток проверяем под блокировкой до любых изменений: при нехватке товара заказ не подтверждается
+            quantity = order_item.quantity
+            product = ProductInfo.objects.select_for_update().select_related('product', 'shop') \
+                .get(id=order_item.product_info_id)
+            if product.quantity < quantity:
+                transaction.set_rollback(True)
+                return Response({"error": "Sorry, there is less items that you want"}, status=409)
+            # контакт может быть общим для нескольких заказов, поэтому не изменяем его,
+            # а переключаем заказ на контакт с новыми данными
+            old_contact = contact
+            contact = get_or_create_contact(contact.user, contact.city, address, phone)
+            order = order_item.order
+            order.contact = contact
+            # меняем статус заказа
+            order.state = 'confirmed'
+            order.save()
+            if old_contact.id != contact.id:
+                Contact.objects.filter(id=old_contact.id, order__isnull=True).delete()
+            product.quantity = product.quantity - quantity
+            product.save(update_fields=['quantity'])
+            # остаток изменился - сбрасываем ETag каталога
+            bump_catalog_version()
+            # номер заказа имеет формат 'город_0(айди_заказа)_дата'
+            order_number = f'{contact.city}_0{pk}_{order.dt.strftime("%yx%mx%d")}'
+            order_item.order_number = order_number
+            order_item.save()
+            # событие для магазина пишем в той же транзакции, доставка - после коммита
+            if create_order_event(order_item, 'order.confirmed'):
+                transaction.on_commit(dispatch_order_events.delay)
         return Response({
             'status': 'OK',
             'order_number': order_number,
@@ -429,3 +627,113 @@ class OrderView(viewsets.ViewSet):
                 'person': f'{contact.user.first_name} {contact.user.last_name}'
             }
         })
+
+
+class ProfileDownload(APIView):
+    """
+    View для скачивания сохраненных профилей запросов. Доступ только для сотрудников.
+    """
+    permission_classes = [permissions.IsAdminUser, ]
+
+    def get(self, request, profile_id, kind):
+        """
+        Функция для получения файла профиля.
+        :param profile_id: ID профиля из заголовка X-Profile-Id
+        :param kind: pstats или collapsed
+        :return: файл
+        """
+        if not PROFILE_ID_RE.match(profile_id) or kind not in PROFILE_KINDS:
+            return Response({"error": "Profile not found"}, status=404)
+        path = profile_path(profile_id, kind)
+        if not os.path.exists(path):
+            return Response({"error": "Profile not found"}, status=404)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
+
+class ShopSnapshot(APIView):
+    """
+    View для скачивания файла каталога магазина (gzip NDJSON). Доступ только для аутентифицированных пользователей.
+    """
+    permission_classes = [permissions.IsAuthenticated, ]
+
+    def get(self, request, shop_id):
+        """
+        Функция для получения файла каталога целиком или диапазона байт по заголовку Range.
+        :param shop_id: ID магазина
+        :return: файл
+        """
+        # файл открывается один раз: метаданные и содержимое берутся из одного дескриптора,
+        # поэтому подмена снимка между проверкой и чтением не смешивает версии
+        try:
+            file = open(snapshot_path(shop_id), 'rb')
+        except FileNotFoundError:
+            return Response({"error": "Snapshot not found"}, status=404)
+        try:
+            stat = os.fstat(file.fileno())
+            etag = snapshot_etag(stat)
+            headers = {
+                'ETag': etag,
+                'Last-Modified': http_date(stat.st_mtime),
+                'Accept-Ranges': 'bytes',
+                'Content-Disposition': f'attachment; filename="{snapshot_name(shop_id)}"',
+            }
+            if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+                file.close()
+                return HttpResponse(status=304, headers=headers)
+            if settings.SNAPSHOT_ACCEL_REDIRECT:
+                # nginx сам отдает файл через sendfile и обрабатывает Range
+                file.close()
+                headers['X-Accel-Redirect'] = (settings.SNAPSHOT_ACCEL_REDIRECT.rstrip('/') + '/'
+                                               + snapshot_name(shop_id))
+                return HttpResponse(content_type='application/gzip', headers=headers)
+
+            byte_range = None
+            if 'HTTP_RANGE' in request.META and request.META.get('HTTP_IF_RANGE', etag) == etag:
+                byte_range = parse_range(request.META['HTTP_RANGE'], stat.st_size)
+            if byte_range is False:
+                file.close()
+                return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{stat.st_size}'})
+            if byte_range is None:
+                # файл целиком отдается через wsgi.file_wrapper, который сервер может передать в sendfile
+                return FileResponse(file, as_attachment=True, filename=snapshot_name(shop_id),
+                                    content_type='application/gzip', headers=headers)
+            first, last = byte_range
+            response = StreamingHttpResponse(iter_range(file, first, last), status=206,
+                                             content_type='application/gzip', headers=headers)
+        except BaseException:
+            file.close()
+            raise
+        # файл закрывается вместе с ответом, даже если генератор так и не был запущен
+        response._resource_closers.append(file.close)
+        response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+        response['Content-Length'] = str(last - first + 1)
+        return response
+
+
+class MetricsView(APIView):
+    """
+    View для выгрузки метрик в текстовом формате Prometheus. Доступ только для сотрудников.
+    """
+    permission_classes = [permissions.IsAdminUser, ]
+
+    def get(self, request):
+        """
+        Функция для получения метрик задач Celery.
+        :return: text/plain
+        """
+        task_names = [name for name in celery_app.tasks if name.startswith('backend.')]
+        return HttpResponse(render_task_metrics(task_names), content_type='text/plain; version=0.0.4')
+
+
+class SlowQueryView(APIView):
+    """
+    View для просмотра журнала медленных запросов процесса. Доступ только для сотрудников.
+    """
+    permission_classes = [permissions.IsAdminUser, ]
+
+    def get(self, request):
+        """
+        Функция для получения последних медленных запросов, новые - первыми.
+        :return: JSON с порогом в миллисекундах и списком запросов
+        """
+        return JsonResponse({'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS, 'queries': recent_slow_queries()})
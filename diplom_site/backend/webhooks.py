@@ -0,0 +1,121 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from backend.models import OrderEvent
+
+_session = None
+
+
+def get_session():
+    """
+    Функция для получения общей на процесс HTTP-сессии с пулом соединений,
+    чтобы не открывать новое соединение к магазину на каждую пачку событий.
+    :return: requests.Session
+    """
+    global _session
+    if _session is None:
+        # requests загружается при первой доставке, а не при старте процесса
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=settings.WEBHOOK_POOL_SIZE, pool_maxsize=settings.WEBHOOK_POOL_SIZE)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def create_order_event(order_item, event):
+    """
+    Функция для записи события заказа в outbox. Должна вызываться в той же транзакции,
+    что и изменение заказа. Для магазинов без webhook_url событие не создается.
+    :param order_item: объект OrderItem
+    :param event: название события, например 'order.confirmed'
+    :return: объект OrderEvent или None
+    """
+    product_info = order_item.product_info
+    if not product_info.shop.webhook_url:
+        return None
+    order = order_item.order
+    return OrderEvent.objects.create(order_id=order.id, shop_id=product_info.shop_id, event=event, payload={
+        'event': event,
+        'order_id': order.id,
+        'order_item_id': order_item.id,
+        'order_number': order_item.order_number,
+        'state': order.state,
+        'external_id': product_info.external_id,
+        'quantity': order_item.quantity,
+        'total': order_item.total,
+        'created': order.dt.isoformat(),
+    })
+
+
+def get_backoff(attempts):
+    """
+    Функция для расчета задержки перед повторной доставкой (экспоненциально от числа попыток).
+    :param attempts: количество уже сделанных попыток
+    :return: timedelta
+    """
+    return timedelta(seconds=settings.WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+def claim_events(batch_size):
+    """
+    Функция для резервирования пачки готовых к отправке событий. Зарезервированные события
+    откладываются на время доставки всей пачки, чтобы параллельный воркер не отправил их повторно.
+    :param batch_size: максимальный размер пачки
+    :return: list() событий, отсортированных по магазину
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(OrderEvent.objects.select_for_update(skip_locked=True)
+                      .filter(delivered_at__isnull=True, next_attempt_at__lte=now,
+                              attempts__lt=settings.WEBHOOK_MAX_ATTEMPTS)
+                      .select_related('shop')
+                      .order_by('id')[:batch_size])
+        # магазины обходятся по очереди, и каждый POST может занять до двух таймаутов (соединение и ответ),
+        # поэтому резерв рассчитывается на все магазины пачки
+        shops = len({event.shop_id for event in events})
+        lease = now + timedelta(seconds=settings.WEBHOOK_TIMEOUT * 2 * max(shops, 1))
+        OrderEvent.objects.filter(id__in=[event.id for event in events]).update(next_attempt_at=lease)
+    events.sort(key=lambda event: (event.shop_id, event.id))
+    return events
+
+
+def deliver_events(batch_size):
+    """
+    Функция для доставки событий магазинам. События одного магазина отправляются
+    одним POST-запросом со списком событий.
+    :param batch_size: максимальное количество событий за вызов
+    :return: dict() с количеством доставленных и отложенных событий, а также признаком
+    того, что в очереди могли остаться события
+    """
+    from requests import RequestException
+
+    events = claim_events(batch_size)
+    session = get_session()
+    delivered, failed = 0, 0
+    for shop_id, shop_events in groupby(events, key=lambda event: event.shop_id):
+        shop_events = list(shop_events)
+        ids = [event.id for event in shop_events]
+        try:
+            response = session.post(shop_events[0].shop.webhook_url,
+                                    json={'events': [event.payload for event in shop_events]},
+                                    timeout=settings.WEBHOOK_TIMEOUT)
+            response.raise_for_status()
+        except RequestException:
+            # каждая пачка одного магазина откладывается целиком
+            now = timezone.now()
+            for event in shop_events:
+                event.attempts += 1
+                event.next_attempt_at = now + get_backoff(event.attempts)
+            OrderEvent.objects.bulk_update(shop_events, ['attempts', 'next_attempt_at'])
+            failed += len(ids)
+        else:
+            OrderEvent.objects.filter(id__in=ids).update(delivered_at=timezone.now())
+            delivered += len(ids)
+    return {'delivered': delivered, 'failed': failed, 'has_more': len(events) == batch_size}
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 # Initialise environment variables
 import environ
@@ -56,16 +57,42 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'backend.middleware.CompressionMiddleware',
+    'backend.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'backend.middleware.CsrfViewMiddleware',
+    'backend.middleware.AuthenticationMiddleware',
+    'backend.middleware.MessageMiddleware',
+    'backend.middleware.PrimaryPinMiddleware',
+    'backend.middleware.ProfilerMiddleware',
+    'backend.middleware.SlowQueryMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+# сессии, CSRF, аутентификация и сообщения Django работают только на этих путях,
+# API DRF с аутентификацией по токену обходится без них
+SESSION_PATH_PREFIXES = ('/admin/', '/accounts/')
 
 ROOT_URLCONF = 'diplom_site.urls'
 
+# роль процесса: web обслуживает HTTP, worker выполняет задачи Celery (DJANGO_ROLE=worker).
+# Воркеру не нужны админка, allauth и схема API, без них и без маршрутов он стартует быстрее
+DJANGO_ROLE = env('DJANGO_ROLE', default='web')
+WEB_ONLY_APPS = [
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.sites',
+    'django.contrib.staticfiles',
+    'drf_spectacular',
+    'allauth',
+    'allauth.account',
+    'allauth.socialaccount',
+    'allauth.socialaccount.providers.vk',
+]
+if DJANGO_ROLE == 'worker':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in WEB_ONLY_APPS]
+    ROOT_URLCONF = 'diplom_site.worker_urls'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -99,6 +126,26 @@ DATABASES = {
     }
 }
 
+# реплики только для чтения: по одной на каждый адрес из DB_REPLICA_HOSTS (через запятую),
+# адрес вида host/name задает реплике свое имя БД, например localhost/shop_replica для двух локальных баз
+DATABASE_REPLICAS = []
+for index, address in enumerate(env.list('DB_REPLICA_HOSTS', default=[])):
+    alias = f'replica{index}'
+    host, _, name = address.partition('/')
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host, 'NAME': name or DATABASES['default']['NAME'],
+                        'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.routers.ReplicaRouter']
+# сколько секунд после записи пользователь читает только с основной БД
+REPLICA_PIN_SECONDS = 10
+
+# общий кэш нужен для метрик задач, закрепления за основной БД и лимитов запросов между процессами,
+# например CACHE_URL=rediscache://127.0.0.1:6379/1
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -159,11 +206,29 @@ REST_FRAMEWORK = {
         'rest_framework.throttling.UserRateThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '10/hour',
-        'user': '100/hour'
+        'anon': env('THROTTLE_ANON', default='10/hour'),
+        'user': env('THROTTLE_USER', default='100/hour')
     },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+# MessagePack подключается, только если установлен пакет msgpack
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'backend.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].insert(1, 'backend.renderers.MessagePackParser')
+
+# сжатие ответов: порог в байтах и уровень сжатия brotli (0-11)
+RESPONSE_COMPRESSION_MIN_LENGTH = 1024
+RESPONSE_BROTLI_QUALITY = 5
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Shop API',
     'DESCRIPTION': 'Final project for Netology course',
@@ -177,6 +242,119 @@ CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379"
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# очереди: уведомления не ждут за тяжелыми импортами, периодическое обслуживание идет в default
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'backend.tasks.send_token_email': {'queue': 'notifications', 'priority': 0},
+    'backend.tasks.dispatch_order_events': {'queue': 'notifications', 'priority': 3},
+    'backend.tasks.load_yaml_task': {'queue': 'imports'},
+    'backend.tasks.build_shop_snapshot': {'queue': 'imports'},
+}
+# приоритеты внутри очереди, на Redis 0 - наивысший
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'sep': ':',
+}
+# воркеры по очередям (python manage.py run_worker <очередь>): количество процессов и prefetch,
+# задачам импорта - по одной на процесс, чтобы длинный импорт не держал за собой зарезервированные задачи
+CELERY_WORKER_QUEUES = {
+    'notifications': {
+        'concurrency': env.int('CELERY_NOTIFICATIONS_CONCURRENCY', default=4),
+        'prefetch_multiplier': 4,
+    },
+    'imports': {
+        'concurrency': env.int('CELERY_IMPORTS_CONCURRENCY', default=2),
+        'prefetch_multiplier': 1,
+    },
+    'default': {
+        'concurrency': env.int('CELERY_DEFAULT_CONCURRENCY', default=2),
+        'prefetch_multiplier': 1,
+    },
+}
+# ограничения времени импорта прайса, сек: мягкое откатывает загрузку, жесткое завершает процесс воркера
+IMPORT_SOFT_TIME_LIMIT = env.int('IMPORT_SOFT_TIME_LIMIT', default=600)
+IMPORT_TIME_LIMIT = env.int('IMPORT_TIME_LIMIT', default=660)
+CELERY_BEAT_SCHEDULE = {
+    # повторная доставка отложенных событий заказов
+    'dispatch-order-events': {
+        'task': 'backend.tasks.dispatch_order_events',
+        'schedule': 60.0,
+    },
+    'purge-abandoned-baskets': {
+        'task': 'backend.tasks.purge_abandoned_baskets',
+        'schedule': 60.0 * 60,
+    },
+    'archive-finished-orders': {
+        'task': 'backend.tasks.archive_finished_orders',
+        'schedule': 60.0 * 60 * 24,
+    },
+}
+
+# профилирование запросов по требованию: каталог для профилей и интервал сэмплирования стеков, сек
+PROFILE_DIR = env('PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILE_SAMPLE_INTERVAL = 0.001
+
+# время жизни сводки по категориям в кэше, сек: сводка сверяется с версией, которую увеличивает импорт,
+# срок только ограничивает хранение в кэше; блокировка пересчета, сек - не дольше одного расчета сводки
+CATEGORY_STATS_TIMEOUT = 60 * 60
+CATEGORY_STATS_LOCK_TIMEOUT = 30
+
+# словари параметров при импорте: размер LRU-кэша ID названий и значений в процессе воркера,
+# хранение повторяющихся значений в словаре ParameterValue и размер пачки вставки параметров
+PARAMETER_CACHE_SIZE = 2000
+PARAMETER_VALUE_CACHE_SIZE = 50000
+PARAMETER_VALUE_DICTIONARY = env.bool('PARAMETER_VALUE_DICTIONARY', default=False)
+PARAMETER_BATCH_SIZE = 1000
+
+# файлы каталога магазинов: каталог, степень сжатия gzip и префикс внутреннего location nginx
+# для X-Accel-Redirect (пусто - файл отдает Django)
+SNAPSHOT_DIR = env('SNAPSHOT_DIR', default=str(BASE_DIR / 'snapshots'))
+SNAPSHOT_COMPRESS_LEVEL = 6
+SNAPSHOT_ACCEL_REDIRECT = env('SNAPSHOT_ACCEL_REDIRECT', default='')
+
+# журнал медленных запросов: порог в миллисекундах (None или пустое значение в окружении - выключен),
+# размер журнала в памяти процесса и построение плана EXPLAIN для медленных SELECT
+SLOW_QUERY_THRESHOLD_MS = env.str('SLOW_QUERY_THRESHOLD_MS', default='200').strip()
+SLOW_QUERY_THRESHOLD_MS = (float(SLOW_QUERY_THRESHOLD_MS) if SLOW_QUERY_THRESHOLD_MS.lower() not in ('', 'none')
+                           else None)
+SLOW_QUERY_BUFFER_SIZE = 100
+SLOW_QUERY_EXPLAIN = True
+# параметры запросов пишутся в журнал, кроме запросов к таблицам и колонкам, в имени которых есть
+# одна из подстрок SLOW_QUERY_SENSITIVE: у них параметры и план заменяются маской
+SLOW_QUERY_LOG_PARAMS = env.bool('SLOW_QUERY_LOG_PARAMS', default=True)
+SLOW_QUERY_SENSITIVE = ('authtoken', 'password', 'token', 'session')
+
+# период истории цен по умолчанию, дней
+PRICE_HISTORY_DEFAULT_DAYS = 90
+
+# архив заказов: возраст в днях, после которого завершенные и отмененные заказы переносятся в архив, и размер пачки
+ORDER_ARCHIVE_DAYS = 365
+ORDER_ARCHIVE_BATCH_SIZE = 500
+
+# частичное обновление цен и остатков магазином: размер пачки одного UPDATE и максимум изменений в запросе
+PARTNER_DELTA_BATCH_SIZE = 500
+PARTNER_DELTA_MAX_CHANGES = 10000
+
+# брошенные корзины: возраст в часах, после которого корзина удаляется, и размер пачки удаления
+BASKET_EXPIRY_HOURS = 72
+BASKET_PURGE_BATCH_SIZE = 500
+
+# доставка событий заказов магазинам: размер пачки, таймаут (сек), попытки, база задержки (сек), пул соединений
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_TIMEOUT = 5
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_BACKOFF_BASE = 30
+WEBHOOK_POOL_SIZE = 10
+
+# бюджет времени запуска процесса, мс (manage.py import_budget)
+IMPORT_TIME_BUDGETS = {
+    'wsgi': env.int('IMPORT_BUDGET_WSGI', default=1000),
+    'asgi': env.int('IMPORT_BUDGET_ASGI', default=1000),
+    'celery': env.int('IMPORT_BUDGET_CELERY', default=600),
+    'manage': env.int('IMPORT_BUDGET_MANAGE', default=1000),
+}
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -19,10 +19,12 @@ from rest_framework.authtoken import views
 from rest_framework.routers import DefaultRouter
 
 from backend.views import  PartnerUpdate, \
-    RefreshToken, ProductView, OrderView, RegisterView, UserUpdateView
+    RefreshToken, ProductView, OrderView, RegisterView, UserUpdateView, ProfileDownload, \
+    MetricsView, PartnerOrders, CategoryView, PartnerStock, SlowQueryView, ShopSnapshot
 
 router = DefaultRouter()
 router.register(r'products', ProductView, basename='ProductInfo')
+router.register(r'categories', CategoryView, basename='Category')
 router.register(r'orders', OrderView, basename='OrderItem')
 router.register(r'register', RegisterView, basename='Register')
 router.register(r'users', UserUpdateView, basename='User')
@@ -32,5 +34,11 @@ urlpatterns = [
     path('get_token/', views.obtain_auth_token),
     path('refresh_token/', RefreshToken.as_view()),
     path('partner_update/', PartnerUpdate.as_view()),
+    path('partner_orders/', PartnerOrders.as_view()),
+    path('partner_stock/', PartnerStock.as_view()),
+    path('profiles/<str:profile_id>/<str:kind>/', ProfileDownload.as_view()),
+    path('shops/<int:shop_id>/snapshot/', ShopSnapshot.as_view()),
+    path('metrics/', MetricsView.as_view()),
+    path('slow_queries/', SlowQueryView.as_view()),
     path('accounts/', include('allauth.urls')),
 ] + router.urls
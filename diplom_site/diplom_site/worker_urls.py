@@ -0,0 +1,5 @@
+"""
+Маршруты для процессов с DJANGO_ROLE=worker: воркеры Celery не обслуживают HTTP,
+поэтому проверки Django при старте не загружают представления, админку и allauth.
+"""
+urlpatterns = []
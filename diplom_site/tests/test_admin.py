@@ -0,0 +1,63 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import Client
+from model_bakery import baker
+
+from backend.models import User, Shop, Product, Category, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
+    Contact
+
+
+@pytest.fixture
+def admin_client():
+    client = Client()
+    client.force_login(baker.make(User, is_staff=True, is_superuser=True))
+    return client
+
+
+def make_rows(quantity):
+    shop = baker.make(Shop)
+    parameter = baker.make(Parameter)
+    for _ in range(quantity):
+        user = baker.make(User)
+        order = baker.make(Order, user=user, contact=baker.make(Contact, user=user))
+        product = baker.make(Product, category=baker.make(Category))
+        product_info = baker.make(ProductInfo, product=product, shop=shop)
+        baker.make(ProductParameter, product_info=product_info, parameter=parameter)
+        baker.make(OrderItem, order=order, product_info=product_info)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('model', ['productparameter', 'productinfo', 'orderitem', 'order'])
+def test_changelist_queries_constant(admin_client, model):
+    url = f'/admin/backend/{model}/'
+    make_rows(3)
+    with CaptureQueriesContext(connection) as few:
+        assert admin_client.get(url).status_code == 200
+    make_rows(30)
+    with CaptureQueriesContext(connection) as many:
+        assert admin_client.get(url).status_code == 200
+    # количество запросов не зависит от числа строк на странице
+    assert len(many) == len(few)
+
+
+@pytest.mark.django_db
+def test_product_info_autocomplete(admin_client):
+    make_rows(5)
+    response = admin_client.get('/admin/autocomplete/', {
+        'app_label': 'backend', 'model_name': 'orderitem', 'field_name': 'product_info', 'term': '',
+    })
+    assert response.status_code == 200
+    assert len(response.json()['results']) == 5
+
+
+@pytest.mark.django_db
+def test_prefix_search_index(monkeypatch):
+    with connection.cursor() as cursor:
+        indexes = connection.introspection.get_constraints(cursor, Product._meta.db_table)
+    assert 'product_name_upper' in indexes
+    index = next(index for index in Product._meta.indexes if index.name == 'product_name_upper')
+    # на PostgreSQL индекс строится с классом операторов для LIKE
+    monkeypatch.setattr(connection, 'vendor', 'postgresql')
+    sql = str(index.create_sql(Product, connection.schema_editor(collect_sql=True)))
+    assert 'UPPER("name") text_pattern_ops' in sql
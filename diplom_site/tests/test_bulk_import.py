@@ -0,0 +1,111 @@
+import io
+import os
+
+import pytest
+import yaml
+from django.core.management import call_command, CommandError
+
+from backend.models import Shop, ProductInfo, ProductParameter, User
+from backend.snapshots import snapshot_path
+from backend.pricelists import dump_price_list, parse_price_list, detect_format, validate_price_list
+
+
+def price_list(shop, category_id, external_ids):
+    return {
+        'shop': shop,
+        'categories': [{'id': category_id, 'name': f'Категория {category_id}'}],
+        'goods': [
+            {'id': external_id, 'category': category_id, 'model': 'm', 'name': f'{shop} {external_id}',
+             'price': 100, 'price_rrc': 120, 'quantity': 5, 'parameters': {'Цвет': 'черный'}}
+            for external_id in external_ids
+        ],
+    }
+
+
+@pytest.fixture
+def price_lists(tmp_path):
+    (tmp_path / 'first.yaml').write_text(yaml.dump(price_list('Связной', 1, range(3)), allow_unicode=True))
+    (tmp_path / 'second.json').write_text(dump_price_list(price_list('Евросеть', 2, range(4)), 'json'))
+    (tmp_path / 'notes.txt').write_text('не прайс')
+    return tmp_path
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bulk_import(price_lists, settings, tmp_path_factory):
+    settings.SNAPSHOT_DIR = str(tmp_path_factory.mktemp('snapshots'))
+    call_command('bulk_import', str(price_lists), '--workers', '2', '--dry-run')
+    assert not Shop.objects.exists()
+
+    call_command('bulk_import', str(price_lists), '--workers', '2')
+    assert set(Shop.objects.values_list('name', 'user__type')) == {('Связной', 'shop'), ('Евросеть', 'shop')}
+    assert ProductInfo.objects.count() == 7
+    assert ProductParameter.objects.count() == 7
+    for shop in Shop.objects.all():
+        assert os.path.exists(snapshot_path(shop.id))
+    # повторная загрузка заменяет предложения тех же магазинов и владельцев
+    call_command('bulk_import', str(price_lists), '--workers', '2')
+    assert ProductInfo.objects.count() == 7
+    assert User.objects.count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bulk_import_rejects_invalid_files(price_lists):
+    broken = price_list('Ситилинк', 3, range(2))
+    broken['goods'][1]['category'] = 99
+    del broken['goods'][0]['price']
+    (price_lists / 'broken.yaml').write_text(yaml.dump(broken, allow_unicode=True))
+    with pytest.raises(CommandError, match='1 invalid price lists'):
+        call_command('bulk_import', str(price_lists), '--workers', '2')
+    assert not Shop.objects.exists()
+
+
+
+@pytest.mark.django_db
+def test_bulk_import_reports_malformed_files(tmp_path):
+    (tmp_path / 'empty.yaml').write_text('shop: a\ncategories: []\ngoods:\n')
+    with pytest.raises(CommandError, match='1 invalid price lists'):
+        call_command('bulk_import', str(tmp_path), '--workers', '1', '--dry-run', stderr=io.StringIO())
+
+
+def test_validate_malformed_price_list():
+    assert validate_price_list({'shop': ['a'], 'categories': None, 'goods': None}) == [
+        'shop: must be a string', 'categories must be a list', 'goods must be a list']
+    data = price_list('Связной', 1, range(3))
+    data['categories'].append({'id': 2})
+    data['goods'][0]['category'] = [1]
+    data['goods'][1].update(name=None, model=5, parameters={'Цвет': ['черный']})
+    assert validate_price_list(data) == [
+        'categories[1]: name must be a string',
+        'goods[0]: category must be a non-negative integer',
+        'goods[1]: name must be a string',
+        'goods[1]: model must be a string',
+        'goods[1]: parameter Цвет must be a scalar of at most 100 characters',
+    ]
+
+
+def test_price_list_formats():
+    data = price_list('Связной', 1, range(3))
+    for price_format in ('yaml', 'json', 'csv'):
+        content = dump_price_list(data, price_format)
+        assert parse_price_list(content.encode(), price_format) == data
+    assert detect_format('http://example.com/price.csv?v=2') == 'csv'
+    assert detect_format('http://example.com/price', 'application/json; charset=utf-8') == 'json'
+    assert detect_format('shop.yml') == 'yaml'
+    broken = dump_price_list(data, 'csv').replace(',100,120,', ',сто,120,', 1)
+    assert validate_price_list(parse_price_list(broken, 'csv')) == ['goods[0]: price must be a non-negative integer']
+    # в короткой строке недостающие колонки приходят как None
+    short = dump_price_list(data, 'csv').rstrip().rsplit(',', 3)[0]
+    assert 'goods[2]: quantity must be a non-negative integer' in validate_price_list(parse_price_list(short, 'csv'))
+    data['goods'][0].update(quantity=True, parameters=['Цвет'])
+    assert validate_price_list(data) == ['goods[0]: quantity must be a non-negative integer',
+                                         'goods[0]: parameters must be a mapping']
+    lines = dump_price_list(price_list('Связной', 1, range(3)), 'csv').splitlines()
+    lines[-1] = lines[-1].replace('Связной', 'Евросеть', 1)
+    with pytest.raises(ValueError, match="line 4: shop 'Евросеть' differs from 'Связной'"):
+        parse_price_list('\n'.join(lines), 'csv')
+
+
+def test_benchmark_price_lists():
+    output = io.StringIO()
+    call_command('benchmark_price_lists', '--items', '50', '--repeat', '1', stdout=output)
+    assert [line.split()[0] for line in output.getvalue().splitlines()[1:]] == ['yaml', 'json', 'csv', 'yaml']
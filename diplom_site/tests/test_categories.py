@@ -0,0 +1,66 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Product, Category, ProductInfo
+from backend.categories import refresh_category_stats, LOCK_KEY
+from backend.etags import bump_catalog_version, CATEGORY_STATS
+
+CATEGORIES = '/categories/'
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_category_stats():
+    phones, laptops, empty = (baker.make(Category, name=name) for name in ('Смартфоны', 'Ноутбуки', 'Аксессуары'))
+    first, second = baker.make(Shop, _quantity=2)
+    for shop, price, quantity in ((first, 100, 5), (second, 300, 1), (second, 50, 0)):
+        baker.make(ProductInfo, product=baker.make(Product, category=phones), shop=shop, price=price,
+                   quantity=quantity)
+    baker.make(ProductInfo, product=baker.make(Product, category=laptops), shop=first, price=900, quantity=2)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=baker.make(User)).key)
+
+    response = client.get(CATEGORIES)
+    assert response.json()['categories'] == [
+        {'id': empty.id, 'name': 'Аксессуары', 'offers': 0, 'shops': 0, 'min_price': None, 'max_price': None},
+        {'id': laptops.id, 'name': 'Ноутбуки', 'offers': 1, 'shops': 1, 'min_price': 900, 'max_price': 900},
+        {'id': phones.id, 'name': 'Смартфоны', 'offers': 2, 'shops': 2, 'min_price': 100, 'max_price': 300},
+    ]
+
+    ProductInfo.objects.filter(shop=first).update(quantity=0)
+    # пока версия каталога не менялась, сводка отдается из кэша без чтения ProductInfo
+    with CaptureQueriesContext(connection) as queries:
+        cached = client.get(CATEGORIES, HTTP_ACCEPT='application/json').json()['categories']
+    assert not any('backend_productinfo' in query['sql'] for query in queries.captured_queries)
+    assert cached == response.json()['categories']
+
+    # заказы и изменения остатков меняют версию каталога, но не сводки: ProductInfo не читается
+    etag = response['ETag']
+    bump_catalog_version()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(CATEGORIES, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert not any('backend_productinfo' in query['sql'] for query in queries.captured_queries)
+    assert response.json()['categories'] == cached
+
+    # импорт меняет версию сводки: пока другой запрос держит блокировку, отдается прежняя сводка
+    bump_catalog_version(CATEGORY_STATS)
+    cache.add(LOCK_KEY, True)
+    assert client.get(CATEGORIES).json()['categories'] == cached
+    cache.delete(LOCK_KEY)
+    stats = {category['id']: category for category in client.get(CATEGORIES).json()['categories']}
+    assert (stats[phones.id]['offers'], stats[phones.id]['shops']) == (1, 1)
+    assert stats[laptops.id]['offers'] == 0
+
+    ProductInfo.objects.filter(shop=second).update(quantity=0)
+    refresh_category_stats()
+    assert client.get(CATEGORIES).json()['categories'][2]['offers'] == 0
@@ -0,0 +1,45 @@
+import pytest
+from django.core.management import call_command
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Product, Category, ProductInfo, Order, Contact
+
+ORDERS = '/orders/'
+
+
+@pytest.mark.django_db
+def test_contact_reused_on_order():
+    user = baker.make(User)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    shop = baker.make(Shop)
+    for _ in range(2):
+        product = baker.make(Product, category=baker.make(Category))
+        baker.make(ProductInfo, product=product, shop=shop, quantity=10, price=100)
+    contacts = [
+        {'city': 'Москва', 'address': 'Тверская, 1', 'phone': '+7 (999) 000-00-00'},
+        {'city': ' москва ', 'address': 'тверская,  1', 'phone': '+79990000000'},
+    ]
+    for product, contact in zip(Product.objects.all(), contacts):
+        response = client.post(ORDERS, data={'contact': contact, 'quantity': 1, 'product_info': product.id},
+                               format='json')
+        assert response.json()['total']
+    assert Contact.objects.count() == 1
+    assert Order.objects.filter(contact=Contact.objects.get()).count() == 2
+
+
+@pytest.mark.django_db
+def test_dedupe_contacts_command():
+    user = baker.make(User)
+    contacts = [baker.make(Contact, user=user, city='Пермь', address=address, phone='89990000000')
+                for address in ('Ленина, 5', 'ЛЕНИНА, 5', 'Ленина,  5')]
+    other = baker.make(Contact, user=user, city='Пермь', address='Ленина, 6', phone='89990000000')
+    # контакты, созданные до появления хэша
+    Contact.objects.update(fingerprint='')
+    orders = [baker.make(Order, user=user, contact=contact) for contact in contacts + [other]]
+    call_command('dedupe_contacts', batch_size=1)
+    assert set(Contact.objects.values_list('id', flat=True)) == {contacts[0].id, other.id}
+    assert Order.objects.count() == len(orders)
+    assert Order.objects.filter(contact=contacts[0]).count() == 3
@@ -0,0 +1,93 @@
+import datetime
+import gzip
+import json
+
+import pytest
+from django.core.exceptions import SuspiciousOperation
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from backend.models import User, Product, Category
+from backend.middleware import decompress_body
+from backend.renderers import FastJSONRenderer
+
+ORDERS = '/orders/'
+PRODUCTS = '/products/'
+
+
+@pytest.fixture
+def client():
+    user = baker.make(User)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    category = Category.objects.create(name='Смартфоны')
+    baker.make(Product, category_id=category.id, _quantity=100)
+    return client
+
+
+def test_fast_json_identical():
+    data = {
+        'products': [{'id': 1, 'name': 'Смартфон ', 'category': {'name': 'Телефоны'}}],
+        'orders': {0: {'date': datetime.datetime(2022, 7, 1, tzinfo=datetime.timezone.utc)}},
+    }
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+@pytest.mark.django_db
+def test_msgpack_response(client):
+    msgpack = pytest.importorskip('msgpack')
+    json_data = client.get(PRODUCTS).json()
+    response = client.get(PRODUCTS, HTTP_ACCEPT='application/msgpack')
+    assert response['Content-Type'] == 'application/msgpack'
+    assert msgpack.unpackb(response.content) == json_data
+    assert len(response.content) < len(json.dumps(json_data).encode())
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('encoding', ['gzip', 'br'])
+def test_compressed_response(client, encoding):
+    plain = client.get(PRODUCTS)
+    response = client.get(PRODUCTS, HTTP_ACCEPT_ENCODING=encoding)
+    assert response['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response['Vary']
+    assert len(response.content) < len(plain.content)
+    if encoding == 'gzip':
+        assert gzip.decompress(response.content) == plain.content
+    # ETag различается для разных представлений
+    assert response['ETag'] != plain['ETag']
+
+
+@pytest.mark.django_db
+def test_compressed_msgpack_request(client):
+    msgpack = pytest.importorskip('msgpack')
+    body = gzip.compress(msgpack.packb({'contact': 'Москва'}))
+    response = client.post(ORDERS, data=body, content_type='application/msgpack', HTTP_CONTENT_ENCODING='gzip')
+    assert response.json() == {'contact': 'Invalid format'}
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'br'])
+def test_decompress_limits(encoding):
+    if encoding == 'gzip':
+        compress = gzip.compress
+    else:
+        compress = pytest.importorskip('brotli').compress
+    bomb = compress(b'0' * 10 ** 7)
+    with pytest.raises(SuspiciousOperation, match='exceeded'):
+        decompress_body(bomb, encoding, 1024)
+    data = json.dumps({'contact': 'Москва'}).encode() * 100
+    body = compress(data)
+    assert decompress_body(body, encoding, None) == data
+    with pytest.raises(SuspiciousOperation, match='Truncated'):
+        decompress_body(body[:len(body) // 2], encoding, None)
+
+
+@pytest.mark.django_db
+def test_unsupported_request_encoding(client, monkeypatch):
+    # без потоковой распаковки (brotli<1.2) тело в br не принимается
+    monkeypatch.setattr('backend.middleware.REQUEST_ENCODINGS', ('gzip',))
+    for encoding in ('br', 'compress'):
+        response = client.post(ORDERS, data=b'\x00', content_type='application/json', HTTP_CONTENT_ENCODING=encoding)
+        assert response.status_code == 415
+        assert response['Accept-Encoding'] == 'gzip'
@@ -0,0 +1,68 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Product, Category, ProductInfo, ProductParameter, Parameter
+from backend.serializers import ProductInfoSerializer
+
+PRODUCTS = '/products/'
+
+
+@pytest.fixture
+def client():
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=baker.make(User)).key)
+    return client
+
+
+def catalog_queries(queries):
+    return [query['sql'] for query in queries.captured_queries if 'backend_product' in query['sql']]
+
+
+@pytest.mark.django_db
+def test_products_fields(client):
+    category = baker.make(Category, name='Смартфоны')
+    product = baker.make(Product, category=category, name='iPhone')
+
+    assert client.get(PRODUCTS).json()['products'] == [
+        {'id': product.id, 'name': 'iPhone', 'category': {'name': 'Смартфоны'}}]
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(PRODUCTS, {'fields': 'id,category', 'expand': ''})
+    assert response.json()['products'] == [{'id': product.id, 'category': category.id}]
+    assert not [sql for sql in catalog_queries(queries) if 'JOIN' in sql]
+
+    response = client.get(PRODUCTS, {'fields': 'id,price'})
+    assert response.status_code == 400
+    assert 'price' in response.json()['error']
+
+
+@pytest.mark.django_db
+def test_product_info_fields(client):
+    product = baker.make(Product, category=baker.make(Category))
+    product_info = baker.make(ProductInfo, product=product, shop=baker.make(Shop), price=100, quantity=3)
+    baker.make(ProductParameter, product_info_id=product.id, parameter=baker.make(Parameter, name='Цвет'),
+               value='черный')
+    url = f'{PRODUCTS}{product_info.id}/'
+
+    # без параметров ответ совпадает с полным сериализатором
+    full = client.get(url)
+    assert full.json() == ProductInfoSerializer(product_info).data
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, {'fields': 'id,price,quantity'})
+    assert response.json() == {'id': product_info.id, 'quantity': 3, 'price': 100}
+    # ни параметров, ни JOIN: одна выборка из ProductInfo
+    assert len(catalog_queries(queries)) == 1 and 'JOIN' not in catalog_queries(queries)[0]
+    assert len(response.content) < len(full.content)
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, {'fields': 'product,shop', 'expand': 'product'})
+    assert response.json() == {'product': {'id': product.id, 'name': product.name, 'category': product.category_id},
+                               'shop': product_info.shop_id}
+    assert len(catalog_queries(queries)) == 1
+    assert 'backend_shop' not in catalog_queries(queries)[0] and 'backend_category' not in catalog_queries(queries)[0]
+
+    assert client.get(url, {'expand': 'params'}).status_code == 400
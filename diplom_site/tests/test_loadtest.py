@@ -0,0 +1,46 @@
+import pytest
+import requests
+from django.core.cache import cache
+from model_bakery import baker
+
+from backend.loadtest import Recorder, Session, summarize, compare_with_baseline, run_load
+from backend.models import Shop, Product, Category, ProductInfo
+
+
+def test_summarize_and_compare():
+    recorder = Recorder()
+    for ms in range(1, 101):
+        recorder.add('/products/', ms / 1000, ok=ms != 100)
+    report = summarize(recorder, elapsed=10)
+    assert report['/products/'] == {'requests': 100, 'errors': 1, 'rps': 10.0, 'p50': 50.0, 'p95': 95.0, 'p99': 99.0}
+    assert compare_with_baseline(report, report, tolerance=0.2) == []
+    faster = {'/products/': {**report['/products/'], 'p95': 50.0}}
+    assert compare_with_baseline(report, faster, tolerance=0.2) == ['/products/: p95 95.0ms > baseline 50.0ms']
+
+
+def test_session_json_errors():
+    recorder = Recorder()
+    session = Session('http://testserver', recorder)
+    for status, body in ((200, b'<html>Server Error</html>'), (200, b''), (200, b'[]'), (201, b'{"id": 1}')):
+        response = requests.Response()
+        response.status_code, response._content = status, body
+        session.json('POST', '/orders/', response)
+    # HTML, пустое тело и не объект засчитаны как ошибки, исключение не выброшено
+    assert dict(recorder.errors) == {'POST /orders/': 3}
+    assert session.json('POST', '/orders/', None) is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_buyer_sessions(live_server):
+    # лимиты анонимных запросов хранятся в кэше
+    cache.clear()
+    shop = baker.make(Shop, placement='MSK')
+    product = baker.make(Product, category=baker.make(Category))
+    baker.make(ProductInfo, product=product, shop=shop, quantity=100, price=100)
+    # тестовая SQLite в памяти не выдерживает параллельной записи, поэтому один поток
+    report = run_load(live_server.url, sessions=2, concurrency=1)
+    for endpoint in ('POST /register/', 'POST /get_token/', 'GET /products/', 'POST /orders/',
+                     'PATCH /orders/{id}/', 'GET /orders/'):
+        assert report[endpoint]['errors'] == 0
+    # создание и список заказов учитываются раздельно
+    assert report['POST /orders/']['requests'] == report['GET /orders/']['requests'] == 2
@@ -0,0 +1,39 @@
+import io
+
+import pytest
+from django.core.management import call_command
+from django.test import Client
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User
+
+
+@pytest.mark.django_db
+def test_api_routes_skip_session_stack():
+    user = baker.make(User)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    response = client.get('/products/')
+    assert response.status_code == 200
+    assert not hasattr(response.wsgi_request, 'session')
+    assert not hasattr(response.wsgi_request, '_messages')
+    # пользователя для API устанавливает DRF
+    assert response.wsgi_request.user == user
+
+
+@pytest.mark.django_db
+def test_admin_keeps_session_stack():
+    client = Client(enforce_csrf_checks=True)
+    response = client.get('/admin/login/')
+    assert hasattr(response.wsgi_request, 'session')
+    assert 'csrftoken' in response.cookies
+    response = client.post('/admin/login/', {'username': 'a@b.c', 'password': 'x'})
+    assert response.status_code == 403
+
+
+def test_benchmark_middleware():
+    output = io.StringIO()
+    call_command('benchmark_middleware', '--requests', '10', stdout=output)
+    assert len(output.getvalue().splitlines()) == 5
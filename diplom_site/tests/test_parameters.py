@@ -0,0 +1,83 @@
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from backend.models import User, Parameter, ParameterValue, ProductParameter
+from backend.parameters import LRUCache, PARAMETER_NAMES, PARAMETER_VALUES, parameter_ids
+from backend.pricelists import load_price_list
+from backend.serializers import ProdParamSerializer
+
+
+def price_list(values):
+    return {
+        'shop': 'Связной',
+        'categories': [{'id': 1, 'name': 'Смартфоны'}],
+        'goods': [{'id': index, 'category': 1, 'model': 'm', 'name': f'Телефон {index}', 'price': 100,
+                   'price_rrc': 120, 'quantity': 1, 'parameters': {'Цвет': value, 'Диагональ': 6.1}}
+                  for index, value in enumerate(values)],
+    }
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    PARAMETER_NAMES.clear()
+    PARAMETER_VALUES.clear()
+    yield
+    PARAMETER_NAMES.clear()
+    PARAMETER_VALUES.clear()
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.set_many({'Цвет': 1, 'Вес': 2})
+    assert cache.get_many(['Цвет']) == {'Цвет': 1}
+    cache.set_many({'Диагональ': 3})
+    # вытесняется давно не использованный ключ
+    assert cache.get_many(['Цвет', 'Вес', 'Диагональ']) == {'Цвет': 1, 'Диагональ': 3}
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parameter_cache_across_imports():
+    with transaction.atomic():
+        ids = parameter_ids(['Цвет', 'Вес'])
+        transaction.set_rollback(True)
+    # ID из откатившейся транзакции в кэш не попадают
+    assert PARAMETER_NAMES.get_many(['Цвет', 'Вес']) == {}
+
+    user = baker.make(User)
+    load_price_list(price_list(['черный', 'белый']), user)
+    ids = PARAMETER_NAMES.get_many(['Цвет', 'Диагональ'])
+    assert ids == dict(Parameter.objects.values_list('name', 'id'))
+    # повторный импорт только проверяет ID из кэша одним запросом, без поиска по названиям
+    with CaptureQueriesContext(connection) as queries:
+        load_price_list(price_list(['черный', 'серый']), user)
+    names_queries = [query['sql'] for query in queries.captured_queries if 'backend_parameter"' in query['sql']]
+    assert len(names_queries) == 1 and '"id" IN' in names_queries[0]
+
+    Parameter.objects.filter(name='Цвет').delete()
+    assert PARAMETER_NAMES.get_many(['Диагональ']) == {}
+
+    # удаление в обход ORM (например, в другом процессе) не ломает следующий импорт
+    load_price_list(price_list(['черный']), user)
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM backend_productparameter')
+        cursor.execute('DELETE FROM backend_parameter WHERE name = %s', ['Цвет'])
+    with transaction.atomic():
+        load_price_list(price_list(['белый']), user)
+    assert set(ProductParameter.objects.values_list('parameter__name', flat=True)) == {'Цвет', 'Диагональ'}
+    assert PARAMETER_NAMES.get_many(['Цвет']) == {'Цвет': Parameter.objects.get(name='Цвет').id}
+
+
+@pytest.mark.django_db
+def test_value_dictionary(settings):
+    settings.PARAMETER_VALUE_DICTIONARY = True
+    load_price_list(price_list(['черный', 'черный', 'белый']), baker.make(User))
+    assert ProductParameter.objects.count() == 6
+    assert not ProductParameter.objects.exclude(value='').exists()
+    assert sorted(ParameterValue.objects.values_list('value', flat=True)) == ['6.1', 'белый', 'черный']
+    assert sorted(ProductParameter.objects.with_value().filter(parameter__name='Цвет')
+                  .values_list('value_text', flat=True)) == ['белый', 'черный', 'черный']
+    parameter = ProductParameter.objects.filter(parameter__name='Диагональ').first()
+    assert ProdParamSerializer(parameter).data == {'parameter': {'name': 'Диагональ'}, 'value': '6.1'}
@@ -0,0 +1,74 @@
+import pytest
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Product, Category, ProductInfo, Order, OrderItem, Contact
+
+PARTNER_ORDERS = '/partner_orders/'
+
+
+def make_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    return client
+
+
+def make_order(shop, state, quantity=2):
+    buyer = baker.make(User)
+    product_info = baker.make(ProductInfo, product=baker.make(Product, category=baker.make(Category)), shop=shop,
+                              quantity=10)
+    order = baker.make(Order, user=buyer, contact=baker.make(Contact, user=buyer), state=state)
+    baker.make(OrderItem, order=order, product_info=product_info, quantity=quantity)
+    return order
+
+
+@pytest.fixture
+def shop_user():
+    user = baker.make(User, type='shop')
+    return user, baker.make(Shop, user=user)
+
+
+@pytest.mark.django_db
+def test_bulk_state_change(shop_user):
+    user, shop = shop_user
+    confirmed = [make_order(shop, 'confirmed') for _ in range(3)]
+    basket = make_order(shop, 'basket')
+    foreign = make_order(baker.make(Shop), 'confirmed')
+    client = make_client(user)
+
+    response = client.post(PARTNER_ORDERS, {'orders': [order.id for order in confirmed] + [basket.id, foreign.id],
+                                            'state': 'sent'}, format='json')
+    data = response.json()
+    assert data['updated'] == [order.id for order in confirmed]
+    assert data['rejected'] == {str(basket.id): 'Cannot change state from basket to sent',
+                                str(foreign.id): 'Order not found'}
+    assert set(Order.objects.filter(id__in=data['updated']).values_list('state', flat=True)) == {'sent'}
+
+    response = client.post(PARTNER_ORDERS, {'orders': [confirmed[0].id], 'state': 'cancelled'}, format='json')
+    assert response.json()['updated'] == [confirmed[0].id]
+    # при отмене остаток возвращается на склад
+    assert ProductInfo.objects.get(ordered_items__order=confirmed[0]).quantity == 12
+    assert ProductInfo.objects.get(ordered_items__order=confirmed[1]).quantity == 10
+
+    response = client.post(PARTNER_ORDERS, {'orders': [confirmed[1].id], 'state': 'basket'}, format='json')
+    assert response.status_code == 400
+    response = make_client(baker.make(User, type='buyer')).post(
+        PARTNER_ORDERS, {'orders': [confirmed[1].id], 'state': 'completed'}, format='json')
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_open_orders_pages(shop_user):
+    user, shop = shop_user
+    orders = [make_order(shop, state) for state in ('confirmed', 'sent', 'confirmed', 'completed', 'confirmed')]
+    client = make_client(user)
+    response = client.get(PARTNER_ORDERS, {'limit': 2})
+    first = response.json()
+    assert [order['id'] for order in first['orders']] == [orders[0].id, orders[1].id]
+    assert first['orders'][0]['items'][0]['quantity'] == 2
+    second = client.get(PARTNER_ORDERS, {'limit': 2, 'after': first['next']}).json()
+    assert [order['id'] for order in second['orders']] == [orders[2].id, orders[4].id]
+    response = client.get(PARTNER_ORDERS, {'state': 'confirmed', 'limit': 10})
+    assert [order['id'] for order in response.json()['orders']] == [orders[0].id, orders[2].id, orders[4].id]
+    assert response.json()['next'] is None
@@ -0,0 +1,44 @@
+import pytest
+from django.test import override_settings
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Product, Category, ProductInfo, PriceHistory
+
+PARTNER_STOCK = '/partner_stock/'
+
+
+@pytest.mark.django_db
+@override_settings(PARTNER_DELTA_BATCH_SIZE=2)
+def test_delta_update():
+    user = baker.make(User, type='shop')
+    shop = baker.make(Shop, user=user)
+    other_shop = baker.make(Shop)
+    product = baker.make(Product, category=baker.make(Category))
+    for external_id in (1, 2, 3):
+        baker.make(ProductInfo, product=product, shop=shop, external_id=external_id, price=100, price_rrc=120,
+                   quantity=5)
+    baker.make(ProductInfo, product=product, shop=other_shop, external_id=1, price=100, price_rrc=120, quantity=5)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+
+    response = client.post(PARTNER_STOCK, {'changes': [
+        {'external_id': 1, 'price': 90},
+        {'external_id': 2, 'quantity': 0},
+        {'external_id': 404, 'quantity': 1},
+        {'external_id': 3, 'price': 150, 'price_rrc': 160, 'quantity': 7},
+    ]}, format='json')
+    assert response.json() == {'updated': 3, 'unknown': [404]}
+    offers = {offer.external_id: (offer.price, offer.price_rrc, offer.quantity)
+              for offer in ProductInfo.objects.filter(shop=shop)}
+    assert offers == {1: (90, 120, 5), 2: (100, 120, 0), 3: (150, 160, 7)}
+    # предложение другого магазина с тем же external_id не меняется
+    assert ProductInfo.objects.get(shop=other_shop).price == 100
+    assert sorted(PriceHistory.objects.values_list('external_id', 'price')) == [(1, 90), (3, 150)]
+
+    response = client.post(PARTNER_STOCK, {'changes': [{'external_id': 1}, {'external_id': -1, 'price': 1}]},
+                           format='json')
+    assert response.status_code == 400
+    assert response.json()['errors'] == ['changes[0]: at least one of price, price_rrc, quantity is required',
+                                         'changes[1]: external_id must be a non-negative integer']
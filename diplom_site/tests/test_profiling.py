@@ -0,0 +1,47 @@
+import os
+
+import pytest
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Product, Category
+
+PRODUCTS = '/products/'
+
+
+def make_client(is_staff):
+    user = baker.make(User, is_staff=is_staff)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(settings, tmp_path):
+    settings.PROFILE_DIR = str(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.django_db
+def test_staff_profile(profile_dir):
+    baker.make(Product, category=baker.make(Category), _quantity=5)
+    client = make_client(is_staff=True)
+    response = client.get(PRODUCTS, HTTP_X_PROFILE='1')
+    assert response.status_code == 200
+    profile_id = response['X-Profile-Id']
+    assert sorted(os.listdir(profile_dir)) == [f'{profile_id}.collapsed', f'{profile_id}.pstats']
+    response = client.get(f'/profiles/{profile_id}/pstats/')
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content)
+    assert client.get('/profiles/../pstats/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_profile_not_for_buyers(profile_dir):
+    client = make_client(is_staff=False)
+    response = client.get(PRODUCTS, {'profile': '1'})
+    assert response.status_code == 200
+    assert not response.has_header('X-Profile-Id')
+    assert not os.listdir(profile_dir)
+    assert client.get('/profiles/0123456789abcdef0123456789abcdef/pstats/').status_code == 403
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+from django.core.management import call_command
+from model_bakery import baker
+from rest_framework.renderers import JSONRenderer
+
+from backend.models import Product, Category, Order, OrderItem, User, ProductInfo, Shop
+from backend.projections import project_products, project_order_items
+from backend.serializers import ProductSerializer
+
+
+@pytest.mark.django_db
+def test_products_projection_identical():
+    category = Category.objects.create(name='Тестовая категория')
+    baker.make(Product, category_id=category.id, _quantity=20)
+    products = Product.objects.all()
+    expected = JSONRenderer().render(ProductSerializer(products, many=True).data)
+    assert JSONRenderer().render(project_products(products)) == expected
+
+
+@pytest.mark.django_db
+def test_order_items_projection():
+    user = baker.make(User)
+    order = baker.make(Order, user=user, state='confirmed')
+    product = baker.make(Product, category=baker.make(Category))
+    shop = baker.make(Shop)
+    items = [baker.make(OrderItem, order=order, product_info=baker.make(ProductInfo, product=product, shop=shop))
+             for _ in range(3)]
+    response = project_order_items(OrderItem.objects.filter(order__user__id=user.id).order_by('id'))
+    assert [row['id'] for row in response.values()] == [item.id for item in items]
+    assert response[0]['date_created'] == order.dt.strftime("%Y.%m.%d")
+    assert response[0]['state'] == 'confirmed'
+
+
+@pytest.mark.django_db
+def test_benchmark_projections():
+    output = io.StringIO()
+    call_command('benchmark_projections', '--rows', '50', '--repeat', '1', stdout=output)
+    assert [line.split()[0] for line in output.getvalue().splitlines()[1:]] == ['serializer', 'projection']
+    # товары замера откатываются
+    assert not Product.objects.exists()
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+import yaml
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+from django.core import mail
+from model_bakery import baker
+
+from backend.models import User, ProductInfo
+from backend.tasks import send_token_email, load_yaml_task
+from diplom_site.celery import app
+
+IMPORT_SECONDS = 1.0
+
+
+@pytest.fixture
+def memory_app(settings):
+    # те же настройки Celery проекта, но брокер и результаты в памяти
+    settings.CELERY_BROKER_URL = 'memory://'
+    settings.CELERY_RESULT_BACKEND = 'cache+memory://'
+    settings.CELERY_BROKER_TRANSPORT_OPTIONS = {**settings.CELERY_BROKER_TRANSPORT_OPTIONS, 'polling_interval': 0.01}
+    memory_app = Celery('diplom_site', set_as_current=False)
+    memory_app.config_from_object('django.conf:settings', namespace='CELERY')
+    yield memory_app
+    memory_app.close()
+
+
+def test_routing():
+    route = app.amqp.router.route
+    assert route({}, send_token_email.name)['queue'].name == 'notifications'
+    assert route({}, send_token_email.name)['priority'] == 0
+    assert route({}, load_yaml_task.name)['queue'].name == 'imports'
+    assert route({}, 'backend.tasks.archive_finished_orders')['queue'].name == 'default'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_notification_latency_during_import(memory_app, monkeypatch, settings, tmp_path):
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    settings.SNAPSHOT_DIR = str(tmp_path)
+    user = baker.make(User)
+    price_list = {'shop': 'Связной', 'categories': [{'id': 1, 'name': 'Смартфоны'}],
+                  'goods': [{'id': 1, 'category': 1, 'model': 'm', 'name': 'Телефон', 'price': 100,
+                             'price_rrc': 120, 'quantity': 1, 'parameters': {}}]}
+    imports_started = threading.Event()
+
+    def slow_get(url):
+        # тяжелый импорт: занимает воркер импортов на IMPORT_SECONDS
+        imports_started.set()
+        time.sleep(IMPORT_SECONDS)
+        return type('Response', (), {'content': yaml.dump(price_list, allow_unicode=True), 'headers': {}})
+
+    monkeypatch.setattr('requests.get', slow_get)
+    tasks = memory_app.tasks
+    with start_worker(memory_app, pool='solo', queues=['imports'], perform_ping_check=False), \
+            start_worker(memory_app, pool='solo', queues=['notifications'], perform_ping_check=False):
+        imports = [tasks[load_yaml_task.name].delay('http://example.com/shop.yaml', user.id) for _ in range(2)]
+        assert imports_started.wait(5)
+        start = time.perf_counter()
+        tasks[send_token_email.name].delay('buyer@example.com', 'token').get(timeout=5, interval=0.01)
+        latency = time.perf_counter() - start
+        # уведомление не ждет ни текущий импорт, ни импорт в очереди за ним
+        assert latency < IMPORT_SECONDS / 2
+        assert len(mail.outbox) == 1
+        for result in imports:
+            result.get(timeout=10, interval=0.01)
+    assert ProductInfo.objects.count() == 1
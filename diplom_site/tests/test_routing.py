@@ -0,0 +1,77 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.test.utils import CaptureQueriesContext, override_settings
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Product, Category
+from backend.routers import read_from_replica
+
+PRODUCTS = '/products/'
+ORDERS = '/orders/'
+
+
+@pytest.fixture(scope='module', autouse=True)
+def replica(django_db_setup):
+    """
+    Фикстура второго подключения к тестовой БД. Если DB_REPLICA_HOSTS не задан, добавляется
+    алиас-зеркало основной БД, чтобы маршрутизация проверялась на двух подключениях.
+    """
+    if settings.DATABASE_REPLICAS:
+        yield settings.DATABASE_REPLICAS[0]
+        return
+    alias = 'replica_test'
+    connections.settings[alias] = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+    with override_settings(DATABASE_REPLICAS=[alias]):
+        yield alias
+    connections[alias].close()
+    del connections.settings[alias]
+    del connections[alias]
+
+
+@pytest.fixture(autouse=True)
+def clear_pins():
+    # закрепления за основной БД хранятся в кэше и не должны переходить между тестами
+    cache.clear()
+
+
+@pytest.fixture
+def client():
+    user = baker.make(User)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    return client
+
+
+def replica_queries(queries):
+    return [q['sql'] for q in queries.captured_queries if 'backend_product' in q['sql']]
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+def test_router_reads():
+    assert router.db_for_read(Product) == 'default'
+    with read_from_replica():
+        assert router.db_for_read(Product) in settings.DATABASE_REPLICAS
+        assert router.db_for_write(Product) == 'default'
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+def test_products_read_from_replica(client, replica):
+    category = Category.objects.create(name='Test cat')
+    baker.make(Product, category_id=category.id, _quantity=3)
+    with CaptureQueriesContext(connections[replica]) as queries:
+        response = client.get(PRODUCTS)
+    assert response.status_code == 200
+    assert replica_queries(queries)
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+def test_primary_pin_after_write(client, replica):
+    client.post(ORDERS, data={'contact': {'city': 'Москва'}}, format='json')
+    with CaptureQueriesContext(connections[replica]) as queries:
+        response = client.get(PRODUCTS)
+    assert response.status_code == 200
+    assert not replica_queries(queries)
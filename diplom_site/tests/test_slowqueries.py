@@ -0,0 +1,67 @@
+import pytest
+from django.db import connection
+from django.test import override_settings
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop
+from backend.slowqueries import SlowQueryLogger, clear_slow_queries, recent_slow_queries
+
+SLOW_QUERIES = '/slow_queries/'
+
+
+@pytest.fixture(autouse=True)
+def clear_log():
+    clear_slow_queries()
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    return client
+
+
+@pytest.mark.django_db
+def test_slow_query_log():
+    assert any(isinstance(wrapper, SlowQueryLogger) for wrapper in connection.execute_wrappers)
+    shop = baker.make(Shop, name='Связной')
+    staff = client_for(baker.make(User, is_staff=True))
+
+    with override_settings(SLOW_QUERY_THRESHOLD_MS=None):
+        list(Shop.objects.all())
+    assert recent_slow_queries() == []
+
+    with override_settings(SLOW_QUERY_THRESHOLD_MS=0):
+        assert client_for(baker.make(User)).get('/categories/').status_code == 200
+        list(Shop.objects.filter(name=shop.name))
+    queries = recent_slow_queries()
+    # новые запросы - первыми, источник и план есть у SELECT
+    assert 'backend_shop' in queries[0]['sql'] and queries[0]['source'] is None
+    assert 'Связной' in queries[0]['params'] and queries[0]['plan']
+    assert any(query['source'] == 'CategoryView.list' for query in queries)
+    # запросы EXPLAIN в журнал не попадают
+    assert not any(query['sql'].startswith('EXPLAIN') for query in queries)
+
+    assert client_for(baker.make(User)).get(SLOW_QUERIES).status_code == 403
+    response = staff.get(SLOW_QUERIES)
+    assert response.status_code == 200
+    assert response.json()['queries'][0]['sql'] == queries[0]['sql']
+
+
+@pytest.mark.django_db
+def test_slow_query_masks_secrets():
+    user = baker.make(User)
+    with override_settings(SLOW_QUERY_THRESHOLD_MS=0):
+        token = Token.objects.create(user=user)
+        list(Token.objects.filter(key=token.key))
+        list(User.objects.filter(password=user.password))
+        list(Shop.objects.filter(name='Связной'))
+        with override_settings(SLOW_QUERY_LOG_PARAMS=False):
+            list(Shop.objects.filter(name='Евросеть'))
+    queries = recent_slow_queries()
+    logged = ' '.join(query['params'] + (query['plan'] or '') for query in queries)
+    assert token.key not in logged and user.password not in logged
+    assert 'Связной' in logged and 'Евросеть' not in logged
+    token_queries = [query for query in queries if 'authtoken' in query['sql']]
+    assert token_queries and all(query['params'] == '<masked>' for query in token_queries)
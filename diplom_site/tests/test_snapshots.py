@@ -0,0 +1,82 @@
+import gzip
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Product, Category, ProductInfo, ProductParameter, Parameter
+from backend.snapshots import write_snapshot, snapshot_path, parse_range
+
+
+@pytest.fixture
+def shop(settings, tmp_path):
+    settings.SNAPSHOT_DIR = str(tmp_path)
+    shop = baker.make(Shop)
+    category = baker.make(Category)
+    color = baker.make(Parameter, name='Цвет')
+    for external_id in (1, 2, 3):
+        product_info = baker.make(ProductInfo, shop=shop, external_id=external_id, price=100 * external_id,
+                                  product=baker.make(Product, category=category, name=f'Телефон {external_id}'))
+        if external_id != 2:
+            baker.make(ProductParameter, product_info=product_info, parameter=color, value='черный')
+    # чужие предложения в файл не попадают
+    baker.make(ProductInfo, shop=baker.make(Shop), product=baker.make(Product, category=category))
+    return shop
+
+
+@pytest.mark.django_db
+def test_write_snapshot(shop, tmp_path):
+    assert write_snapshot(shop.id) == 3
+    with gzip.open(snapshot_path(shop.id), 'rt', encoding='utf-8') as file:
+        offers = [json.loads(line) for line in file]
+    assert [(offer['id'], offer['name'], offer['price'], offer['parameters']) for offer in offers] == [
+        (1, 'Телефон 1', 100, {'Цвет': 'черный'}), (2, 'Телефон 2', 200, {}), (3, 'Телефон 3', 300, {'Цвет': 'черный'})]
+    # временные файлы не остаются
+    assert [path.name for path in tmp_path.iterdir()] == [f'shop-{shop.id}.ndjson.gz']
+
+
+@pytest.mark.django_db
+def test_snapshot_download(shop):
+    client = APIClient()
+    url = f'/shops/{shop.id}/snapshot/'
+    assert client.get(url).status_code == 401
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=baker.make(User)).key)
+    assert client.get(url).status_code == 404
+
+    write_snapshot(shop.id)
+    with open(snapshot_path(shop.id), 'rb') as file:
+        content = file.read()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content) == content
+    # каталог из БД не читается
+    assert not [query for query in queries.captured_queries if 'backend_product' in query['sql']]
+
+    response = client.get(url, HTTP_RANGE='bytes=10-19')
+    assert response.status_code == 206
+    assert response['Content-Range'] == f'bytes 10-19/{len(content)}'
+    assert b''.join(response.streaming_content) == content[10:20]
+    # устаревший If-Range - файл целиком
+    assert client.get(url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"old"').status_code == 200
+    assert client.get(url, HTTP_RANGE=f'bytes={len(content)}-').status_code == 416
+    assert client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+    # диапазон отдается из того же файла, по которому посчитан ETag, даже если снимок заменили
+    response = client.get(url, HTTP_RANGE='bytes=0-')
+    ProductInfo.objects.filter(shop=shop).delete()
+    write_snapshot(shop.id)
+    assert b''.join(response.streaming_content) == content
+
+
+def test_parse_range():
+    assert parse_range('bytes=0-99', 1000) == (0, 99)
+    assert parse_range('bytes=900-', 1000) == (900, 999)
+    assert parse_range('bytes=-100', 1000) == (900, 999)
+    assert parse_range('bytes=500-5000', 1000) == (500, 999)
+    assert parse_range('bytes=0-1,5-6', 1000) is None
+    assert parse_range('bytes=1000-', 1000) is False
@@ -0,0 +1,26 @@
+from backend.importtime import parse_importtime, measure, total_time, by_package, top_imports
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     yaml.error
+import time:      1000 |       1120 |   yaml
+import time:       300 |       1420 | backend.tasks
+import time:        50 |         50 | backend.etags
+"""
+
+
+def test_parse_importtime():
+    records = parse_importtime(IMPORTTIME_OUTPUT)
+    assert [(record['module'], record['depth']) for record in records] == \
+        [('yaml.error', 2), ('yaml', 1), ('backend.tasks', 0), ('backend.etags', 0)]
+    assert total_time(records) == 1470
+    assert by_package(records) == [('yaml', 1120), ('backend', 350)]
+    assert top_imports(records, 1) == [('backend.tasks', 1420)]
+
+
+def test_worker_startup_skips_web_dependencies():
+    elapsed, records = measure('celery')
+    modules = {record['module'] for record in records}
+    assert elapsed > 0
+    assert 'backend.etags' in modules
+    for module in ('requests', 'allauth', 'backend.views', 'django.contrib.admin'):
+        assert module not in modules
@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+import pytest
+import yaml
+from django.db import connection
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Product, Category, ProductInfo, Order, OrderItem, Contact, PriceHistory, \
+    ArchivedOrder, ArchivedOrderItem
+from backend.prices import price_series
+from backend.tasks import purge_abandoned_baskets, load_yaml_task, archive_finished_orders
+
+
+def make_order(user, state, age_hours):
+    product = baker.make(Product, category=baker.make(Category))
+    product_info = baker.make(ProductInfo, product=product, shop=baker.make(Shop))
+    contact = baker.make(Contact, user=user)
+    order = baker.make(Order, user=user, contact=contact, state=state)
+    baker.make(OrderItem, order=order, product_info=product_info)
+    # dt заполняется через auto_now_add, поэтому состариваем заказ отдельным запросом
+    Order.objects.filter(id=order.id).update(dt=timezone.now() - timedelta(hours=age_hours))
+    return order
+
+
+@pytest.mark.django_db
+def test_purge_abandoned_baskets():
+    user = baker.make(User)
+    old_baskets = [make_order(user, 'basket', 100) for _ in range(5)]
+    fresh_basket = make_order(user, 'basket', 1)
+    confirmed = make_order(user, 'confirmed', 100)
+    result = purge_abandoned_baskets(max_age_hours=72, batch_size=2)
+    assert result == {'orders': 5, 'order_items': 5, 'contacts': 5}
+    assert not Order.objects.filter(id__in=[order.id for order in old_baskets]).exists()
+    assert set(Order.objects.values_list('id', flat=True)) == {fresh_basket.id, confirmed.id}
+    assert Contact.objects.count() == 2
+    assert OrderItem.objects.count() == 2
+
+
+
+@pytest.mark.django_db
+def test_purge_skips_basket_confirmed_during_batch():
+    user = baker.make(User)
+    basket = make_order(user, 'basket', 100)
+    confirmed = []
+
+    def confirm_after_read(execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        # корзину подтверждают сразу после того, как задача прочитала пачку
+        if not confirmed and sql.startswith('SELECT') and 'backend_order' in sql:
+            confirmed.append(Order.objects.filter(id=basket.id).update(state='confirmed'))
+        return result
+
+    with connection.execute_wrapper(confirm_after_read):
+        result = purge_abandoned_baskets(max_age_hours=72)
+    assert result == {'orders': 0, 'order_items': 0, 'contacts': 0}
+    assert Order.objects.filter(id=basket.id, state='confirmed').exists()
+
+
+@pytest.mark.django_db
+def test_price_history_on_import(monkeypatch):
+    user = baker.make(User, type='shop')
+    category = baker.make(Category)
+    price_list = {
+        'shop': 'Связной',
+        'categories': [{'id': category.id, 'name': category.name}],
+        'goods': [
+            {'id': external_id, 'category': category.id, 'model': 'm', 'name': f'Товар {external_id}',
+             'price': 100, 'price_rrc': 120, 'quantity': 5, 'parameters': {}}
+            for external_id in (1, 2, 3)
+        ],
+    }
+    monkeypatch.setattr('requests.get',
+                        lambda url: type('Response', (), {'content': yaml.dump(price_list), 'headers': {}}))
+    load_yaml_task('http://example.com/shop.yaml', user.id)
+    assert PriceHistory.objects.count() == 3
+    # повторный импорт без изменений не пишет историю
+    load_yaml_task('http://example.com/shop.yaml', user.id)
+    assert PriceHistory.objects.count() == 3
+    price_list['goods'][0]['price'] = 90
+    load_yaml_task('http://example.com/shop.yaml', user.id)
+    assert list(PriceHistory.objects.filter(external_id=1).values_list('price', flat=True).order_by('id')) == [100, 90]
+
+    product_info = ProductInfo.objects.get(external_id=1)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    response = client.get(f'/products/{product_info.id}/price_history/')
+    data = response.json()
+    assert [point['price'] for point in data['series']] == [100, 90]
+    # средняя взвешена по времени действия цен, точный расчет - в test_price_series_time_weighted
+    assert data['min'] == 90 and data['max'] == 100 and 90 <= data['avg'] <= 100
+    response = client.get(f'/products/{product_info.id}/price_history/', {'from': 'not a date'})
+    assert response.json() == {'error': 'Invalid date format, use YYYY-MM-DD or ISO 8601'}
+
+
+@pytest.mark.django_db
+def test_price_series_time_weighted():
+    end = timezone.now() - timedelta(days=1)
+    start = end - timedelta(days=4)
+    shop = baker.make(Shop)
+    # цена 100 действует с начала периода три дня, затем 140 - один день
+    for days_before_end, price in ((10, 100), (1, 140)):
+        baker.make(PriceHistory, shop=shop, external_id=7, price=price, price_rrc=price,
+                   recorded_at=end - timedelta(days=days_before_end))
+    data = price_series(shop.id, 7, start, end)
+    assert (data['min'], data['max'], data['avg']) == (100, 140, 110)
+    assert price_series(shop.id, 8, start, end)['avg'] is None
+
+
+@pytest.mark.django_db
+def test_archive_finished_orders():
+    user = baker.make(User, first_name='Иван', last_name='Петров')
+    old_completed = [make_order(user, 'completed', 24 * 400) for _ in range(3)]
+    old_cancelled = make_order(user, 'cancelled', 24 * 400)
+    recent = make_order(user, 'completed', 24)
+    old_sent = make_order(user, 'sent', 24 * 400)
+    old_item = OrderItem.objects.get(order=old_completed[0])
+    result = archive_finished_orders(max_age_days=365, batch_size=2)
+    assert result == {'orders': 4, 'order_items': 4, 'contacts': 4}
+    assert set(Order.objects.values_list('id', flat=True)) == {recent.id, old_sent.id}
+    assert ArchivedOrder.objects.filter(id=old_cancelled.id, state='cancelled').exists()
+    assert ArchivedOrderItem.objects.filter(order_id__in=[order.id for order in old_completed]).count() == 3
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    assert len(client.get('/orders/').json()['orders']) == 2
+    assert len(client.get('/orders/', {'archived': '1'}).json()['orders']) == 6
+    # архивный заказ находится по прежнему ID
+    data = client.get(f'/orders/{old_item.id}/').json()
+    assert data['state'] == 'completed'
+    assert data['order_details']['shop'] == old_item.product_info.shop.name
+    assert data['contact_details']['person'] == 'Иван Петров'
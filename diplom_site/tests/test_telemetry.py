@@ -0,0 +1,70 @@
+import time
+
+import pytest
+import yaml
+from celery.signals import task_failure, task_retry
+from django.core.cache import cache
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Category
+from backend.tasks import load_yaml_task, send_token_email
+from backend.telemetry import render_task_metrics
+
+TASKS = ['backend.tasks.load_yaml_task', 'backend.tasks.send_token_email']
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    cache.clear()
+
+
+def metric(text, line_prefix):
+    return next(float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(line_prefix))
+
+
+@pytest.mark.django_db
+def test_import_task_metrics(monkeypatch):
+    user = baker.make(User, type='shop')
+    category = baker.make(Category)
+    price_list = {
+        'shop': 'Связной',
+        'categories': [{'id': category.id, 'name': category.name}],
+        'goods': [{'id': external_id, 'category': category.id, 'model': 'm', 'name': f'Товар {external_id}',
+                   'price': 100, 'price_rrc': 120, 'quantity': 5, 'parameters': {'Цвет': 'черный'}}
+                  for external_id in range(10)],
+    }
+    monkeypatch.setattr('requests.get',
+                        lambda url: type('Response', (), {'content': yaml.dump(price_list), 'headers': {}}))
+    load_yaml_task.apply(args=('http://example.com/shop.yaml', user.id), headers={'enqueued_at': time.time() - 2})
+
+    text = render_task_metrics(TASKS)
+    task = 'task="backend.tasks.load_yaml_task"'
+    assert metric(text, f'celery_task_queue_latency_seconds_count{{{task}}}') == 1
+    assert metric(text, f'celery_task_queue_latency_seconds_sum{{{task}}}') >= 2
+    assert metric(text, f'celery_task_runtime_seconds_count{{{task}}}') == 1
+    assert metric(text, f'celery_task_total{{{task},state="success"}}') == 1
+    assert metric(text, f'celery_task_items_total{{{task}}}') == 10
+    assert metric(text, f'celery_task_items_per_second{{{task}}}') > 0
+    assert metric(text, f'celery_task_peak_rss_bytes{{{task}}}') > 0
+
+
+def test_failed_task_metrics():
+    # ошибки и повторы фиксируются по сигналам воркера
+    task_failure.send(sender=send_token_email, task_id='1', exception=ConnectionError('SMTP is down'))
+    task_retry.send(sender=send_token_email, request=None, reason='timeout')
+    text = render_task_metrics(TASKS)
+    assert metric(text, 'celery_task_total{task="backend.tasks.send_token_email",state="failure"}') == 1
+    assert metric(text, 'celery_task_total{task="backend.tasks.send_token_email",state="retry"}') == 1
+    assert metric(text, 'celery_task_total{task="backend.tasks.send_token_email",state="success"}') == 0
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint():
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=baker.make(User, is_staff=True)).key)
+    response = client.get('/metrics/')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+    assert b'# TYPE celery_task_runtime_seconds histogram' in response.content
@@ -1,9 +1,12 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from model_bakery import baker
 from rest_framework.test import APIClient
 
 from backend.models import User, Product, Category
 from rest_framework.authtoken.models import Token
+from backend.etags import bump_catalog_version
 
 ORDERS = '/orders/'
 REGISTER = '/register/'
@@ -73,4 +76,28 @@ def test_get_products(client):
     assert len(response_data['products']) == 10
 
 
-
+@pytest.mark.django_db
+def test_products_etag(client):
+    user = baker.make(User, _quantity=1)[0]
+    token = Token.objects.create(user=user).key
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token)
+    category = Category.objects.create(name='Test cat')
+    baker.make(Product, category_id=category.id, _quantity=50)
+    with CaptureQueriesContext(connection) as full_queries:
+        full_response = client.get(PRODUCTS)
+    assert full_response.status_code == 200
+    etag = full_response['ETag']
+    assert etag.startswith('"')
+    with CaptureQueriesContext(connection) as cached_queries:
+        response = client.get(PRODUCTS, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    # 304 экономит весь каталог: тело пустое, у 200 - полный список товаров
+    assert len(response.content) == 0 < len(full_response.content)
+    # при 304 таблицы товаров не затрагиваются
+    assert not [q for q in cached_queries.captured_queries if 'backend_product' in q['sql']]
+    assert len(cached_queries) < len(full_queries)
+    # после изменения каталога ETag должен измениться
+    bump_catalog_version()
+    response = client.get(PRODUCTS, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
@@ -0,0 +1,134 @@
+import json
+from datetime import timedelta
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.models import User, Shop, Product, Category, ProductInfo, Order, OrderItem, Contact, OrderEvent
+from backend.tasks import dispatch_order_events
+from backend.webhooks import claim_events
+
+
+class ShopStandIn(BaseHTTPRequestHandler):
+    """
+    Локальная заглушка webhook-сервера магазина, запоминает полученные пачки событий.
+    """
+    status = 200
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.received.append(json.loads(body))
+        self.send_response(self.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def shop_server():
+    ShopStandIn.status = 200
+    ShopStandIn.received = []
+    server = HTTPServer(('127.0.0.1', 0), ShopStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield ShopStandIn, f'http://127.0.0.1:{server.server_port}/events/'
+    server.shutdown()
+    server.server_close()
+
+
+def make_order_item(shop, user):
+    product = baker.make(Product, category=baker.make(Category))
+    product_info = baker.make(ProductInfo, product=product, shop=shop, quantity=10)
+    contact = baker.make(Contact, user=user, city='Москва', address='Не указан', phone='Не указан')
+    order = baker.make(Order, user=user, contact=contact)
+    return baker.make(OrderItem, order=order, product_info=product_info, quantity=2)
+
+
+@pytest.mark.django_db
+def test_confirm_writes_event(shop_server):
+    _, url = shop_server
+    user = baker.make(User)
+    shop = baker.make(Shop, webhook_url=url)
+    order_item = make_order_item(shop, user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    response = client.patch(f'/orders/{order_item.id}/', data={'address': 'Тверская, 1', 'phone': '+79990000000'})
+    assert response.json()['status'] == 'OK'
+    event = OrderEvent.objects.get(order=order_item.order)
+    assert event.shop == shop
+    assert event.payload['state'] == 'confirmed'
+    assert event.delivered_at is None
+
+
+@pytest.mark.django_db
+def test_confirm_without_stock_changes_nothing():
+    user = baker.make(User)
+    order_item = make_order_item(baker.make(Shop), user)
+    ProductInfo.objects.filter(id=order_item.product_info_id).update(quantity=1)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=user).key)
+    response = client.patch(f'/orders/{order_item.id}/', data={'address': 'Тверская, 1', 'phone': '+79990000000'})
+    assert response.status_code == 409
+    order = Order.objects.get(id=order_item.order_id)
+    assert order.state != 'confirmed'
+    assert order.contact_id == order_item.order.contact_id
+    assert ProductInfo.objects.get(id=order_item.product_info_id).quantity == 1
+    assert not OrderEvent.objects.exists()
+
+
+@pytest.mark.django_db
+def test_dispatch_batches(shop_server):
+    stand_in, url = shop_server
+    shop = baker.make(Shop, webhook_url=url)
+    user = baker.make(User)
+    for _ in range(3):
+        order_item = make_order_item(shop, user)
+        baker.make(OrderEvent, order=order_item.order, shop=shop, event='order.confirmed',
+                   payload={'order_id': order_item.order_id})
+    result = dispatch_order_events()
+    assert result['delivered'] == 3
+    # все события магазина приходят одним запросом
+    assert len(stand_in.received) == 1
+    assert len(stand_in.received[0]['events']) == 3
+    assert not OrderEvent.objects.filter(delivered_at__isnull=True).exists()
+
+
+@pytest.mark.django_db
+def test_dispatch_backoff(shop_server):
+    stand_in, url = shop_server
+    stand_in.status = 500
+    shop = baker.make(Shop, webhook_url=url)
+    order_item = make_order_item(shop, baker.make(User))
+    event = baker.make(OrderEvent, order=order_item.order, shop=shop, event='order.confirmed')
+    result = dispatch_order_events()
+    assert result['failed'] == 1
+    event.refresh_from_db()
+    assert event.attempts == 1
+    assert event.delivered_at is None
+    assert event.next_attempt_at > timezone.now()
+    # до наступления времени повтора событие не отправляется
+    assert dispatch_order_events()['failed'] == 0
+
+
+@pytest.mark.django_db
+def test_claim_lease_covers_all_shops(settings):
+    user = baker.make(User)
+    shops = baker.make(Shop, webhook_url='http://127.0.0.1:9/events/', _quantity=3)
+    for shop in shops:
+        order_item = make_order_item(shop, user)
+        baker.make(OrderEvent, order=order_item.order, shop=shop, event='order.confirmed',
+                   payload={'order_id': order_item.order_id})
+    start = timezone.now()
+    events = claim_events(settings.WEBHOOK_BATCH_SIZE)
+    assert len(events) == 3
+    # резерв не истекает, пока по очереди обходятся все три магазина
+    lease = OrderEvent.objects.values_list('next_attempt_at', flat=True).first()
+    assert lease >= start + timedelta(seconds=settings.WEBHOOK_TIMEOUT * 2 * 3)
+    assert claim_events(settings.WEBHOOK_BATCH_SIZE) == []